@@ -1,12 +1,36 @@
 import json
+import os
 import pandas as pd
 from main import SearchEngine
 import config
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# 為不同 category 設定不同的檢索參數
+RETRIEVE_PARAMS = {
+    'faq': {
+        'top_k': 1,
+        'knn_weight': 1,
+        'use_rerank': True
+    },
+    'finance': {
+        'top_k': 1,
+        'knn_weight': 0.5,
+        'use_rerank': True
+    },
+    'insurance': {
+        'top_k': 1,
+        'knn_weight': 0.5,
+        'use_rerank': True
+    }
+}
 
 class AnswerGenerator:
-    def __init__(self):
+    def __init__(self, workers: int = 1):
         self.es_index_name = config.ES_INDEX_NAME
+        self.workers = workers
+        # 檢索失敗的問題 ({'qid', 'error'})，不寫入答案檔，作答結束後另外列出
+        self.failures = []
         self.engine = SearchEngine(
             llm_provider='openai',
             rerank_mode='llm_rerank',
@@ -15,23 +39,7 @@ class AnswerGenerator:
         self.categories = ['insurance', 'finance', 'faq']
         
         # 為不同 category 設定不同的檢索參數
-        self.retrieve_params = {
-            'faq': {
-                'top_k': 1,
-                'knn_weight': 1,
-                'use_rerank': True
-            },
-            'finance': {
-                'top_k': 1,
-                'knn_weight': 0.5,
-                'use_rerank': True
-            },
-            'insurance': {
-                'top_k': 1,
-                'knn_weight': 0.5,
-                'use_rerank': True
-            }
-        }
+        self.retrieve_params = RETRIEVE_PARAMS
     
     def load_data(self, ground_truth_path, questions_path):
         with open(ground_truth_path, 'r') as f:
@@ -43,40 +51,64 @@ class AnswerGenerator:
         self.ground_truth_df = pd.DataFrame(ground_truth_json_data.get('ground_truths'))
         self.question_df = pd.DataFrame(questions_json_data.get('questions'))
     
-    def generate_answers(self, category, num_questions=0):
+    def _get_questions(self, category, num_questions=0):
         if category not in self.categories:
             raise ValueError(f"Category must be one of {self.categories}")
             
         cat_questions = self.question_df[self.question_df['category'] == category].to_dict('records')
-        answers = []
-        
+        return cat_questions[:num_questions] if num_questions > 0 else cat_questions
+
+    def answer_question(self, question):
+        """
+        回答單一問題，失敗時不中斷整批作答
+
+        Returns:
+            dict: {'qid', 'retrieve'}；檢索失敗時記錄於 self.failures 並回傳 None，不以猜測的文檔充當答案
+        """
+        qid = question.get('qid')
+        query = question.get('query')
+        category = question.get('category')
+        doc_ids = [str(i) for i in question.get('source', [])]
+
         # 獲取該 category 的檢索參數
         params = self.retrieve_params[category]
-        
-        cat_questions_ = cat_questions[:num_questions] if num_questions > 0 else cat_questions
-        for question in cat_questions_:
-            qid = question.get('qid')
-            query = question.get('query')
-            source = question.get('source', [])
-            doc_ids = [str(i) for i in source]
-            
+
+        try:
             relevant_docs = self.engine.retrieve(
                 query,
                 category=category,
                 doc_ids=doc_ids,
                 **params  # 使用該 category 的特定參數
             )
+            if not relevant_docs:
+                raise ValueError("未找到相關文檔")
             print(qid, relevant_docs[0])
-            
-            answers.append({
-                'qid': int(qid),
-                'retrieve': int(relevant_docs[0].get('id')),
-            })
-        return answers
+            retrieve = int(relevant_docs[0].get('id'))
+        except Exception as e:
+            print(f"❌ 問題 {qid} 處理失敗: {e}")
+            self.failures.append({'qid': int(qid), 'error': str(e)})
+            return None
+
+        return {
+            'qid': int(qid),
+            'retrieve': retrieve,
+        }
+
+    def _answer_questions(self, questions):
+        """依 self.workers 並行作答，回傳依 qid 排序的答案"""
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                answers = list(executor.map(self.answer_question, questions))
+        else:
+            answers = [self.answer_question(question) for question in questions]
+        return sorted((answer for answer in answers if answer), key=lambda x: x['qid'])
+
+    def generate_answers(self, category, num_questions=0):
+        return self._answer_questions(self._get_questions(category, num_questions))
     
     def generate_all_answers(self, num_questions=0):
         """
-        為所有類別生成答案
+        為所有類別生成答案，所有類別的問題共用同一個工作池
         
         Args:
             num_questions_per_category (int): 每個類別要處理的問題數量
@@ -84,21 +116,28 @@ class AnswerGenerator:
         Returns:
             list: 所有類別的答案列表
         """
-        all_answers = []
+        questions = []
         
         for category in self.categories:
-            print(f"\nProcessing category: {category}")
-            category_answers = self.generate_answers(
-                category=category,
-                num_questions=num_questions
-            )
-            all_answers.extend(category_answers)
+            questions.extend(self._get_questions(category, num_questions))
             
-        return all_answers
+        print(f"\nProcessing {len(questions)} questions with {self.workers} workers")
+        return self._answer_questions(questions)
  
     def save_answers(self, answers, output_path='./output/pred_retrieve.json'):
         with open(output_path, 'w') as f:
             json.dump({'answers': answers}, f, indent=2, ensure_ascii=False)
+        print(f"✓ 已寫入 {len(answers)} 個答案至 {output_path}")
+
+        # 失敗的問題列在另一個檔案，重新作答時只需處理這些 qid
+        failures_path = f'{os.path.splitext(output_path)[0]}_failures.json'
+        if self.failures:
+            failures = sorted(self.failures, key=lambda x: x['qid'])
+            with open(failures_path, 'w') as f:
+                json.dump({'failures': failures}, f, indent=2, ensure_ascii=False)
+            print(f"❌ {len(failures)} 個問題檢索失敗，未寫入答案: {[failure['qid'] for failure in failures]}，詳見 {failures_path}")
+        elif os.path.exists(failures_path):
+            os.remove(failures_path)
     
 
 def main():
@@ -107,9 +146,11 @@ def main():
                        default='all', help='Category to process (default: all)')
     parser.add_argument('--num_questions', type=int, default=0,
                        help='Number of questions to process per category (default: 0 for all questions)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of questions to process concurrently (default: 1)')
     args = parser.parse_args()
     
-    generator = AnswerGenerator()
+    generator = AnswerGenerator(workers=args.workers)
     
     # 設定檔案路徑
     ground_truth_path = './dataset/preliminary/ground_truths_example.json'
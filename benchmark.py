@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import subprocess
+import time
+
+from main import SearchEngine
+from answer import RETRIEVE_PARAMS
+from modules.metrics import Metrics, InMemoryCollector, latency_summary
+from modules.stub_clients import StubEmbeddingClient, StubElasticsearchClient, StubLLMClient
+from modules.local_search_client import LocalSearchClient
+from modules.rerank_client import RerankClient
+from modules.cache import ResultCache
+import config
+
+QUESTIONS_PATH = './dataset/preliminary/questions_example.json'
+GROUND_TRUTHS_PATH = './dataset/preliminary/ground_truths_example.json'
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def build_engine(args, metrics: Metrics) -> SearchEngine:
+    """依參數組合真實或離線 stub 客戶端"""
+    stub = {}
+    if args.backend == 'stub':
+        stub['es_client'] = StubElasticsearchClient()
+    elif args.backend == 'local':
+        stub['es_client'] = LocalSearchClient()
+    if args.embedding == 'stub':
+        stub['embedding_client'] = StubEmbeddingClient()
+    if args.backend != 'elasticsearch' or args.embedding == 'stub':
+        # 離線執行時不建立需要憑證的 LLM 客戶端
+        stub['llm_client'] = StubLLMClient()
+    if args.rerank_mode in ('none', 'local_rerank'):
+        stub['rerank_client'] = RerankClient(mode='local_rerank')
+
+    return SearchEngine(
+        llm_provider=args.llm_provider,
+        rerank_mode=args.rerank_mode,
+        index_name=args.index_name,
+        search_mode=args.search_mode,
+        result_cache=ResultCache(backend=args.result_cache),
+        metrics=metrics,
+        verbose=args.verbose,
+        **stub,
+    )
+
+
+def load_questions(args):
+    with open(args.questions, 'r') as f:
+        questions = json.load(f)['questions']
+    with open(args.ground_truths, 'r') as f:
+        ground_truths = {item['qid']: int(item['retrieve']) for item in json.load(f)['ground_truths']}
+
+    if args.category != 'all':
+        questions = [question for question in questions if question['category'] == args.category]
+    if args.num_questions > 0:
+        by_category = {}
+        for question in questions:
+            by_category.setdefault(question['category'], []).append(question)
+        questions = [question for items in by_category.values() for question in items[:args.num_questions]]
+    return questions, ground_truths
+
+
+def run_benchmark(engine: SearchEngine, collector: InMemoryCollector, questions, ground_truths, args):
+    def retrieve(question):
+        params = dict(RETRIEVE_PARAMS[question['category']])
+        if args.rerank_mode == 'none':
+            params['use_rerank'] = False
+        if args.multi_query:
+            params['multi_query'] = True
+        return engine.retrieve(
+            question['query'],
+            category=question['category'],
+            doc_ids=[str(i) for i in question.get('source', [])],
+            **params
+        )
+
+    # 預熱連線與快取，不列入統計
+    for question in questions[:args.warmup]:
+        retrieve(question)
+    collector.reset()
+
+    records = []
+    for question in questions:
+        start = time.perf_counter()
+        results = retrieve(question)
+        elapsed = time.perf_counter() - start
+
+        predicted = int(results[0]['id']) if results else None
+        expected = ground_truths.get(question['qid'])
+        records.append({
+            'qid': question['qid'],
+            'category': question['category'],
+            'predicted': predicted,
+            'expected': expected,
+            'correct': predicted is not None and predicted == expected,
+            'latency_ms': elapsed * 1000,
+        })
+    return records
+
+
+def accuracy(records):
+    def summarize(items):
+        correct = sum(item['correct'] for item in items)
+        return {'correct': correct, 'total': len(items), 'accuracy': correct / len(items) if items else 0.0}
+
+    by_category = {}
+    for record in records:
+        by_category.setdefault(record['category'], []).append(record)
+    return {
+        'overall': summarize(records),
+        'by_category': {category: summarize(items) for category, items in sorted(by_category.items())},
+    }
+
+
+def print_report(report):
+    print("\n=== 延遲 (毫秒) ===")
+    print(f"{'stage':<12}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = [('total', report['latency']['total'])] + sorted(report['latency']['stages'].items())
+    for name, stats in rows:
+        if not stats.get('count'):
+            continue
+        print(f"{name:<12}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+    print("\n=== 正確率 ===")
+    overall = report['accuracy']['overall']
+    print(f"{'all':<12}{overall['correct']:>4}/{overall['total']:<4}{overall['accuracy']:>8.2%}")
+    for category, stats in report['accuracy']['by_category'].items():
+        print(f"{category:<12}{stats['correct']:>4}/{stats['total']:<4}{stats['accuracy']:>8.2%}")
+
+
+def setup_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='檢索基準測試 - 重播範例問題，同時輸出各階段延遲與各類別正確率',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用範例:
+  # 完全離線 (stub 搜尋與嵌入、本地重排序)，量測流程本身的開銷
+  python benchmark.py --backend stub --embedding stub --rerank-mode local_rerank
+
+  # 行程內的本地索引 (需先以 main.py --mode index --search-backend local 建立，嵌入客戶端須與建立時相同)
+  python benchmark.py --backend local --rerank-mode local_rerank
+
+  # 連線真實服務，依序送出 BM25 / kNN 以取得各查詢的耗時
+  python benchmark.py --search-mode sequential --rerank-mode llm_rerank --output output/bench_llm.json
+
+註: msearch 模式下 bm25 / knn 為伺服器回傳的 took，es_search 為整個請求的實際耗時
+        """
+    )
+    parser.add_argument('--questions', default=QUESTIONS_PATH, help='問題檔案路徑')
+    parser.add_argument('--ground-truths', default=GROUND_TRUTHS_PATH, help='標準答案檔案路徑')
+    parser.add_argument('--category', choices=['all', 'insurance', 'finance', 'faq'], default='all')
+    parser.add_argument('--num-questions', type=int, default=0, help='每個類別的問題數量 (預設: 0 表示全部)')
+    parser.add_argument('--warmup', type=int, default=0, help='預熱的問題數量，不列入統計')
+    parser.add_argument('--backend', choices=['elasticsearch', 'local', 'stub'], default='elasticsearch', help='搜尋後端')
+    parser.add_argument('--embedding', choices=['azure', 'stub'], default='azure', help='嵌入客戶端')
+    parser.add_argument('--rerank-mode', choices=['fast_rerank', 'llm_rerank', 'local_rerank', 'none'], default='llm_rerank')
+    parser.add_argument('--llm-provider', choices=['openai', 'claude'], default='openai')
+    parser.add_argument('--search-mode', choices=['sequential', 'msearch', 'retriever'], default=config.ES_SEARCH_MODE)
+    parser.add_argument('--index-name', default=config.ES_INDEX_NAME)
+    parser.add_argument('--multi-query', action='store_true', help='以規則改寫的查詢變體進行多查詢檢索')
+    parser.add_argument('--result-cache', choices=ResultCache.BACKENDS, default='none',
+                        help='檢索結果快取 (預設: none，量測完整流程；重複執行同一組問題時可改為 memory/sqlite)')
+    parser.add_argument('--output', default='./output/benchmark.json', help='機器可讀的結果輸出路徑 (JSON)')
+    parser.add_argument('--verbose', action='store_true', help='輸出檢索流程的進度訊息 (會影響量測到的延遲)')
+    return parser
+
+
+def main():
+    args = setup_argparse().parse_args()
+
+    collector = InMemoryCollector()
+    engine = build_engine(args, Metrics([collector]))
+    questions, ground_truths = load_questions(args)
+
+    records = run_benchmark(engine, collector, questions, ground_truths, args)
+    report = {
+        'config': {**vars(args), 'git_commit': git_commit()},
+        'latency': {
+            'total': latency_summary([record['latency_ms'] / 1000 for record in records]),
+            'stages': collector.summary(),
+        },
+        'counters': dict(collector.counters),
+        'accuracy': accuracy(records),
+        'questions': records,
+    }
+
+    print_report(report)
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n✓ 結果已寫入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmark import QUESTIONS_PATH, GROUND_TRUTHS_PATH, git_commit, load_questions
+from modules.chunk_store import latest_records, load_embeddings
+from modules.embedding_projection import EmbeddingProjection, truncate_embeddings
+from modules.metrics import latency_summary
+from modules.stub_clients import StubEmbeddingClient
+
+# 每個位元組的 1 的個數，計算 bbq 位元向量的 Hamming 距離
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.int32)
+QUANTIZATIONS = ('float32', 'int8', 'bbq', 'bbq_rescore')
+
+
+class VectorIndex:
+    def __init__(self, embeddings: np.ndarray, quantization: str, oversample: float = 3.0):
+        """
+        以 NumPy 模擬 Elasticsearch dense_vector 的儲存格式，對候選分塊精確計算 top-k
+
+        quantization:
+            float32: hnsw，原始向量
+            int8: int8_hnsw，以全體數值的分位數區間線性量化為 0-127，每個向量另存一個修正值
+            bbq: bbq_hnsw，減去重心後每一維只保留正負號 (1 bit)，以 Hamming 距離排序，另存兩個修正值
+            bbq_rescore: bbq 取前 k * oversample 個候選，再以 float32 向量重新計分 (ES 的 rescore_vector)
+        """
+        self.embeddings = embeddings
+        self.quantization = quantization
+        self.oversample = oversample
+        dims = embeddings.shape[1]
+        if quantization == 'float32':
+            self.bytes_per_vector = dims * 4
+        elif quantization == 'int8':
+            self.low, self.high = np.quantile(embeddings, [0.0005, 0.9995])
+            self.scale = (self.high - self.low) / 127
+            self.codes = np.clip(np.rint((embeddings - self.low) / self.scale), 0, 127).astype(np.int8)
+            self.bytes_per_vector = dims + 4
+        else:
+            self.centroid = embeddings.mean(axis=0)
+            self.bits = np.packbits(embeddings > self.centroid, axis=1)
+            # 重新計分用的 float32 向量留在磁碟上，不計入需常駐記憶體的大小
+            self.bytes_per_vector = self.bits.shape[1] + 8
+
+    def scores(self, query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        if self.quantization == 'float32':
+            return self.embeddings[candidates] @ query
+        if self.quantization == 'int8':
+            return (self.codes[candidates].astype(np.float32) @ query) * self.scale + self.low * query.sum()
+        query_bits = np.packbits(query > self.centroid)
+        return -POPCOUNT[np.bitwise_xor(self.bits[candidates], query_bits)].sum(axis=1)
+
+    def search(self, query: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+        """回傳候選中分數最高的 k 個列號 (由高到低)"""
+        depth = int(k * self.oversample) if self.quantization == 'bbq_rescore' else k
+        scores = self.scores(query, candidates)
+        top = _top_k(scores, depth)
+        if self.quantization == 'bbq_rescore':
+            candidates = candidates[top]
+            top = _top_k(self.embeddings[candidates] @ query, k)
+        return candidates[top]
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def load_corpus(path: str):
+    """讀取分塊檔中有嵌入向量的分塊，回傳 (category 陣列, doc_id 陣列, float32 嵌入矩陣)"""
+    records = latest_records(path)
+    embeddings = load_embeddings(path)
+    if embeddings is None:
+        raise ValueError(f"{path} 沒有嵌入向量，請以 --output --with-embeddings 匯出")
+    records = [record for record in records if 0 <= record.get('embedding_row', -1) < len(embeddings)]
+    categories = np.array([record['category'] for record in records], dtype=object)
+    doc_ids = np.array([str(record['id']) for record in records], dtype=object)
+    matrix = np.asarray(embeddings[[record['embedding_row'] for record in records]], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return categories, doc_ids, matrix / np.where(norms > 0, norms, 1)
+
+
+def embed_questions(questions, dims: int, args) -> np.ndarray:
+    """以寫入分塊時相同的嵌入客戶端取得查詢向量 (不套用 PCA 投影，降維由本腳本模擬)"""
+    if args.embedding == 'stub':
+        client = StubEmbeddingClient(dims=dims)
+    else:
+        from modules.embedding_client import EmbeddingClient
+        client = EmbeddingClient(projection_path='')
+    vectors = np.asarray(client.get_embeddings([question['query'] for question in questions]), dtype=np.float32)
+    if vectors.shape[1] != dims:
+        raise ValueError(f"查詢向量維度 {vectors.shape[1]} 與分塊檔的 {dims} 不同，請使用寫入時相同的嵌入設定")
+    return vectors
+
+
+def reductions(corpus: np.ndarray, args):
+    """產生 (名稱, 維度, 分塊矩陣, 查詢轉換) 的降維設定，第一個為原始維度"""
+    full_dims = corpus.shape[1]
+    yield 'full', full_dims, corpus, lambda queries: queries
+    for dims in sorted(set(args.dims), reverse=True):
+        if dims >= full_dims:
+            continue
+        if 'truncate' in args.reduction:
+            yield 'truncate', dims, truncate_embeddings(corpus, dims), lambda queries, dims=dims: truncate_embeddings(queries, dims)
+        if 'pca' in args.reduction:
+            projection = EmbeddingProjection.fit(corpus, dims)
+            if args.save_pca:
+                path = args.save_pca.format(dims=dims)
+                projection.save(path)
+                print(f"✓ PCA 投影已寫入 {path}")
+            yield 'pca', dims, projection.transform(corpus), projection.transform
+
+
+def run_benchmark(questions, ground_truths, query_vectors, categories, doc_ids, corpus, args):
+    # 每個問題的候選分塊: 同類別 (category) 或再加上 source 清單過濾 (source)
+    candidates = []
+    for question in questions:
+        mask = categories == question['category']
+        if args.scope == 'source':
+            mask &= np.isin(doc_ids, [str(doc_id) for doc_id in question.get('source', [])])
+        candidates.append(np.flatnonzero(mask))
+
+    baseline = VectorIndex(corpus, 'float32')
+    expected = [set(baseline.search(query, rows, args.top_k).tolist()) for query, rows in zip(query_vectors, candidates)]
+
+    results = []
+    for reduction, dims, matrix, transform in reductions(corpus, args):
+        queries = transform(query_vectors)
+        for quantization in args.quantization:
+            index = VectorIndex(matrix, quantization, args.oversample)
+            recalls = []
+            correct = 0
+            seconds = []
+            for question, query, rows, truth in zip(questions, queries, candidates, expected):
+                if not len(rows):
+                    continue
+                start = time.perf_counter()
+                top = index.search(query, rows, args.top_k)
+                seconds.append(time.perf_counter() - start)
+                recalls.append(len(truth.intersection(top.tolist())) / len(truth))
+                correct += str(doc_ids[top[0]]) == str(ground_truths.get(question['qid']))
+            results.append({
+                'reduction': reduction,
+                'dims': dims,
+                'quantization': quantization,
+                'bytes_per_vector': index.bytes_per_vector,
+                'index_mb': index.bytes_per_vector * len(matrix) / 2**20,
+                'query_json_bytes': float(np.mean([len(json.dumps(query.tolist())) for query in queries])),
+                f'recall_at_{args.top_k}': float(np.mean(recalls)) if recalls else 0.0,
+                'top1_accuracy': correct / len(seconds) if seconds else 0.0,
+                'latency': latency_summary(seconds),
+            })
+    return results
+
+
+def print_report(results, top_k: int):
+    print(f"\n{'reduction':<10}{'dims':>6}{'format':>13}{'B/vec':>8}{'MB':>9}{'query B':>9}{f'R@{top_k}':>8}{'top1':>8}{'p50 ms':>9}")
+    for row in results:
+        print(
+            f"{row['reduction']:<10}{row['dims']:>6}{row['quantization']:>13}{row['bytes_per_vector']:>8}{row['index_mb']:>9.2f}"
+            f"{row['query_json_bytes']:>9.0f}{row[f'recall_at_{top_k}']:>8.3f}{row['top1_accuracy']:>8.2%}{row['latency'].get('p50_ms', 0):>9.3f}"
+        )
+
+
+def setup_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='向量儲存格式基準測試 - 比較降維與量化對 kNN 召回率、索引大小與延遲的影響',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用範例:
+  # 以前處理匯出的分塊檔 (--output --with-embeddings) 比較各種設定
+  python benchmark_vectors.py --chunks output/chunks/finance.jsonl --dims 1024 512 256
+
+  # 同時保存 PCA 投影，供 EMBEDDING_PROJECTION_PATH 使用
+  python benchmark_vectors.py --chunks output/chunks/finance.jsonl --dims 256 --reduction pca --save-pca ./cache/pca_{dims}.npz
+
+註: 召回率以原始維度 float32 的精確 top-k 為基準；延遲為 NumPy 暴力計算的耗時，量化格式在 NumPy 沒有 SIMD 加速，僅供參考
+        """
+    )
+    parser.add_argument('--chunks', required=True, help='含嵌入向量的分塊檔 (前處理 --output --with-embeddings 或本地索引檔)')
+    parser.add_argument('--questions', default=QUESTIONS_PATH, help='問題檔案路徑')
+    parser.add_argument('--ground-truths', default=GROUND_TRUTHS_PATH, help='標準答案檔案路徑')
+    parser.add_argument('--category', choices=['all', 'insurance', 'finance', 'faq'], default='all')
+    parser.add_argument('--num-questions', type=int, default=0, help='每個類別的問題數量 (預設: 0 表示全部)')
+    parser.add_argument('--embedding', choices=['azure', 'stub'], default='azure', help='查詢的嵌入客戶端，須與寫入分塊時相同')
+    parser.add_argument('--scope', choices=['category', 'source'], default='category',
+                        help='候選分塊: 同類別的所有分塊 (預設) 或只限問題的 source 清單')
+    parser.add_argument('--dims', type=int, nargs='+', default=[1024, 512, 256], help='降維後的維度')
+    parser.add_argument('--reduction', choices=['truncate', 'pca'], nargs='+', default=['truncate', 'pca'],
+                        help='降維方式: truncate (等同 EMBEDDING_DIMENSIONS，僅適用支援的模型)、pca (EMBEDDING_PROJECTION_PATH)')
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, nargs='+', default=list(QUANTIZATIONS), help='向量儲存格式')
+    parser.add_argument('--oversample', type=float, default=3.0, help='bbq_rescore 重新計分的候選倍數')
+    parser.add_argument('--top-k', type=int, default=10, help='計算召回率的 k')
+    parser.add_argument('--save-pca', help='保存 PCA 投影的路徑，{dims} 會替換為維度，例如 ./cache/pca_{dims}.npz')
+    parser.add_argument('--output', default='./output/benchmark_vectors.json', help='機器可讀的結果輸出路徑 (JSON)')
+    return parser
+
+
+def main():
+    args = setup_argparse().parse_args()
+
+    categories, doc_ids, corpus = load_corpus(args.chunks)
+    questions, ground_truths = load_questions(args)
+    query_vectors = embed_questions(questions, corpus.shape[1], args)
+    print(f"✓ 已載入 {len(corpus)} 個分塊 ({corpus.shape[1]} 維) 與 {len(questions)} 個問題")
+
+    results = run_benchmark(questions, ground_truths, query_vectors, categories, doc_ids, corpus, args)
+    print_report(results, args.top_k)
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'config': {**vars(args), 'git_commit': git_commit()}, 'chunks': len(corpus), 'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"\n✓ 結果已寫入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -14,4 +14,85 @@ GCP_SONNET_MODEL = os.getenv("GCP_SONNET_MODEL")
 GCP_HAIKU_MODEL = os.getenv("GCP_HAIKU_MODEL")
 # Elasticsearch 設置
 ES_HOST = os.getenv("ES_HOST")
-ES_INDEX_NAME = os.getenv("ES_INDEX_NAME")
\ No newline at end of file
+ES_INDEX_NAME = os.getenv("ES_INDEX_NAME")
+# 嵌入向量批量請求設置
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", 256))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", 100000))
+
+# 嵌入向量降維: 請求 API 回傳的維度 (text-embedding-3 系列支援，0 表示模型預設)，以及選用的 PCA 投影檔 (.npz)
+# 兩者都在 EmbeddingClient 中套用，寫入索引與查詢的向量一致；索引模板的 dims 須與最終維度相同
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 0))
+EMBEDDING_PROJECTION_PATH = os.getenv("EMBEDDING_PROJECTION_PATH", "")
+
+# 嵌入向量快取設置
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000))
+
+# 各 API 提供者的每分鐘請求上限 (0 表示不限流)
+RATE_LIMITS = {
+    "embedding": float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", 0)),
+    "openai": float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 0)),
+    "claude": float(os.getenv("CLAUDE_REQUESTS_PER_MINUTE", 0)),
+}
+
+# 搜尋後端: elasticsearch 或 local (行程內的 NumPy 向量 + BM25 索引，不需外部服務)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "elasticsearch")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./cache/local_index")
+
+# 混合搜索結果的融合方式: rrf (加權 RRF)、combsum、combmnz、convex (正規化分數的加權和)
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")
+
+# 多查詢檢索: 規則改寫的最大變體數，以及變體相對於原始查詢的融合權重
+MULTI_QUERY_MAX_VARIANTS = int(os.getenv("MULTI_QUERY_MAX_VARIANTS", 3))
+MULTI_QUERY_VARIANT_WEIGHT = float(os.getenv("MULTI_QUERY_VARIANT_WEIGHT", 0.5))
+
+# 財報查詢擷取的公司/年份/季度: 對應欄位相符時的 BM25 加權，以及是否以年份與季度直接過濾候選
+FINANCE_FIELD_BOOST = float(os.getenv("FINANCE_FIELD_BOOST", 2.0))
+FINANCE_FIELD_FILTER = os.getenv("FINANCE_FIELD_FILTER", "false").lower() == "true"
+
+# 混合搜索模式: sequential, msearch, retriever
+ES_SEARCH_MODE = os.getenv("ES_SEARCH_MODE", "msearch")
+
+# doc_ids 過濾的文檔數不超過此值時改用精確 cosine (script_score) 取代近似 kNN，0 表示一律使用近似 kNN
+EXACT_KNN_MAX_DOC_IDS = int(os.getenv("EXACT_KNN_MAX_DOC_IDS", 100))
+# 量化向量索引 (見 scripts/put_es_template.sh 的 ES_VECTOR_INDEX_TYPE) 近似 kNN 的重新計分倍數，0 表示不重新計分 (需 ES 8.18 以上)
+ES_KNN_RESCORE_OVERSAMPLE = float(os.getenv("ES_KNN_RESCORE_OVERSAMPLE", 0))
+
+# --mode rebuild: 切換別名後保留的舊版本索引數 (用於回滾)，以及切換前的預熱查詢數
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", 1))
+INDEX_WARMUP_QUERIES = int(os.getenv("INDEX_WARMUP_QUERIES", 20))
+# 新索引的分塊數低於目前服務中索引的此比例時不切換別名
+INDEX_MIN_COUNT_RATIO = float(os.getenv("INDEX_MIN_COUNT_RATIO", 0.9))
+
+# 每個 Elasticsearch 節點的連線池大小，並行查詢時避免連線不足而排隊
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", 32))
+
+# Fast rerank API 設置
+FAST_RERANK_API_URL = os.getenv("FAST_RERANK_API_URL", "https://reranker.dhr.wtf/rerank")
+FAST_RERANK_CONNECT_TIMEOUT = float(os.getenv("FAST_RERANK_CONNECT_TIMEOUT", 3))
+FAST_RERANK_READ_TIMEOUT = float(os.getenv("FAST_RERANK_READ_TIMEOUT", 10))
+FAST_RERANK_MAX_RETRIES = int(os.getenv("FAST_RERANK_MAX_RETRIES", 3))
+FAST_RERANK_POOL_SIZE = int(os.getenv("FAST_RERANK_POOL_SIZE", 16))
+# 連續失敗幾次後斷路，以及斷路幾秒後再試探
+FAST_RERANK_BREAKER_THRESHOLD = int(os.getenv("FAST_RERANK_BREAKER_THRESHOLD", 5))
+FAST_RERANK_BREAKER_RECOVERY = float(os.getenv("FAST_RERANK_BREAKER_RECOVERY", 30))
+
+# 本地重排序中 BM25 分數的權重，其餘為向量 cosine 權重
+LOCAL_RERANK_BM25_WEIGHT = float(os.getenv("LOCAL_RERANK_BM25_WEIGHT", 0.3))
+
+# 檢索結果快取: memory (行程內 LRU)、sqlite (多個行程共用)、none (停用)
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 3600))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 10000))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "./cache/results.db")
+
+# LLM 重排序結果快取 (以查詢與候選文檔內容為鍵)
+RERANK_CACHE_ENABLED = os.getenv("RERANK_CACHE_ENABLED", "true").lower() == "true"
+RERANK_CACHE_PATH = os.getenv("RERANK_CACHE_PATH", "./cache/rerank.db")
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", 50000))
+
+# LLM 重排序分組: 每個 prompt 最多幾個候選文檔 (0 表示不分組)、並行請求數、是否進行決賽
+LLM_RERANK_GROUP_SIZE = int(os.getenv("LLM_RERANK_GROUP_SIZE", 0))
+LLM_RERANK_WORKERS = int(os.getenv("LLM_RERANK_WORKERS", 4))
+LLM_RERANK_TOURNAMENT = os.getenv("LLM_RERANK_TOURNAMENT", "false").lower() == "true"
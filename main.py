@@ -1,89 +1,273 @@
-from modules.es_client import ElasticsearchClient
+from modules.search_client import SearchClient, AsyncSearchClient
 from modules.llm_client import LLMClient
-from modules.embedding_client import EmbeddingClient
-from modules.rerank_client import RerankClient
+from modules.embedding_client import EmbeddingClient, AsyncEmbeddingClient
+from modules.rerank_client import RerankClient, AsyncRerankClient
+from modules.metrics import Metrics, PrometheusExporter, JsonLogExporter, NULL_METRICS
+from modules.cache import ResultCache
+from modules.chunk_store import read_chunk_files
+from modules.index_manager import IndexManager
+from modules.query_rewrite import rewrite_query
+from modules.finance_fields import FIELDS as FINANCE_FIELDS, extract_finance_fields
+from server import serve
 
 from llama_index.core.node_parser import SentenceSplitter
 
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Any, Tuple, Iterable
 import argparse
+import asyncio
+import hashlib
 import time
 import json
 import sys
 
-from config import ES_INDEX_NAME as DEFAULT_INDEX_NAME
+from config import ES_INDEX_NAME as DEFAULT_INDEX_NAME, ES_SEARCH_MODE as DEFAULT_SEARCH_MODE, SEARCH_BACKEND as DEFAULT_SEARCH_BACKEND, FUSION_METHOD, MULTI_QUERY_MAX_VARIANTS, FINANCE_FIELD_FILTER
 
 class SearchEngine:
-    def __init__(self, llm_provider: str = "openai", rerank_mode: str = 'fast_rerank', index_name: str = DEFAULT_INDEX_NAME):
+    def __init__(
+        self,
+        llm_provider: str = "openai",
+        rerank_mode: str = 'fast_rerank',
+        index_name: str = DEFAULT_INDEX_NAME,
+        search_mode: str = DEFAULT_SEARCH_MODE,
+        search_backend: str = DEFAULT_SEARCH_BACKEND,
+        es_client=None,
+        llm_client=None,
+        embedding_client=None,
+        rerank_client=None,
+        result_cache: ResultCache = None,
+        metrics: Metrics = NULL_METRICS,
+        verbose: bool = True,
+    ):
+        """
+        Args:
+            search_backend: 搜尋後端 elasticsearch 或 local，提供 es_client 時忽略
+            es_client, llm_client, embedding_client, rerank_client: 可注入替代的客戶端 (例如基準測試用的本地 stub)，未提供時依設定建立
+            result_cache: 檢索結果快取，未提供時依 RESULT_CACHE_* 設定建立
+            metrics: 記錄各階段耗時與計數器的 Metrics，預設不記錄
+            verbose: False 時不輸出檢索流程的進度訊息 (錯誤訊息仍會輸出)
+        """
         print("初始化搜索引擎組件...")
         try:
-            self.es_client = ElasticsearchClient()
-            self.llm_client = LLMClient(provider=llm_provider)
-            self.embedding_client = EmbeddingClient()
-            self.rerank_client = RerankClient(mode=rerank_mode, llm_provider=llm_provider)
+            self.es_client = es_client or SearchClient(search_backend, search_mode=search_mode)
+            self.llm_client = llm_client or LLMClient(provider=llm_provider)
+            self.embedding_client = embedding_client or EmbeddingClient()
+            self.rerank_client = rerank_client or RerankClient(mode=rerank_mode, llm_provider=llm_provider)
             self.index_name = index_name
+            self.result_cache = result_cache or ResultCache()
+            self.metrics = metrics
+            self.verbose = verbose
+            # 各客戶端共用同一個 Metrics 與輸出設定
+            for client in (self.es_client, self.embedding_client, self.rerank_client):
+                client.metrics = metrics
+            if hasattr(self.es_client, 'embedding_signature'):
+                # 本地後端在索引檔記錄嵌入設定，拒絕混入其他設定產生的向量
+                self.es_client.embedding_signature = self.embedding_client.signature
+            self.rerank_client.verbose = verbose
             print("✓ 所有組件初始化完成")
         except Exception as e:
             print(f"❌ 初始化失敗: {e}")
             raise
 
-    def index_documents(self, documents: List[Dict], batch_size: int = 5, chunk_size: int = 512, chunk_overlap: int = 50, use_chunk: bool = True) -> None:
-        """批量索引文檔，支持滑动窗口分块"""
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    def index_documents(
+        self,
+        documents: List[Dict],
+        batch_size: int = 500,
+        chunk_size: int = 512,
+        chunk_overlap: int = 50,
+        use_chunk: bool = True,
+        max_bulk_bytes: int = 10 * 1024 * 1024,
+        incremental: bool = False,
+    ) -> Dict[str, Any]:
+        """批量索引文檔，支持滑动窗口分块，每累積 batch_size 個分塊批量嵌入並以 _bulk 請求寫入
+        incremental 為 True 時只嵌入並寫入 content_hash 與索引中不同的分塊，並刪除分塊數減少後多出的舊分塊"""
         """
         documents = [
             {'id': '1', 'text': '這是第一個文檔', 'category': 'category1'},
             {'id': '2', 'text': '這是第二個文檔', 'category': 'category2'},
             {'id': '3', 'text': '這是第三個文檔', 'category': 'category3'},
         ]
+
+        回傳 {'indexed': 成功寫入的分塊數, 'unchanged': 略過的未變動分塊數, 'deleted': 刪除的舊分塊數,
+              'failed': [{'doc_id', 'sn', 'category', 'status', 'error'}]}
         """
 
         total = len(documents)
         print(f"\n開始索引 {total} 個文檔...")
 
         splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        
-        for idx, doc in enumerate(documents):
-            try:
-                
-                # 使用滑动窗口分块文档
-                text = doc.get('text')
-                category = doc.get('category')
-                doc_id = doc.get('id')
 
+        def chunks():
+            next_sn = {}
+            for idx, doc in enumerate(documents):
                 print(f"[{idx}/{total}] 處理文檔...")
+                yield from self._split_document(doc, splitter, use_chunk, next_sn)
 
-                if use_chunk:    
-                    chunks = splitter.split_text(text)
-                    for chunk_index, chunk in enumerate(chunks):
-                        embeddings = self.embedding_client.get_embedding(chunk)
-                        # 將 doc_id 轉為字符串，chunk_index 作為 sn
-                        self.es_client.index_document(
-                            doc_id=str(doc_id),
-                            sn=chunk_index,
-                            category=category,
-                            content=chunk,
-                            embedding=embeddings,
-                            index_name=self.index_name,
-                        )
-                else:
-                    sn = doc.get('sn', 0)
-                    embeddings = self.embedding_client.get_embedding(text)
-                    self.es_client.index_document(
-                        doc_id=str(doc_id),
-                        sn=sn,
-                        category=category,
-                        content=text,
-                        embedding=embeddings,
-                        index_name=self.index_name,
-                    )
+        return self.index_chunks(chunks(), batch_size=batch_size, max_bulk_bytes=max_bulk_bytes, incremental=incremental)
 
-                print(f"✓ 已完成 {idx}/{total} 個文檔的索引")
-                # time.sleep(0.5)  # 避免超過API限制
-                
-            except Exception as e:
-                print(f"❌ 索引文檔 {doc_id} 時出錯: {e}")
-                
-        print(f"\n✓ 索引完成，共處理 {total} 個文檔")
+    def index_chunks(
+        self,
+        chunks: Iterable[Dict],
+        batch_size: int = 500,
+        max_bulk_bytes: int = 10 * 1024 * 1024,
+        incremental: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        串流寫入已分塊的資料 (例如 modules.chunk_store.read_chunks 讀出的中介檔)，每累積 batch_size 個分塊批量嵌入並寫入
+        已附上 embedding 的分塊不再呼叫嵌入 API；回傳格式同 index_documents
+        """
+        buffer = []
+        indexed = 0
+        unchanged = 0
+        failed = []
+        chunk_counts = {}
+
+        def flush():
+            nonlocal indexed, unchanged
+            if not buffer:
+                return
+            pending = list(buffer)
+            buffer.clear()
+            if incremental:
+                changed = self._changed_chunks(pending)
+                unchanged += len(pending) - len(changed)
+                pending = changed
+            ready = [chunk for chunk in pending if chunk.get('embedding') is not None]
+            missing = [chunk for chunk in pending if chunk.get('embedding') is None]
+            if missing:
+                embedded, embed_failed = self._embed_chunks(missing)
+                ready.extend(embedded)
+                failed.extend(embed_failed)
+            if not ready:
+                return
+            result = self._write_chunks(ready, batch_size=batch_size, max_bulk_bytes=max_bulk_bytes)
+            indexed += result['indexed']
+            failed.extend(result['failed'])
+            print(f"✓ 批量寫入 {result['indexed']}/{len(ready)} 個分塊")
+
+        for chunk in chunks:
+            buffer.append(chunk)
+            self._count_chunks(chunk_counts, [chunk])
+            if len(buffer) >= batch_size:
+                flush()
+
+        flush()
+
+        deleted = self._delete_stale_chunks(chunk_counts) if incremental else 0
+
+        print(f"\n✓ 索引完成，成功寫入 {indexed} 個分塊")
+        if incremental:
+            print(f"✓ 增量索引: 略過 {unchanged} 個未變動的分塊，刪除 {deleted} 個舊分塊")
+        if failed:
+            print(f"❌ {len(failed)} 個分塊索引失敗:")
+            for item in failed:
+                print(f"  - {item['category']}_{item['doc_id']}_{item['sn']}: {item['error']}")
+
+        return {'indexed': indexed, 'unchanged': unchanged, 'deleted': deleted, 'failed': failed}
+
+    def _split_document(self, doc: Dict, splitter: SentenceSplitter, use_chunk: bool = True, next_sn: Dict = None) -> List[Dict]:
+        """
+        使用滑动窗口将文档分块，不分塊時沿用文檔自帶的 sn
+
+        前處理會把同一份文件拆成多個 id 相同的元素文檔 (insurance 的段落、finance 的段落與表格)，
+        分塊時以 next_sn 記錄每個 (category, id) 下一個可用的 sn，跨元素文檔連續編號，避免各元素的分塊 _id 相同而互相覆蓋；
+        未提供 next_sn 時每份文檔從 0 開始
+        """
+        text = doc.get('text')
+        if use_chunk:
+            key = (doc.get('category'), str(doc.get('id')))
+            start = next_sn.get(key, 0) if next_sn is not None else 0
+            chunks = list(enumerate(splitter.split_text(text), start=start))
+            if next_sn is not None:
+                next_sn[key] = start + len(chunks)
+        else:
+            chunks = [(doc.get('sn', 0), text)]
+
+        # 文檔層級的財報欄位 (公司、年份、季度) 複製到每個分塊
+        fields = {field: doc[field] for field in FINANCE_FIELDS if doc.get(field)}
+        # 將 doc_id 轉為字符串，chunk_index 作為 sn；content_hash 供增量索引比對內容 (含財報欄位) 是否變動，
+        # 並包含嵌入設定 (模型、維度與投影)，更換設定後所有分塊都會重新嵌入
+        hash_suffix = (json.dumps(fields, ensure_ascii=False, sort_keys=True) if fields else '') + self._embedding_signature()
+        return [
+            {
+                'doc_id': str(doc.get('id')),
+                'sn': sn,
+                'category': doc.get('category'),
+                'content': chunk,
+                'content_hash': hashlib.sha256(((chunk or '') + hash_suffix).encode('utf-8')).hexdigest(),
+                **fields,
+            }
+            for sn, chunk in chunks
+        ]
+
+    def _embedding_signature(self) -> str:
+        signature = getattr(self.embedding_client, 'signature', '')
+        return f'\x00{signature}' if signature else ''
+
+    @staticmethod
+    def _count_chunks(chunk_counts: Dict, chunks: List[Dict]) -> None:
+        """累計每個 (category, doc_id) 的分塊數 (最大 sn + 1)"""
+        for chunk in chunks:
+            key = (chunk['category'], chunk['doc_id'])
+            chunk_counts[key] = max(chunk_counts.get(key, 0), chunk['sn'] + 1)
+
+    def _changed_chunks(self, chunks: List[Dict]) -> List[Dict]:
+        """過濾掉索引中 content_hash 相同的分塊"""
+        ids = [self.es_client.gen_document_id(chunk['category'], chunk['doc_id'], chunk['sn']) for chunk in chunks]
+        try:
+            stored = self.es_client.get_content_hashes(self.index_name, ids)
+        except Exception as e:
+            # 無法比對時全部重新寫入，結果與非增量模式相同
+            print(f"❌ 讀取 content_hash 時出錯，改為全部重新寫入: {e}")
+            return chunks
+        return [chunk for id_, chunk in zip(ids, chunks) if stored.get(id_) != chunk['content_hash']]
+
+    def _delete_stale_chunks(self, chunk_counts: Dict) -> int:
+        if not chunk_counts:
+            return 0
+        deleted = self.es_client.delete_stale_chunks(self.index_name, chunk_counts)
+        if deleted:
+            self.result_cache.invalidate(self.index_name)
+        return deleted
+
+    def _embed_chunks(self, chunks: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """一次批量嵌入所有分塊，回傳 (附上 embedding 的分塊, 嵌入失敗的分塊)"""
+        error = '無法獲取嵌入向量'
+        try:
+            embeddings = self.embedding_client.get_embeddings([item['content'] for item in chunks])
+        except Exception as e:
+            embeddings = [None] * len(chunks)
+            error = str(e)
+        ready = []
+        failed = []
+        for item, embedding in zip(chunks, embeddings):
+            if embedding is None:
+                failed.append({
+                    'doc_id': item['doc_id'],
+                    'sn': item['sn'],
+                    'category': item['category'],
+                    'status': None,
+                    'error': error,
+                })
+                continue
+            ready.append({**item, 'embedding': embedding})
+        return ready, failed
+
+    def _write_chunks(self, chunks: List[Dict], batch_size: int = 500, max_bulk_bytes: int = 10 * 1024 * 1024) -> Dict[str, Any]:
+        """以 _bulk 請求寫入已嵌入的分塊"""
+        result = self.es_client.bulk_index_documents(
+            self.index_name,
+            chunks,
+            chunk_size=batch_size,
+            max_chunk_bytes=max_bulk_bytes,
+        )
+        if result['indexed']:
+            # 索引內容已變動，先前快取的檢索結果不再有效
+            self.result_cache.invalidate(self.index_name)
+        return result
 
     def retrieve(
         self,
@@ -94,26 +278,81 @@ class SearchEngine:
         knn_weight: float = 0.7,
         rerank_k: int = 10,
         use_rerank: bool = True,  # 新增參數
+        multi_query: bool = False,
+        queries: List[str] = None,
     ) -> List[str]:
-        """執行搜索流程"""
+        """
+        執行搜索流程，各階段耗時與計數記錄於 self.metrics；相同查詢與參數直接回傳快取結果
+
+        multi_query 為 True 時同時以查詢變體搜索：所有變體一次批量嵌入，所有 BM25 / kNN 查詢以單次 _msearch 送出後一起融合；
+        queries 為額外的變體 (例如 LLM 改寫)，未提供時以規則改寫 (年份換算、關鍵詞擷取) 產生。重排序仍使用原始查詢
+        """
+        start = time.perf_counter()
         try:
-            print(f"\n[1/4] 開始混合搜索流程 - 查詢: '{query}'")
+            variants = [query]
+            if multi_query:
+                extra = queries if queries is not None else rewrite_query(query, MULTI_QUERY_MAX_VARIANTS)
+                variants = list(dict.fromkeys([query, *extra]))
+
+            # 財報查詢中的公司、年份與季度提高對應欄位相符文檔的 BM25 分數，可選擇以年份與季度直接過濾候選；
+            # 只有擷取到單一值的年份或季度才過濾 (例如「2022年第3季…110年度的股利」的年份有兩個，只用於加權)
+            field_boosts = field_filters = None
+            if category == 'finance':
+                field_boosts = {field: values for field, values in extract_finance_fields(query, query=True).items() if values}
+                if FINANCE_FIELD_FILTER:
+                    field_filters = {field: values for field, values in field_boosts.items() if field != 'companies' and len(values) == 1}
+
+            cache_key = None
+            if self.result_cache.enabled:
+                cache_key = self.result_cache.key(self.index_name, query, {
+                    'category': category,
+                    'doc_ids': sorted(str(doc_id) for doc_id in doc_ids or []),
+                    'top_k': top_k,
+                    'knn_weight': knn_weight,
+                    'rerank_k': rerank_k,
+                    'use_rerank': use_rerank,
+                    'fusion': FUSION_METHOD,
+                    'variants': variants[1:],
+                    'field_filters': field_filters,
+                    # 包含 LLM 提供者與模型等設定，換模型後不沿用舊的排序結果 (注入的 stub 沒有 cache_id 時以類別名稱代替)
+                    'reranker': getattr(self.rerank_client, 'cache_id', type(self.rerank_client).__name__) if use_rerank else None,
+                })
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    self.metrics.increment('result_cache_hits')
+                    self._log(f"\n✓ 命中檢索結果快取 - 查詢: '{query}'")
+                    return cached
+                self.metrics.increment('result_cache_misses')
+
+            self._log(f"\n[1/4] 開始混合搜索流程 - 查詢: '{query}'")
             
-            print(f"[2/4] 生成查詢的嵌入向量...")
-            query_vector = self.embedding_client.get_embedding(query)
+            self._log(f"[2/4] 生成查詢的嵌入向量...")
+            with self.metrics.stage('embed'):
+                if len(variants) > 1:
+                    query_vectors = self.embedding_client.get_embeddings(variants)
+                    query_vector = query_vectors[0]
+                else:
+                    query_vector = self.embedding_client.get_embedding(query)
             
             search_size = rerank_k if use_rerank else top_k
-            print(f"[3/4] 執行Elasticsearch混合搜索 (檢索 {search_size} 個候選文檔)...")
-            candidates = self.es_client.hybrid_search(query, query_vector, search_size, category, doc_ids, knn_weight, index_name = self.index_name)
+            needs_embeddings = use_rerank and self.rerank_client.needs_embeddings
+            if len(variants) > 1:
+                self._log(f"[3/4] 執行多查詢混合搜索 ({len(variants)} 個查詢變體，檢索 {search_size} 個候選文檔)...")
+                candidates = self.es_client.multi_search(variants, query_vectors, search_size, category, doc_ids, knn_weight, index_name=self.index_name, include_embedding=needs_embeddings, field_filters=field_filters, field_boosts=field_boosts)
+            else:
+                self._log(f"[3/4] 執行Elasticsearch混合搜索 (檢索 {search_size} 個候選文檔)...")
+                candidates = self.es_client.hybrid_search(query, query_vector, search_size, category, doc_ids, knn_weight, index_name = self.index_name, include_embedding=needs_embeddings, field_filters=field_filters, field_boosts=field_boosts)
             
             if not candidates:
-                print("❌ 未找到相關文檔")
+                self.metrics.increment('empty_results')
+                print(f"❌ 未找到相關文檔: '{query}'")
                 return []
                 
-            print(f"✓ 找到 {len(candidates)} 個候選文檔")
+            self._log(f"✓ 找到 {len(candidates)} 個候選文檔")
             
+            degraded = False
             if use_rerank:
-                print(f"[4/4] 重新排序結果...")
+                self._log(f"[4/4] 重新排序結果...")
                 candidates_content = [
                     {
                         'id': candidate.get('_source', {}).get('doc_id'),
@@ -121,27 +360,45 @@ class SearchEngine:
                     } for candidate in candidates
                 ]
 
-                results = self.rerank_client.rerank(
-                    query,
-                    candidates_content,
-                    top_k=top_k,
-                )
-                print(f"✓ 完成重排序，返回前 {top_k} 個結果")
+                rerank_kwargs = {}
+                if needs_embeddings:
+                    for candidate_content, candidate in zip(candidates_content, candidates):
+                        candidate_content['embedding'] = candidate.get('_source', {}).get('embedding')
+                    rerank_kwargs['query_vector'] = query_vector
+
+                with self.metrics.stage('rerank'):
+                    results = self.rerank_client.rerank(
+                        query,
+                        candidates_content,
+                        top_k=top_k,
+                        **rerank_kwargs,
+                    )
+                # 重排序失敗時回傳的是原始順序或備案結果，不寫入快取，下次查詢重新排序
+                degraded = getattr(results, 'degraded', False)
+                if needs_embeddings:
+                    # 附上的 embedding 只供重排序使用，不回傳給呼叫端
+                    results = [{'id': result['id'], 'content': result['content']} for result in results]
+                self._log(f"✓ 完成重排序，返回前 {top_k} 個結果")
             else:
-                print("[4/4] 跳過重排序步驟...")
+                self._log("[4/4] 跳過重排序步驟...")
                 results = [
                     {
                         'id': candidate.get('_source', {}).get('doc_id'),
                         'content': candidate.get('_source', {}).get('content')
                     } for candidate in candidates[:top_k]
                 ]
-                print(f"✓ 直接返回前 {top_k} 個結果")
-            
+                self._log(f"✓ 直接返回前 {top_k} 個結果")
+
+            if cache_key is not None and results and not degraded:
+                self.result_cache.set(cache_key, results)
             return results
             
         except Exception as e:
+            self.metrics.increment('search_errors', error=type(e).__name__)
             print(f"❌ 搜索過程出錯: {e}")
             return []
+        finally:
+            self.metrics.record('retrieve', time.perf_counter() - start)
 
     def generate_response(self, query: str, context: str, doc_ids: List[str]) -> str:
         """生成回應"""
@@ -150,6 +407,99 @@ class SearchEngine:
             'retrieved_docs': doc_ids,
         }
 
+class AsyncSearchEngine:
+    """
+    SearchEngine 檢索流程的 asyncio 版本
+    單一查詢內 BM25 查詢與查詢嵌入同時進行；多個查詢可共用同一個事件迴圈與連線池
+    """
+
+    def __init__(self, llm_provider: str = "openai", rerank_mode: str = 'fast_rerank', index_name: str = DEFAULT_INDEX_NAME, search_backend: str = DEFAULT_SEARCH_BACKEND):
+        print("初始化非同步搜索引擎組件...")
+        self.es_client = AsyncSearchClient(search_backend)
+        self.embedding_client = AsyncEmbeddingClient()
+        self.rerank_client = AsyncRerankClient(mode=rerank_mode, llm_provider=llm_provider)
+        self.index_name = index_name
+        print("✓ 所有組件初始化完成")
+
+    async def retrieve(
+        self,
+        query: str,
+        category: str = None,
+        doc_ids: List[str] = [],
+        top_k: int = 3,
+        knn_weight: float = 0.7,
+        rerank_k: int = 10,
+        use_rerank: bool = True,
+    ) -> List[Dict]:
+        """執行搜索流程，參數與 SearchEngine.retrieve 相同"""
+        try:
+            search_size = rerank_k if use_rerank else top_k
+            needs_embeddings = use_rerank and self.rerank_client.needs_embeddings
+            filters = dict(size=search_size, category=category, doc_ids=doc_ids, index_name=self.index_name, include_embedding=needs_embeddings)
+
+            # BM25 不需要查詢向量，與嵌入請求同時送出；權重為 0 的查詢直接略過
+            bm25_task = None
+            if knn_weight != 1:
+                bm25_task = asyncio.create_task(self.es_client.bm25_search(query, **filters))
+
+            legs = []
+            query_vector = None
+            try:
+                if knn_weight != 0 or needs_embeddings:
+                    query_vector = await self.embedding_client.get_embedding(query)
+                if knn_weight != 0:
+                    knn_response = await self.es_client.knn_search(query_vector, **filters)
+                    legs.append((knn_response, knn_weight))
+            finally:
+                if bm25_task is not None:
+                    legs.insert(0, (await bm25_task, 1 - knn_weight))
+
+            candidates = self.es_client.fuse_responses(legs, top_k=search_size)
+            if not candidates:
+                print(f"❌ 未找到相關文檔: '{query}'")
+                return []
+
+            if use_rerank:
+                candidates_content = [
+                    {
+                        'id': candidate.get('_source', {}).get('doc_id'),
+                        'content': candidate.get('_source', {}).get('content')
+                    } for candidate in candidates
+                ]
+                if not needs_embeddings:
+                    return await self.rerank_client.rerank(query, candidates_content, top_k=top_k)
+
+                for candidate_content, candidate in zip(candidates_content, candidates):
+                    candidate_content['embedding'] = candidate.get('_source', {}).get('embedding')
+                results = await self.rerank_client.rerank(query, candidates_content, top_k=top_k, query_vector=query_vector)
+                return [{'id': result['id'], 'content': result['content']} for result in results]
+
+            return [
+                {
+                    'id': candidate.get('_source', {}).get('doc_id'),
+                    'content': candidate.get('_source', {}).get('content')
+                } for candidate in candidates[:top_k]
+            ]
+
+        except Exception as e:
+            print(f"❌ 搜索過程出錯: {e}")
+            return []
+
+    async def retrieve_many(self, requests: List[Dict]) -> List[List[Dict]]:
+        """
+        並行執行多個檢索，回傳順序與輸入一致
+
+        Args:
+            requests: 每個元素為 retrieve 的關鍵字參數，例如 {'query': '...', 'category': 'faq'}
+        """
+        return await asyncio.gather(*(self.retrieve(**request) for request in requests))
+
+    async def close(self) -> None:
+        await self.es_client.close()
+        await self.embedding_client.close()
+        await self.rerank_client.close()
+
+
 def load_documents(file_path: str) -> List[str]:
     """從文件加載文檔"""
     try:
@@ -168,6 +518,12 @@ def setup_argparse() -> argparse.ArgumentParser:
 使用範例:
   # 索引文檔
   python main.py --mode index --docs documents.json
+
+  # 從前處理輸出的分塊中介檔建立索引 (不重新解析與摘要)
+  python main.py --mode index --chunks chunks/finance.jsonl
+
+  # 重建索引: 寫入新的版本化索引，完成後原子地切換 ES_INDEX_NAME 別名 (服務中的查詢不受影響)，須包含所有類別的分塊檔
+  python main.py --mode rebuild --chunks chunks/
   
   # 搜索模式（包含 LLM 回應）
   python main.py --mode search --query "你的問題" --top-k 3
@@ -177,15 +533,26 @@ def setup_argparse() -> argparse.ArgumentParser:
   
   # 互動模式
   python main.py --mode interactive
+
+  # HTTP 服務模式 (GET /metrics 提供 Prometheus 格式的各階段耗時)
+  python main.py --mode serve --port 8000 --quiet --metrics-log logs/metrics.jsonl
         """
     )
     
     # 運行模式參數組
     mode_group = parser.add_argument_group('運行模式')
-    mode_group.add_argument('--mode', choices=['index', 'retrieve', 'search', 'interactive'],
+    mode_group.add_argument('--mode', choices=['index', 'rebuild', 'retrieve', 'search', 'interactive', 'serve'],
                            default='interactive', help='運行模式 (預設: interactive)')
-    mode_group.add_argument('--docs', type=str, help='文檔JSON文件路徑 (僅用於 index 模式)')
+    mode_group.add_argument('--docs', type=str, help='文檔JSON文件路徑 (僅用於 index / rebuild 模式)')
+    mode_group.add_argument('--chunks', type=str, nargs='+',
+                           help='前處理輸出的分塊中介檔 (JSONL) 或其所在目錄，可指定多個，取代 --docs (僅用於 index / rebuild 模式)')
+    mode_group.add_argument('--incremental', action='store_true',
+                           help='只嵌入並寫入內容變動的分塊，並刪除多出的舊分塊 (僅用於 index 模式)')
+    mode_group.add_argument('--force', action='store_true',
+                           help='新索引缺少類別或分塊數明顯減少時仍切換別名 (僅用於 rebuild 模式)')
     mode_group.add_argument('--query', type=str, help='搜索查詢 (用於 search 和 retrieve 模式)')
+    mode_group.add_argument('--host', type=str, default='0.0.0.0', help='HTTP 服務監聽位址 (僅用於 serve 模式)')
+    mode_group.add_argument('--port', type=int, default=8000, help='HTTP 服務埠號 (僅用於 serve 模式，預設: 8000)')
     
     # 搜索參數組
     search_group = parser.add_argument_group('搜索參數')
@@ -195,19 +562,53 @@ def setup_argparse() -> argparse.ArgumentParser:
     search_group.add_argument('--rerank-k', type=int, default=10, help='重排序候選數量 (預設: 10)')
     search_group.add_argument('--knn-weight', type=float, default=0.7, 
                             help='向量搜索權重 (0-1之間，預設: 0.7)')
+    search_group.add_argument('--multi-query', action='store_true',
+                            help='同時以規則改寫的查詢變體 (年份換算、關鍵詞) 搜索並融合結果')
     
     # 模型參數組
     model_group = parser.add_argument_group('模型參數')
-    model_group.add_argument('--rerank-mode', choices=['fast_rerank', 'llm_rerank'], default='llm_rerank',
+    model_group.add_argument('--rerank-mode', choices=['fast_rerank', 'llm_rerank', 'local_rerank'], default='llm_rerank',
                            help='重排序模式 (預設: fast_rerank)')
     model_group.add_argument('--llm-provider', type=str, default='openai',
                            choices=['openai', 'claude'],
                            help='LLM 提供商 (預設: openai)')
     model_group.add_argument('--use-rerank', type=bool, default=True,
                            help='是否使用重排序 (預設: True)')
+    model_group.add_argument('--search-mode', choices=['sequential', 'msearch', 'retriever'], default=DEFAULT_SEARCH_MODE,
+                           help=f'混合搜索模式 (預設: {DEFAULT_SEARCH_MODE})')
+    model_group.add_argument('--search-backend', choices=['elasticsearch', 'local'], default=DEFAULT_SEARCH_BACKEND,
+                           help=f'搜尋後端，local 為不需外部服務的行程內索引 (預設: {DEFAULT_SEARCH_BACKEND})')
+
+    # 監控參數組
+    metrics_group = parser.add_argument_group('監控參數')
+    metrics_group.add_argument('--quiet', action='store_true', help='不輸出檢索流程的進度訊息')
+    metrics_group.add_argument('--metrics-log', type=str, default=None,
+                               help='將各階段耗時與計數器以 JSON lines 附加寫入此檔案 (可選)')
 
     return parser
 
+def rebuild_index(engine: SearchEngine, args) -> Optional[str]:
+    """
+    將 --chunks 或 --docs 完整寫入新的版本化索引，完成後切換 engine.index_name 別名並使舊的檢索快取失效
+    新索引缺少目前服務中索引的類別或分塊數明顯減少時不切換 (--force 略過檢查)
+    """
+    alias = engine.index_name
+
+    def load(index_name: str) -> Dict[str, Any]:
+        # 寫入期間暫時改寫到新索引，別名仍指向舊索引
+        engine.index_name = index_name
+        try:
+            if args.chunks:
+                return engine.index_chunks(read_chunk_files(args.chunks, embedding_signature=engine.embedding_client.signature))
+            return engine.index_documents(load_documents(args.docs))
+        finally:
+            engine.index_name = alias
+
+    name = IndexManager(engine.es_client, alias=alias).rebuild(load, force=args.force)
+    if name:
+        engine.result_cache.invalidate(alias)
+    return name
+
 def interactive_mode(engine: SearchEngine):
     """互動模式"""
     print("\n=== 進入互動模式 ===")
@@ -263,16 +664,41 @@ def main():
     args = parser.parse_args()
     
     try:
-        engine = SearchEngine(llm_provider=args.llm_provider, rerank_mode=args.rerank_mode)
+        exporters = []
+        if args.mode == 'serve':
+            # 由 HTTP 服務的 /metrics 提供
+            exporters.append(PrometheusExporter())
+        if args.metrics_log:
+            exporters.append(JsonLogExporter(open(args.metrics_log, 'a', encoding='utf-8')))
+        engine = SearchEngine(
+            llm_provider=args.llm_provider,
+            rerank_mode=args.rerank_mode,
+            search_mode=args.search_mode,
+            search_backend=args.search_backend,
+            metrics=Metrics(exporters) if exporters else NULL_METRICS,
+            verbose=not args.quiet,
+        )
         
         if args.mode == 'index':
+            if args.chunks:
+                # 中介檔已完成解析、摘要與分塊，串流讀取後直接寫入
+                engine.index_chunks(read_chunk_files(args.chunks, embedding_signature=engine.embedding_client.signature), incremental=args.incremental)
+                return
             if not args.docs:
                 print("❌ 請提供文檔文件路徑")
                 return
             documents = load_documents(args.docs)
             if documents:
-                engine.es_client.create_index_mapping()
-                engine.index_documents(documents)
+                engine.index_documents(documents, incremental=args.incremental)
+
+        elif args.mode == 'rebuild':
+            if args.search_backend != 'elasticsearch':
+                print("❌ rebuild 模式僅支援 Elasticsearch 後端")
+                return
+            if not args.chunks and not args.docs:
+                print("❌ 請提供文檔文件或分塊中介檔路徑")
+                return
+            rebuild_index(engine, args)
                 
         elif args.mode == 'search':
             if not args.query:
@@ -286,6 +712,7 @@ def main():
                 doc_ids=args.doc_ids,
                 knn_weight=args.knn_weight,
                 use_rerank=args.use_rerank,
+                multi_query=args.multi_query,
             )
             if relevant_docs:
                 print("\n📚 找到的相關文檔:")
@@ -312,12 +739,16 @@ def main():
                 doc_ids=args.doc_ids,
                 knn_weight=args.knn_weight,
                 use_rerank=args.use_rerank,
+                multi_query=args.multi_query,
             )
 
             print(f"\n📚 找到的相關文檔:")
             for i, doc in enumerate(relevant_docs, 1):
                 print(f"{i}. {doc.get('content')}")
                 
+        elif args.mode == 'serve':
+            serve(engine, host=args.host, port=args.port)
+
         else:  # interactive mode
             interactive_mode(engine)
             
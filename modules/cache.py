@@ -0,0 +1,334 @@
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Optional, Iterable, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+
+import config
+
+
+class SqliteLRUCache:
+    def __init__(self, path: str, max_entries: int, table: str = 'cache'):
+        """
+        以 SQLite 實作的持久化 key-value 快取，超過容量時依最後存取時間淘汰
+
+        Args:
+            path: SQLite 檔案路徑
+            max_entries: 最多保留的項目數
+            table: 資料表名稱，同一個檔案可存放多種快取
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        # 多執行緒共用同一個連線，所有存取都經過 self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, last_access REAL NOT NULL)'
+        )
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)')
+
+    def get(self, key: str, touch: bool = True) -> Optional[bytes]:
+        return self.get_many([key], touch).get(key)
+
+    def get_many(self, keys: List[str], touch: bool = True) -> Dict[str, bytes]:
+        """批量讀取，回傳命中的項目；touch 為 True 時更新其存取時間 (LRU 淘汰依據)"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.lock:
+            # SQLite 預設最多 999 個綁定參數
+            for start in range(0, len(keys), 900):
+                part = keys[start:start + 900]
+                placeholders = ','.join('?' * len(part))
+                rows = self.conn.execute(
+                    f'SELECT key, value FROM {self.table} WHERE key IN ({placeholders})', part
+                ).fetchall()
+                found.update(rows)
+            if found and touch:
+                now = time.time()
+                self.conn.executemany(
+                    f'UPDATE {self.table} SET last_access = ? WHERE key = ?',
+                    [(now, key) for key in found]
+                )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        """批量寫入，寫入後淘汰超出容量的最舊項目"""
+        now = time.time()
+        rows = [(key, value, now) for key, value in items]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, last_access) VALUES (?, ?, ?)', rows
+            )
+            self._evict()
+            self.conn.execute('COMMIT')
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def _evict(self) -> None:
+        count = self.conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        self.conn.execute(
+            f'DELETE FROM {self.table} WHERE key IN '
+            f'(SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)',
+            (overflow,)
+        )
+        self.evictions += overflow
+
+    def clear(self) -> None:
+        with self.lock:
+            self.conn.execute(f'DELETE FROM {self.table}')
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """命中統計"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self),
+        }
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = config.EMBEDDING_CACHE_PATH, max_entries: int = config.EMBEDDING_CACHE_MAX_ENTRIES):
+        """以 (部署名稱, 正規化文本) 的雜湊為鍵，持久化保存嵌入向量 (float32)"""
+        self.store = SqliteLRUCache(path, max_entries, table='embeddings')
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """全形/半形統一並合併空白，避免僅格式不同的文本重複嵌入"""
+        return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+    def key(self, model: str, text: str) -> str:
+        return hashlib.sha256(f'{model}\x00{self.normalize(text)}'.encode('utf-8')).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """批量查詢，回傳與輸入順序一致的向量列表，未命中的位置為 None"""
+        keys = [self.key(model, text) for text in texts]
+        found = self.store.get_many(keys)
+        results = []
+        for key in keys:
+            value = found.get(key)
+            results.append(array('f', value).tolist() if value is not None else None)
+        return results
+
+    def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        self.store.set_many(
+            (self.key(model, text), array('f', embedding).tobytes())
+            for text, embedding in zip(texts, embeddings)
+            if embedding is not None
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return self.store.stats()
+
+
+class RerankCache:
+    def __init__(self, path: str = config.RERANK_CACHE_PATH, max_entries: int = config.RERANK_CACHE_MAX_ENTRIES):
+        """以 (模型, 查詢, 依序排列的候選文檔內容雜湊) 為鍵，持久化保存 LLM 重排序的選擇與相關度分數"""
+        self.store = SqliteLRUCache(path, max_entries, table='rerank_decisions')
+
+    @staticmethod
+    def key(model: str, query: str, contents: List[str]) -> str:
+        content_hashes = [hashlib.sha256((content or '').encode('utf-8')).hexdigest() for content in contents]
+        payload = json.dumps([model, EmbeddingCache.normalize(query), content_hashes])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, query: str, contents: List[str]) -> Optional[Tuple[List[int], List[float]]]:
+        value = self.store.get(self.key(model, query, contents))
+        if value is None:
+            return None
+        decision = json.loads(value)
+        return decision['choices'], decision['relevances']
+
+    def set(self, model: str, query: str, contents: List[str], decision: Tuple[List[int], List[float]]) -> None:
+        choices, relevances = decision
+        value = json.dumps({'choices': choices, 'relevances': relevances})
+        self.store.set(self.key(model, query, contents), value.encode('utf-8'))
+
+    def stats(self) -> Dict[str, float]:
+        return self.store.stats()
+
+
+class MemoryLRUCache:
+    def __init__(self, max_entries: int, ttl: float = 0):
+        """
+        行程內的 LRU 快取，項目超過 ttl 秒後視為過期
+
+        Args:
+            max_entries: 最多保留的項目數
+            ttl: 存活秒數，0 表示不過期
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()  # key -> (到期時間, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl else 0
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self),
+        }
+
+
+class ResultCache:
+    BACKENDS = ('memory', 'sqlite', 'none')
+
+    def __init__(
+        self,
+        backend: str = config.RESULT_CACHE_BACKEND,
+        ttl: float = config.RESULT_CACHE_TTL,
+        max_entries: int = config.RESULT_CACHE_MAX_ENTRIES,
+        path: str = config.RESULT_CACHE_PATH,
+    ):
+        """
+        檢索結果快取，鍵為 (索引名稱, 索引版本, 正規化查詢, 檢索參數)
+
+        索引寫入後呼叫 invalidate() 更換索引版本，舊版本的項目不再命中並隨 LRU 淘汰。
+        兩種後端的索引版本號都存在 RESULT_CACHE_PATH 的 SQLite 檔案中，每次產生鍵時讀取，
+        因此前處理腳本等其他行程寫入索引後，執行中的服務 (即使使用 memory 後端) 也會一起失效。
+
+        Args:
+            backend: memory (行程內 LRU)、sqlite (磁碟共享) 或 none (停用)
+            ttl: 項目存活秒數，0 表示不過期
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"不支持的結果快取後端: {backend}")
+        self.backend = backend
+        self.ttl = ttl
+        if backend == 'memory':
+            self.store = MemoryLRUCache(max_entries, ttl)
+        elif backend == 'sqlite':
+            self.store = SqliteLRUCache(path, max_entries, table='results')
+        else:
+            self.store = None
+        # 索引版本號在行程間共用；SqliteLRUCache 內部以鎖保護，多執行緒的服務可同時讀寫
+        self.versions = SqliteLRUCache(path, 10000, table='index_versions') if self.store is not None else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    def _version(self, index_name: str) -> str:
+        # 只讀取不更新存取時間，每次查詢不產生寫入
+        value = self.versions.get(index_name, touch=False)
+        return value.decode('utf-8') if value is not None else ''
+
+    def invalidate(self, index_name: str) -> None:
+        """索引內容變動後呼叫，使該索引的所有快取結果失效"""
+        if not self.enabled:
+            return
+        self.versions.set(index_name, uuid.uuid4().hex.encode('utf-8'))
+
+    def key(self, index_name: str, query: str, params: Dict) -> str:
+        payload = json.dumps(
+            [index_name, self._version(index_name), EmbeddingCache.normalize(query), params],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        if not self.enabled:
+            return None
+        if self.backend == 'memory':
+            results = self.store.get(key)
+        else:
+            value = self.store.get(key)
+            if value is None:
+                return None
+            entry = json.loads(value)
+            if entry['expires'] and entry['expires'] < time.time():
+                self.store.delete(key)
+                return None
+            results = entry['results']
+        # 回傳副本，避免呼叫端修改到快取內容
+        return [dict(result) for result in results] if results is not None else None
+
+    def set(self, key: str, results: List[Dict]) -> None:
+        if not self.enabled:
+            return
+        results = [dict(result) for result in results]
+        if self.backend == 'memory':
+            self.store.set(key, results)
+        else:
+            expires = time.time() + self.ttl if self.ttl else 0
+            self.store.set(key, json.dumps({'expires': expires, 'results': results}, ensure_ascii=False).encode('utf-8'))
+
+    def clear(self) -> None:
+        if self.enabled:
+            self.store.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return self.store.stats() if self.enabled else {}
@@ -0,0 +1,297 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
+import json
+import os
+
+import numpy as np
+
+from modules.finance_fields import FIELDS as EXTRA_FIELDS
+
+
+class ChunkFileWriter:
+    def __init__(self, path: str, with_embeddings: bool = False, embedding_signature: str = None):
+        """
+        將分塊寫入 JSONL 中介檔，每行欄位為 id、sn、category、text、content_hash，以及財報分塊的 companies、years、quarters
+
+        with_embeddings 為 True 時，嵌入向量以 float32 依序附加於 {path}.f32，行內以 embedding_row 指向所在列，
+        維度與嵌入設定 (embedding_signature: 模型、維度與投影) 記錄於 {path}.meta.json，讀取時以 memmap 載入。
+        檔案以附加模式開啟，中斷後可接續寫入。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.with_embeddings = with_embeddings
+        _finish_compaction(path)
+        _truncate_partial_line(path)
+        self.file = open(path, 'a', encoding='utf-8')
+        self.embedding_file = None
+        self.dims = None
+        self.rows = 0
+        self.embedding_signature = None
+        if with_embeddings:
+            self.dims = _read_meta(path).get('dims')
+            self.use_embedding_signature(embedding_signature)
+            self.embedding_file = open(f'{path}.f32', 'ab')
+            if self.dims:
+                # 中斷時可能留下不完整的一列，截斷到完整列的邊界
+                row_bytes = self.dims * 4
+                self.rows = self.embedding_file.tell() // row_bytes
+                self.embedding_file.truncate(self.rows * row_bytes)
+
+    def use_embedding_signature(self, signature: Optional[str]) -> None:
+        """設定寫入向量的嵌入設定；檔案中已有其他設定產生的向量時拋出 ValueError，避免不同模型的向量混在同一個檔案"""
+        stored = _read_meta(self.path).get('embedding')
+        if signature and stored and stored != signature:
+            raise ValueError(f"{self.path} 的嵌入向量來自 {stored}，與目前的嵌入設定 {signature} 不同，請改用新的檔案")
+        self.embedding_signature = signature
+
+    def write(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Args:
+            chunk: SearchEngine 內部的分塊格式 (doc_id、sn、category、content、content_hash，可選 embedding)
+
+        Returns:
+            寫入的紀錄 (含 embedding_row)
+        """
+        record = {
+            'id': chunk['doc_id'],
+            'sn': chunk['sn'],
+            'category': chunk['category'],
+            'text': chunk['content'],
+            'content_hash': chunk.get('content_hash'),
+        }
+        record.update({field: chunk[field] for field in EXTRA_FIELDS if chunk.get(field)})
+        embedding = chunk.get('embedding')
+        if self.with_embeddings and embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            if self.dims is None:
+                self.dims = len(vector)
+                with open(f'{self.path}.meta.json', 'w', encoding='utf-8') as f:
+                    json.dump({'dims': self.dims, 'embedding': self.embedding_signature}, f)
+            elif len(vector) != self.dims:
+                raise ValueError(f"嵌入向量維度不一致: {len(vector)} != {self.dims}")
+            # 先寫入向量再寫入指向它的行，中斷時最多留下未被引用的向量
+            self.embedding_file.write(vector.tobytes())
+            self.embedding_file.flush()
+            record['embedding_row'] = self.rows
+            self.rows += 1
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return record
+
+    def delete(self, category: str, doc_id: str, sn: int) -> Dict[str, Any]:
+        """寫入刪除標記並回傳，讀取時該分塊與之前寫入的版本都會略過"""
+        record = {'id': doc_id, 'sn': sn, 'category': category, 'deleted': True}
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return record
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+        if self.embedding_file is not None:
+            self.embedding_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _truncate_partial_line(path: str) -> None:
+    """中斷寫入可能留下沒有換行的最後一行，截斷到最後一個換行之後，避免接續寫入的紀錄與其接在同一行而無法解析"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        end = position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b'\n')
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+            print(f"❌ {path} 的最後一行不完整 (寫入中斷)，已截斷 {end - position} 位元組")
+
+
+def _iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """逐行解析分塊檔，略過空行與寫入中斷留下的最後一行 (沒有換行)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                # ChunkFileWriter 每筆紀錄都以換行結尾，只有最後一行可能不完整
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_records(path: str) -> int:
+    """分塊檔的紀錄行數 (含已被覆蓋的紀錄與刪除標記)"""
+    return sum(1 for _ in _iter_records(path))
+
+
+def _read_meta(path: str) -> Dict[str, Any]:
+    meta_path = f'{path}.meta.json'
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def embedding_signature_of(path: str) -> Optional[str]:
+    """分塊檔中嵌入向量的嵌入設定 (EmbeddingClient.signature)，舊版檔案未記錄時回傳 None"""
+    return _read_meta(path).get('embedding')
+
+
+def load_embeddings(path: str) -> Optional[np.ndarray]:
+    """以 memmap 載入分塊檔的嵌入向量，沒有嵌入向量時回傳 None"""
+    dims = _read_meta(path).get('dims')
+    embedding_path = f'{path}.f32'
+    if not dims or not os.path.exists(embedding_path) or not os.path.getsize(embedding_path):
+        return None
+    embeddings = np.memmap(embedding_path, dtype=np.float32, mode='r')
+    rows = len(embeddings) // dims
+    return embeddings[:rows * dims].reshape(rows, dims)
+
+
+def read_chunks(path: str, include_embeddings: bool = True, embedding_signature: str = None) -> Iterator[Dict[str, Any]]:
+    """
+    串流讀取分塊檔，轉為 SearchEngine 內部的分塊格式
+
+    同一個 (category, id, sn) 重複出現時 (例如中斷後重新寫入同一個來源) 只輸出最後一筆，最後一筆為刪除標記時不輸出；
+    第一次掃描只記錄各鍵最後出現的行號，記憶體用量與分塊數成正比而與文本大小無關。
+
+    Args:
+        embedding_signature: 目前的嵌入設定；提供時，檔案記錄的設定不同 (或未記錄) 的嵌入向量不輸出，由寫入流程重新嵌入
+    """
+    if include_embeddings and embedding_signature is not None and load_embeddings(path) is not None:
+        stored = embedding_signature_of(path)
+        if stored != embedding_signature:
+            print(f"❌ {path} 的嵌入向量來自 {stored or '(未記錄)'}，與目前的嵌入設定 {embedding_signature} 不同，將重新嵌入")
+            include_embeddings = False
+    _finish_compaction(path)
+    last_line = {}
+    for line_no, record in enumerate(_iter_records(path)):
+        last_line[(record['category'], record['id'], record['sn'])] = line_no
+
+    embeddings = load_embeddings(path) if include_embeddings else None
+    for line_no, record in enumerate(_iter_records(path)):
+        if last_line[(record['category'], record['id'], record['sn'])] != line_no or record.get('deleted'):
+            continue
+        chunk = {
+            'doc_id': record['id'],
+            'sn': record['sn'],
+            'category': record['category'],
+            'content': record['text'],
+            'content_hash': record['content_hash'],
+        }
+        chunk.update({field: record[field] for field in EXTRA_FIELDS if field in record})
+        row = record.get('embedding_row')
+        if embeddings is not None and row is not None and row < len(embeddings):
+            chunk['embedding'] = embeddings[row].tolist()
+        yield chunk
+
+
+def expand_chunk_paths(paths: Iterable[str]) -> List[str]:
+    """展開分塊檔路徑，目錄取其中所有的 .jsonl (依檔名排序)"""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith('.jsonl')
+            ))
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def read_chunk_files(paths: Iterable[str], include_embeddings: bool = True, embedding_signature: str = None) -> Iterator[Dict[str, Any]]:
+    """依序串流讀取多個分塊檔或目錄，格式同 read_chunks，嵌入設定逐檔檢查"""
+    for path in expand_chunk_paths(paths):
+        yield from read_chunks(path, include_embeddings, embedding_signature)
+
+
+def latest_records(path: str) -> List[Dict[str, Any]]:
+    """
+    讀取分塊檔中每個 (category, id, sn) 最後一筆未刪除的原始紀錄 (含 embedding_row)
+    與 read_chunks 不同，整個檔案的紀錄會同時保留在記憶體中
+    """
+    _finish_compaction(path)
+    records = {}
+    for record in _iter_records(path):
+        key = (record['category'], record['id'], record['sn'])
+        if record.get('deleted'):
+            records.pop(key, None)
+        else:
+            records[key] = record
+    return list(records.values())
+
+
+def _finish_compaction(path: str) -> None:
+    """
+    完成中斷的壓縮：標記檔存在表示新的 .jsonl 與 .f32 已完整寫入，將尚未換上的檔案換上
+    兩個檔案無法以單一操作同時替換，沒有標記檔時不會只換上其中一個
+    """
+    marker = f'{path}.compact'
+    if not os.path.exists(marker):
+        return
+    for target in (f'{path}.f32', path):
+        if os.path.exists(f'{target}.tmp'):
+            os.replace(f'{target}.tmp', target)
+    os.remove(marker)
+
+
+def _write_synced(path: str, mode: str, write) -> None:
+    with open(path, mode) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def compact_chunk_file(path: str) -> Tuple[int, int]:
+    """
+    壓縮附加寫入的分塊檔：只保留每個 (category, id, sn) 最後一筆未刪除的紀錄，
+    嵌入向量依新的順序重寫並重新編號 embedding_row，不再被引用的向量一併移除
+
+    Returns:
+        (壓縮前的行數, 壓縮後的行數)
+    """
+    records = latest_records(path)
+    lines = count_records(path)
+    # 先前中斷 (尚未建立標記檔) 留下的暫存檔不可沿用
+    for stale in (f'{path}.tmp', f'{path}.f32.tmp'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    embeddings = load_embeddings(path)
+
+    compacted = []
+    rows = []
+    for record in records:
+        record = dict(record)
+        row = record.pop('embedding_row', None)
+        if embeddings is not None and row is not None and row < len(embeddings):
+            record['embedding_row'] = len(rows)
+            rows.append(row)
+        compacted.append(record)
+
+    def write_records(f) -> None:
+        for record in compacted:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def write_embeddings(f) -> None:
+        # 分段複製，避免一次將整個 memmap 讀入記憶體
+        for start in range(0, len(rows), 10000):
+            f.write(np.ascontiguousarray(embeddings[rows[start:start + 10000]]).tobytes())
+
+    _write_synced(f'{path}.tmp', 'w', write_records)
+    if embeddings is not None:
+        _write_synced(f'{path}.f32.tmp', 'wb', write_embeddings)
+    # 兩個新檔案都寫入完成後才建立標記檔，之後中斷也能由 _finish_compaction 接續完成替換
+    _write_synced(f'{path}.compact', 'w', lambda f: f.write('1'))
+    _finish_compaction(path)
+    return lines, len(compacted)
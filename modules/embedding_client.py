@@ -1,23 +1,196 @@
-from openai import AzureOpenAI
-from typing import List
+from openai import AzureOpenAI, AsyncAzureOpenAI, BadRequestError
+from typing import List, Optional
 import config
 
+from modules.cache import EmbeddingCache
+from modules.embedding_projection import EmbeddingProjection, load_projection
+from modules.metrics import NULL_METRICS
+from modules.rate_limiter import get_rate_limiter
+
+def embedding_signature(cache_model: str, projection: Optional[EmbeddingProjection]) -> str:
+    """嵌入設定 (模型、維度與投影) 的識別字串，設定不同的向量不可混用"""
+    return f'{cache_model}+pca:{projection.fingerprint}' if projection else cache_model
+
+
 class EmbeddingClient:
-    def __init__(self):
+    def __init__(
+        self,
+        use_cache: bool = config.EMBEDDING_CACHE_ENABLED,
+        dimensions: int = config.EMBEDDING_DIMENSIONS,
+        projection_path: str = config.EMBEDDING_PROJECTION_PATH,
+    ):
         self.client = AzureOpenAI(
             api_key=config.AZURE_OPENAI_API_KEY,
             api_version=config.AZURE_OPENAI_API_VERSION,
             azure_endpoint=config.AZURE_OPENAI_ENDPOINT
         )
+        self.model = config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+        # dimensions 不同時 API 回傳不同的向量，快取分開存放；PCA 投影在讀出快取後才套用，更換投影不需重新呼叫 API
+        self.request_options = {'dimensions': dimensions} if dimensions else {}
+        self.cache_model = f'{self.model}@{dimensions}' if dimensions else self.model
+        self.projection = load_projection(projection_path)
+        self.signature = embedding_signature(self.cache_model, self.projection)
+        self.cache = EmbeddingCache() if use_cache else None
+        self.rate_limiter = get_rate_limiter('embedding')
+        self.metrics = NULL_METRICS
         
     def get_embedding(self, text: str) -> List[float]:
-        """獲取文本嵌入向量"""
+        """獲取文本嵌入向量，優先讀取快取"""
+        if self.cache:
+            cached = self.cache.get_many(self.cache_model, [text])[0]
+            if cached is not None:
+                self.metrics.increment('embedding_cache_hits')
+                return self._project([cached])[0]
+            self.metrics.increment('embedding_cache_misses')
+        try:
+            self.rate_limiter.acquire()
+            response = self.client.embeddings.create(
+                input=text,
+                model=self.model,
+                **self.request_options
+            )
+            embedding = response.data[0].embedding
+            if self.cache:
+                self.cache.set_many(self.cache_model, [text], [embedding])
+            return self._project([embedding])[0]
+        except Exception as e:
+            print(f"獲取嵌入向量時出錯: {e}")
+            raise
+
+    def get_embeddings(
+        self,
+        texts: List[str],
+        max_batch_size: int = config.EMBEDDING_MAX_BATCH_SIZE,
+        max_batch_tokens: int = config.EMBEDDING_MAX_BATCH_TOKENS,
+    ) -> List[Optional[List[float]]]:
+        """
+        批量獲取文本嵌入向量
+
+        Args:
+            texts: 文本列表
+            max_batch_size: 每個請求最多包含的文本數
+            max_batch_tokens: 每個請求的估計 token 上限
+
+        Returns:
+            List: 與輸入順序一致的嵌入向量列表，被 API 拒絕的文本對應 None
+        """
+        results = self.cache.get_many(self.cache_model, texts) if self.cache else [None] * len(texts)
+        if self.cache:
+            misses = sum(result is None for result in results)
+            self.metrics.increment('embedding_cache_hits', len(texts) - misses)
+            self.metrics.increment('embedding_cache_misses', misses)
+
+        # 只嵌入快取未命中的文本，重複的文本只送出一次
+        pending = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+        if pending:
+            embedded = [None] * len(pending)
+            for indices in self._pack_batches(pending, max_batch_size, max_batch_tokens):
+                self._embed_batch(pending, indices, embedded)
+            if self.cache:
+                self.cache.set_many(self.cache_model, pending, embedded)
+            lookup = dict(zip(pending, embedded))
+            results = [result if result is not None else lookup[text] for text, result in zip(texts, results)]
+
+        return self._project(results)
+
+    def _project(self, embeddings: List[Optional[List[float]]]) -> List[Optional[List[float]]]:
+        """套用 EMBEDDING_PROJECTION_PATH 的 PCA 投影，寫入索引與查詢的向量經過相同的轉換"""
+        return self.projection.apply(embeddings) if self.projection else embeddings
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """粗估 token 數：中文約 1.5 token/字、英文約 4 字元/token，以 UTF-8 位元組數的一半估計"""
+        return len(text.encode('utf-8')) // 2 + 1
+
+    def _pack_batches(self, texts: List[str], max_batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+        """依文本數與估計 token 數將輸入切成多個批次，回傳每批的索引"""
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for idx, text in enumerate(texts):
+            tokens = self._estimate_tokens(text)
+            if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(idx)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, texts: List[str], indices: List[int], results: List[Optional[List[float]]]) -> None:
+        """嵌入一個批次；若請求被拒絕則對半拆分重試，直到定位出無法嵌入的單一文本"""
         try:
+            self.rate_limiter.acquire()
             response = self.client.embeddings.create(
+                input=[texts[idx] for idx in indices],
+                model=self.model,
+                **self.request_options
+            )
+        except BadRequestError as e:
+            if len(indices) == 1:
+                print(f"文本 {indices[0]} 無法獲取嵌入向量: {e}")
+                return
+            mid = len(indices) // 2
+            self._embed_batch(texts, indices[:mid], results)
+            self._embed_batch(texts, indices[mid:], results)
+            return
+        except Exception as e:
+            print(f"批量獲取嵌入向量時出錯: {e}")
+            raise
+
+        for item in response.data:
+            results[indices[item.index]] = item.embedding
+
+
+class AsyncEmbeddingClient:
+    """EmbeddingClient 的 asyncio 版本，與同步版本共用快取與限流額度"""
+
+    def __init__(
+        self,
+        use_cache: bool = config.EMBEDDING_CACHE_ENABLED,
+        dimensions: int = config.EMBEDDING_DIMENSIONS,
+        projection_path: str = config.EMBEDDING_PROJECTION_PATH,
+    ):
+        self.client = AsyncAzureOpenAI(
+            api_key=config.AZURE_OPENAI_API_KEY,
+            api_version=config.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=config.AZURE_OPENAI_ENDPOINT
+        )
+        self.model = config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+        self.request_options = {'dimensions': dimensions} if dimensions else {}
+        self.cache_model = f'{self.model}@{dimensions}' if dimensions else self.model
+        self.projection = load_projection(projection_path)
+        self.signature = embedding_signature(self.cache_model, self.projection)
+        self.cache = EmbeddingCache() if use_cache else None
+        self.rate_limiter = get_rate_limiter('embedding')
+        self.metrics = NULL_METRICS
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """獲取文本嵌入向量，優先讀取快取"""
+        if self.cache:
+            cached = self.cache.get_many(self.cache_model, [text])[0]
+            if cached is not None:
+                self.metrics.increment('embedding_cache_hits')
+                return self._project([cached])[0]
+            self.metrics.increment('embedding_cache_misses')
+        try:
+            await self.rate_limiter.acquire_async()
+            response = await self.client.embeddings.create(
                 input=text,
-                model=config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+                model=self.model,
+                **self.request_options
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            if self.cache:
+                self.cache.set_many(self.cache_model, [text], [embedding])
+            return self._project([embedding])[0]
         except Exception as e:
             print(f"獲取嵌入向量時出錯: {e}")
-            raise 
\ No newline at end of file
+            raise
+
+    _project = EmbeddingClient._project
+
+    async def close(self) -> None:
+        await self.client.close()
@@ -0,0 +1,87 @@
+from typing import List, Optional
+import hashlib
+import os
+
+import numpy as np
+
+import config
+
+
+class EmbeddingProjection:
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        """
+        以 PCA 將嵌入向量降維，投影後重新正規化 (cosine 相似度不受長度影響)
+
+        Args:
+            mean: 擬合時嵌入向量的平均值，形狀 (原始維度,)
+            components: 主成分，形狀 (降維後維度, 原始維度)
+        """
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def fingerprint(self) -> str:
+        """投影內容的雜湊，用於辨識寫入索引的向量經過哪一個投影"""
+        digest = hashlib.sha256(self.mean.tobytes())
+        digest.update(self.components.tobytes())
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, dims: int, max_samples: int = 50000, seed: int = 0) -> 'EmbeddingProjection':
+        """以分塊的嵌入向量擬合 PCA，分塊數超過 max_samples 時隨機取樣"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if dims >= embeddings.shape[1]:
+            raise ValueError(f"降維後維度須小於原始維度: {dims} >= {embeddings.shape[1]}")
+        if len(embeddings) > max_samples:
+            rows = np.random.default_rng(seed).choice(len(embeddings), max_samples, replace=False)
+            embeddings = embeddings[np.sort(rows)]
+        mean = embeddings.mean(axis=0)
+        _, _, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        return cls(mean, vt[:dims])
+
+    @classmethod
+    def load(cls, path: str) -> 'EmbeddingProjection':
+        with np.load(path) as data:
+            return cls(data['mean'], data['components'])
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, mean=self.mean, components=self.components)
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        projected = (np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return projected / np.where(norms > 0, norms, 1)
+
+    def apply(self, embeddings: List[Optional[List[float]]]) -> List[Optional[List[float]]]:
+        """投影 API 回傳的向量列表，None (無法嵌入的文本) 保持為 None"""
+        present = [idx for idx, embedding in enumerate(embeddings) if embedding is not None]
+        results = list(embeddings)
+        if present:
+            projected = self.transform([embeddings[idx] for idx in present])
+            for idx, vector in zip(present, projected):
+                results[idx] = vector.tolist()
+        return results
+
+
+def truncate_embeddings(embeddings: np.ndarray, dims: int) -> np.ndarray:
+    """取前 dims 維並重新正規化，與 text-embedding-3 系列模型的 dimensions 參數結果相同"""
+    truncated = np.asarray(embeddings, dtype=np.float32)[..., :dims]
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+    return truncated / np.where(norms > 0, norms, 1)
+
+
+def load_projection(path: str = config.EMBEDDING_PROJECTION_PATH) -> Optional[EmbeddingProjection]:
+    """讀取 EMBEDDING_PROJECTION_PATH 指定的投影，未設定時回傳 None"""
+    if not path:
+        return None
+    projection = EmbeddingProjection.load(path)
+    print(f"✓ 已載入嵌入向量投影 {path} ({projection.components.shape[1]} -> {projection.dims} 維)")
+    return projection
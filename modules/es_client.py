@@ -1,16 +1,38 @@
-from elasticsearch import Elasticsearch
-from typing import List, Dict, Any
+from elasticsearch import Elasticsearch, AsyncElasticsearch, ApiError, NotFoundError, helpers
+from typing import List, Dict, Any, Iterable, Tuple
 import config
 from uuid import uuid5, NAMESPACE_DNS
 import copy
 
 from modules.rrf import WeightedRRFImplementation
+from modules.fusion import FusionEngine
+from modules.metrics import NULL_METRICS
 
 DEFAULT_INDEX_NAME = config.ES_INDEX_NAME
 
+RRF_RANK_CONSTANT = 60.0
+# 混合搜索結果的融合方式: rrf, combsum, combmnz, convex (見 modules/fusion.py)
+FUSION_METHOD = config.FUSION_METHOD
+# rrf retriever 正式支援的版本，以及支援各子 retriever 權重的版本
+RRF_RETRIEVER_MIN_VERSION = (8, 16)
+WEIGHTED_RRF_RETRIEVER_MIN_VERSION = (8, 19)
+# doc_ids 過濾的文檔數不超過此值時，以 script_score 精確計算 cosine 取代近似 kNN (0 表示停用)
+EXACT_KNN_MAX_DOC_IDS = config.EXACT_KNN_MAX_DOC_IDS
+# 量化索引 (int8_hnsw / bbq_hnsw) 的近似 kNN 以原始 float 向量重新計分的候選倍數 (0 表示不重新計分，需 ES 8.18 以上)
+KNN_RESCORE_OVERSAMPLE = config.ES_KNN_RESCORE_OVERSAMPLE
+FINANCE_FIELD_BOOST = config.FINANCE_FIELD_BOOST
+
 class ElasticsearchClient:
-    def __init__(self):
-        self.es = Elasticsearch(config.ES_HOST)
+    def __init__(self, search_mode: str = config.ES_SEARCH_MODE):
+        """
+        Args:
+            search_mode: 混合搜索模式 sequential / msearch / retriever，詳見 hybrid_search
+        """
+        self.es = Elasticsearch(config.ES_HOST, connections_per_node=config.ES_CONNECTIONS_PER_NODE)
+        self.search_mode = search_mode
+        self._version = None
+        self._rrf_retriever_available = None
+        self.metrics = NULL_METRICS
         
     # def create_index_mapping(self):
     #     """創建Elasticsearch索引映射"""
@@ -33,6 +55,15 @@ class ElasticsearchClient:
     #     except Exception as e:
     #         print(f"創建索引映射時出錯: {e}")
             
+    def ping(self) -> bool:
+        """健康檢查：Elasticsearch 是否可連線"""
+        return bool(self.es.ping())
+
+    @staticmethod
+    def gen_document_id(category: str, doc_id: str, sn: int) -> str:
+        """以 category、doc_id、sn 產生固定的文檔 _id"""
+        return str(uuid5(NAMESPACE_DNS, f"{category}_{doc_id}_{sn}"))
+
     def index_document(self, index_name: str, doc_id: str, sn: int, category: str, content: str, embedding: List[float]):
         """索引單個文檔"""
         try:
@@ -44,13 +75,183 @@ class ElasticsearchClient:
                 'embedding': embedding
             }
             name = f"{category}_{doc_id}_{sn}"
-            uuid = str(uuid5(NAMESPACE_DNS, name))
+            uuid = self.gen_document_id(category, doc_id, sn)
             self.es.index(index=index_name, id=uuid, body=document)
         except Exception as e:
             print(f"索引文檔 {name} 時出錯: {e}")
-            
 
-    def gen_bm25_query(self, basic_query: Dict[str, Any], bool_query: Dict[str, Any], query_text: str, size: int) -> Dict[str, Any]:
+    def bulk_index_documents(
+        self,
+        index_name: str,
+        documents: Iterable[Dict[str, Any]],
+        chunk_size: int = 500,
+        max_chunk_bytes: int = 10 * 1024 * 1024,
+    ) -> Dict[str, Any]:
+        """
+        使用 _bulk API 批量索引文檔
+
+        Args:
+            index_name: 索引名稱
+            documents: 文檔列表，每個文檔需包含 doc_id、sn、category、content、embedding
+            chunk_size: 每個 _bulk 請求的最大文檔數
+            max_chunk_bytes: 每個 _bulk 請求的最大位元組數
+
+        Returns:
+            Dict: {'indexed': 成功數量, 'failed': [{'doc_id', 'sn', 'category', 'status', 'error'}]}
+        """
+        docs_by_id = {
+            self.gen_document_id(doc['category'], doc['doc_id'], doc['sn']): doc
+            for doc in documents
+        }
+        actions = (
+            {
+                '_op_type': 'index',
+                '_index': index_name,
+                '_id': uuid,
+                '_source': doc,
+            }
+            for uuid, doc in docs_by_id.items()
+        )
+
+        indexed = 0
+        failed = []
+        done = set()
+        try:
+            # 遇到 429 時 streaming_bulk 會自動退避重試，回傳順序因此不保證與輸入一致，以 _id 對應回文檔
+            for ok, item in helpers.streaming_bulk(
+                self.es,
+                actions,
+                chunk_size=chunk_size,
+                max_chunk_bytes=max_chunk_bytes,
+                max_retries=3,
+                raise_on_error=False,
+                raise_on_exception=False,
+            ):
+                info = next(iter(item.values()), {})
+                uuid = info.get('_id')
+                done.add(uuid)
+                if ok:
+                    indexed += 1
+                else:
+                    failed.append(self._failed_item(docs_by_id[uuid], info.get('status'), info.get('error')))
+        except Exception as e:
+            # 連線層錯誤會中斷整個批次，尚未回報結果的文檔全部視為失敗
+            print(f"批量索引時出錯: {e}")
+            failed.extend(
+                self._failed_item(doc, None, str(e))
+                for uuid, doc in docs_by_id.items() if uuid not in done
+            )
+
+        return {'indexed': indexed, 'failed': failed}
+
+    @staticmethod
+    def _failed_item(doc: Dict[str, Any], status: Any, error: Any) -> Dict[str, Any]:
+        return {
+            'doc_id': doc['doc_id'],
+            'sn': doc['sn'],
+            'category': doc['category'],
+            'status': status,
+            'error': error,
+        }
+
+    def get_content_hashes(self, index_name: str, ids: List[str], batch_size: int = 1000) -> Dict[str, str]:
+        """
+        以 mget 讀取已索引分塊的 content_hash，用於增量索引
+
+        Returns:
+            Dict: {_id: content_hash}，不存在或沒有 content_hash 的分塊不會出現
+        """
+        hashes = {}
+        for start in range(0, len(ids), batch_size):
+            try:
+                response = self.es.mget(index=index_name, ids=ids[start:start + batch_size], source_includes=['content_hash'])
+            except NotFoundError:
+                # 索引尚未建立，所有分塊都視為新的
+                return {}
+            for doc in response['docs']:
+                content_hash = doc.get('_source', {}).get('content_hash') if doc.get('found') else None
+                if content_hash:
+                    hashes[doc['_id']] = content_hash
+        return hashes
+
+    def delete_stale_chunks(self, index_name: str, chunk_counts: Dict[Tuple[str, str], int], batch_size: int = 200) -> int:
+        """
+        刪除文檔重新分塊後多出來的舊分塊 (sn >= 新的分塊數)
+
+        Args:
+            chunk_counts: {(category, doc_id): 新的分塊數}
+
+        Returns:
+            int: 刪除的分塊數
+        """
+        items = list(chunk_counts.items())
+        deleted = 0
+        for start in range(0, len(items), batch_size):
+            should = [
+                {
+                    "bool": {
+                        "filter": [
+                            {"term": {"category": category}},
+                            {"term": {"doc_id": doc_id}},
+                            {"range": {"sn": {"gte": count}}},
+                        ]
+                    }
+                }
+                for (category, doc_id), count in items[start:start + batch_size]
+            ]
+            try:
+                response = self.es.delete_by_query(
+                    index=index_name,
+                    query={"bool": {"should": should, "minimum_should_match": 1}},
+                    conflicts='proceed',
+                )
+            except NotFoundError:
+                return deleted
+            deleted += response.get('deleted', 0)
+        return deleted
+
+    def gen_basic_query(self, size: int, include_embedding: bool = False) -> Dict[str, Any]:
+        return {
+            "size": size,
+            "_source": {"excludes": [] if include_embedding else ["embedding"]},
+        }
+
+    def gen_filter_query(self, category: str = None, doc_ids: List[str] = [], field_filters: Dict[str, List[str]] = None) -> Dict[str, Any]:
+        """
+        Args:
+            field_filters: {欄位: 值列表}，例如 {'years': ['2023']}，文檔需符合其中任一值；沒有該欄位的文檔 (擷取不到年份的財報) 不過濾
+        """
+        bool_query = {"bool": {"must": []}}
+        if category:
+            bool_query["bool"]["must"].append({"term": {"category": category}})
+        if doc_ids:
+            bool_query["bool"]["must"].append({"terms": {"doc_id": doc_ids}})
+        for field, values in (field_filters or {}).items():
+            bool_query["bool"]["must"].append({"bool": {
+                "should": [{"terms": {field: values}}, {"bool": {"must_not": {"exists": {"field": field}}}}],
+                "minimum_should_match": 1,
+            }})
+        return bool_query
+
+    @staticmethod
+    def gen_field_boosts(field_boosts: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """
+        財報欄位相符時加分的 should 子句；查詢中的公司多為簡稱，以 CJK bigram 分析後的 companies.text 比對，
+        查詢端使用不輸出單字的 cjk_bigram_search_analyzer，避免只有一個字相同的公司也加分
+        """
+        clauses = []
+        for field, values in (field_boosts or {}).items():
+            if field == 'companies':
+                clauses.append({"match": {"companies.text": {
+                    "query": " ".join(values),
+                    "analyzer": "cjk_bigram_search_analyzer",
+                    "boost": FINANCE_FIELD_BOOST,
+                }}})
+            else:
+                clauses.append({"terms": {field: values, "boost": FINANCE_FIELD_BOOST}})
+        return clauses
+
+    def gen_bm25_query(self, basic_query: Dict[str, Any], bool_query: Dict[str, Any], query_text: str, size: int, field_boosts: Dict[str, List[str]] = None) -> Dict[str, Any]:
         standard_query = {
             "combined_fields": {
                 "query": query_text,
@@ -62,17 +263,48 @@ class ElasticsearchClient:
         new_basic_query = copy.deepcopy(basic_query)
 
         new_bool_query["bool"]["must"].append(standard_query)
+        boosts = self.gen_field_boosts(field_boosts)
+        if boosts:
+            new_bool_query["bool"]["should"] = boosts
         new_basic_query["query"] = new_bool_query
         return new_basic_query
 
     
-    def gen_knn_query(self, basic_query: Dict[str, Any], bool_query: Dict[str, Any], query_vector: List[float], size: int) -> Dict[str, Any]:
+    @staticmethod
+    def use_exact_knn(doc_ids: List[str]) -> bool:
+        """
+        候選文檔只有少數幾份時 (比賽問題幾乎都帶有 source 清單)，HNSW 搭配高選擇性的 filter 容易漏掉結果，
+        直接對過濾後的分塊精確計算 cosine 反而更快
+        """
+        return bool(doc_ids) and len(doc_ids) <= EXACT_KNN_MAX_DOC_IDS
+
+    def gen_knn_query(self, basic_query: Dict[str, Any], bool_query: Dict[str, Any], query_vector: List[float], size: int, exact: bool = False) -> Dict[str, Any]:
+        """
+        Args:
+            exact: True 時以 script_score 對 bool_query 過濾後的所有分塊計算 cosine，否則使用近似 kNN
+        """
+        if exact:
+            new_basic_query = copy.deepcopy(basic_query)
+            new_basic_query["query"] = {
+                "script_score": {
+                    "query": copy.deepcopy(bool_query),
+                    # script_score 不接受負分，與 kNN 的 cosine 分數同樣平移到非負區間
+                    "script": {
+                        "source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
+                        "params": {"query_vector": query_vector},
+                    },
+                }
+            }
+            return new_basic_query
+
         knn_query = {
             "field": "embedding",
             "query_vector": query_vector,
             "k": size,
             "num_candidates": size*2,
         }
+        if KNN_RESCORE_OVERSAMPLE > 0:
+            knn_query['rescore_vector'] = {"oversample": KNN_RESCORE_OVERSAMPLE}
 
         knn_query['filter'] = bool_query
 
@@ -81,36 +313,157 @@ class ElasticsearchClient:
         return new_basic_query
 
 
-    def hybrid_search(self, query_text: str, query_vector: List[float], size: int, category: str = None, doc_ids: List[str] = [], knn_weight: float = 0.7, index_name: str = DEFAULT_INDEX_NAME) -> List[str]:
-        """執行混合搜索"""
+    def fuse_responses(self, es_responses_with_weights: List[tuple], top_k: int = None) -> List[Dict[str, Any]]:
+        """依 FUSION_METHOD 融合多個 ES 搜尋結果，預設為加權 RRF；top_k 為檢索的 size，只對前 top_k 個結果排序與建立輸出"""
+        if FUSION_METHOD == 'rrf':
+            rrf = WeightedRRFImplementation(k=RRF_RANK_CONSTANT)
+            return rrf.merge_weighted_elasticsearch_results(es_responses_with_weights, top_k=top_k)
+        return FusionEngine(FUSION_METHOD, k=RRF_RANK_CONSTANT).fuse_elasticsearch(es_responses_with_weights, top_k=top_k)
+
+    def _search_legs(self, index_name: str, queries: List[Dict[str, Any]], search_mode: str, names: List[str]) -> List[Dict[str, Any]]:
+        """
+        執行多個查詢，msearch 模式以單次 _msearch 請求送出
+        依序執行時記錄各查詢的實際耗時；msearch 時各查詢的耗時取自伺服器回傳的 took
+        """
+        if search_mode == 'sequential' or len(queries) == 1:
+            responses = []
+            for name, query in zip(names, queries):
+                with self.metrics.stage(name):
+                    responses.append(self.es.search(index=index_name, body=query))
+            return responses
+
+        searches = []
+        for query in queries:
+            searches.extend([{"index": index_name}, query])
+        responses = self.es.msearch(searches=searches)['responses']
+        for name, response in zip(names, responses):
+            if 'error' in response:
+                raise RuntimeError(f"msearch 子查詢出錯: {response['error']}")
+            self.metrics.record(name, response.get('took', 0) / 1000)
+        return responses
+
+    def _cluster_version(self) -> tuple:
+        if self._version is None:
+            number = self.es.info()['version']['number']
+            self._version = tuple(int(part) for part in number.split('-')[0].split('.')[:2])
+        return self._version
+
+    def _supports_rrf_retriever(self, knn_weight: float) -> bool:
+        """
+        判斷叢集是否能以 rrf retriever 得到與 Python 端相同的加權排名
+        等權重 (knn_weight == 0.5) 只需 rrf retriever，其餘需支援加權 RRF 的版本
+        """
+        if self._rrf_retriever_available is False:
+            return False
         try:
-            # 構建基本查詢
-            basic_query = {
-                "size": size,
-                "_source": {"excludes": ["embedding"]},
-            }
+            version = self._cluster_version()
+        except Exception as e:
+            # 例如帳號沒有 monitor 權限或無法解析的版本字串，之後改用 msearch
+            print(f"無法取得叢集版本，改用 msearch: {e}")
+            self._rrf_retriever_available = False
+            return False
+        if knn_weight == 0.5:
+            return version >= RRF_RETRIEVER_MIN_VERSION
+        return version >= WEIGHTED_RRF_RETRIEVER_MIN_VERSION
+
+    def gen_rrf_retriever_query(self, bm25_query: Dict[str, Any], knn_query: Dict[str, Any], size: int, knn_weight: float) -> Dict[str, Any]:
+        """以 bm25 / knn 查詢組出伺服器端 RRF retriever 查詢"""
+        retrievers = [
+            {"standard": {"query": bm25_query["query"]}},
+            {"knn": knn_query["knn"]} if "knn" in knn_query else {"standard": {"query": knn_query["query"]}},
+        ]
+        if knn_weight != 0.5:
+            retrievers = [
+                {"retriever": retrievers[0], "weight": 1 - knn_weight},
+                {"retriever": retrievers[1], "weight": knn_weight},
+            ]
+        # 每個子 retriever 取前 size 筆融合 (ES 要求 rank_window_size >= size)，與 msearch 在 Python 端融合的候選相同
+        return {
+            "size": size,
+            "_source": bm25_query["_source"],
+            "retriever": {
+                "rrf": {
+                    "retrievers": retrievers,
+                    "rank_constant": int(RRF_RANK_CONSTANT),
+                    "rank_window_size": size,
+                }
+            },
+        }
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_vector: List[float],
+        size: int,
+        category: str = None,
+        doc_ids: List[str] = [],
+        knn_weight: float = 0.7,
+        index_name: str = DEFAULT_INDEX_NAME,
+        search_mode: str = None,
+        include_embedding: bool = False,
+        field_filters: Dict[str, List[str]] = None,
+        field_boosts: Dict[str, List[str]] = None,
+    ) -> List[str]:
+        """
+        執行混合搜索
+
+        search_mode:
+            sequential: 依序送出 BM25 與 kNN 查詢，於 Python 端加權 RRF 融合
+            msearch: 以單次 _msearch 送出兩個查詢，於 Python 端加權 RRF 融合
+            retriever: 叢集支援時使用伺服器端 RRF retriever，否則退回 msearch
 
-            bool_query = {"bool": {"must": []}}
-            if category:
-                bool_query["bool"]["must"].append({"term": {"category": category}})
-            if doc_ids:
-                bool_query["bool"]["must"].append({"terms": {"doc_id": doc_ids}})
+        field_filters 以財報欄位 (years、quarters 等) 過濾兩個查詢的候選，field_boosts 只提高 BM25 中欄位相符文檔的分數
+        """
+        search_mode = search_mode or self.search_mode
+        try:
+            # 構建基本查詢
+            basic_query = self.gen_basic_query(size, include_embedding)
+            bool_query = self.gen_filter_query(category, doc_ids, field_filters)
             
-            bm25_query = self.gen_bm25_query(basic_query, bool_query, query_text, size)
-            knn_query = self.gen_knn_query(basic_query, bool_query, query_vector, size)
+            bm25_query = self.gen_bm25_query(basic_query, bool_query, query_text, size, field_boosts)
+            exact_knn = self.use_exact_knn(doc_ids)
+            knn_query = self.gen_knn_query(basic_query, bool_query, query_vector, size, exact=exact_knn)
+            if exact_knn and knn_weight != 0:
+                self.metrics.increment('exact_knn_queries')
 
             # import json
             # print(f"bm25_query: {json.dumps(bm25_query, ensure_ascii=False)}")
             # print(f"knn_query: {json.dumps(knn_query, ensure_ascii=False)}")
 
-            bm25_response = self.es.search(index=index_name, body=bm25_query)
-            knn_response = self.es.search(index=index_name, body=knn_query)
+            # 權重為 0 的查詢不影響融合結果，直接略過
+            legs = [(name, query, weight) for name, query, weight in [('bm25', bm25_query, 1-knn_weight), ('knn', knn_query, knn_weight)] if weight != 0]
+
+            # 伺服器端只支援 RRF，其他融合方式一律在 Python 端計算
+            if search_mode == 'retriever' and FUSION_METHOD == 'rrf' and len(legs) == 2 and self._supports_rrf_retriever(knn_weight):
+                try:
+                    retriever_query = self.gen_rrf_retriever_query(bm25_query, knn_query, size, knn_weight)
+                    with self.metrics.stage('es_search'):
+                        response = self.es.search(index=index_name, body=retriever_query)
+                    return [
+                        {
+                            '_id': hit['_id'],
+                            '_score': hit['_score'],
+                            '_source': hit['_source'],
+                            'weighted_rrf_score': hit['_score'],
+                        }
+                        for hit in response['hits']['hits']
+                    ]
+                except ApiError as e:
+                    # 例如授權不支援 RRF，之後改用 msearch
+                    print(f"RRF retriever 不可用，改用 msearch: {e}")
+                    self._rrf_retriever_available = False
+
+            with self.metrics.stage('es_search'):
+                responses = self._search_legs(index_name, [query for _, query, _ in legs], search_mode, [name for name, _, _ in legs])
 
             # print(f"bm25_response: {len(bm25_response['hits']['hits'])}")
             # print(f"knn_response: {len(knn_response['hits']['hits'])}")
 
-            rrf = WeightedRRFImplementation(k=60.0)
-            weighted_results = rrf.merge_weighted_elasticsearch_results([(bm25_response, 1-knn_weight), (knn_response, knn_weight)])
+            with self.metrics.stage('rrf'):
+                weighted_results = self.fuse_responses(
+                    [(response, weight) for response, (_, _, weight) in zip(responses, legs)],
+                    top_k=size,
+                )
 
             return weighted_results
             
@@ -120,4 +473,82 @@ class ElasticsearchClient:
             import traceback
             traceback.print_exc()
             print(f"混合搜索出錯: {e}")
-            return [] 
\ No newline at end of file
+            return []
+
+    def multi_search(
+        self,
+        queries: List[str],
+        query_vectors: List[List[float]],
+        size: int,
+        category: str = None,
+        doc_ids: List[str] = [],
+        knn_weight: float = 0.7,
+        index_name: str = DEFAULT_INDEX_NAME,
+        include_embedding: bool = False,
+        variant_weight: float = config.MULTI_QUERY_VARIANT_WEIGHT,
+        field_filters: Dict[str, List[str]] = None,
+        field_boosts: Dict[str, List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        多查詢混合搜索：每個查詢變體各一組 BM25 / kNN 查詢，全部以單次 _msearch 送出後一起融合
+
+        Args:
+            queries: 查詢變體，第一個為原始查詢
+            query_vectors: 與 queries 對應的查詢向量，None 的變體只執行 BM25
+            variant_weight: 原始查詢以外的變體，權重再乘上此值
+        """
+        try:
+            basic_query = self.gen_basic_query(size, include_embedding)
+            bool_query = self.gen_filter_query(category, doc_ids, field_filters)
+            exact_knn = self.use_exact_knn(doc_ids)
+
+            legs = []
+            for position, (query_text, query_vector) in enumerate(zip(queries, query_vectors)):
+                scale = 1 if position == 0 else variant_weight
+                legs.append(('bm25', self.gen_bm25_query(basic_query, bool_query, query_text, size, field_boosts), (1 - knn_weight) * scale))
+                if query_vector is not None:
+                    knn_query = self.gen_knn_query(basic_query, bool_query, query_vector, size, exact=exact_knn)
+                    legs.append(('knn', knn_query, knn_weight * scale))
+            legs = [leg for leg in legs if leg[2] != 0]
+
+            with self.metrics.stage('es_search'):
+                responses = self._search_legs(index_name, [query for _, query, _ in legs], 'msearch', [name for name, _, _ in legs])
+
+            with self.metrics.stage('rrf'):
+                return self.fuse_responses(
+                    [(response, weight) for response, (_, _, weight) in zip(responses, legs)],
+                    top_k=size,
+                )
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            print(f"多查詢混合搜索出錯: {e}")
+            return []
+
+
+class AsyncElasticsearchClient:
+    """ElasticsearchClient 的 asyncio 版本，BM25 與 kNN 查詢可分別送出，以便與查詢嵌入重疊執行"""
+
+    # 查詢組裝邏輯與同步版本共用
+    gen_basic_query = ElasticsearchClient.gen_basic_query
+    gen_filter_query = ElasticsearchClient.gen_filter_query
+    gen_field_boosts = staticmethod(ElasticsearchClient.gen_field_boosts)
+    gen_bm25_query = ElasticsearchClient.gen_bm25_query
+    gen_knn_query = ElasticsearchClient.gen_knn_query
+    use_exact_knn = staticmethod(ElasticsearchClient.use_exact_knn)
+    fuse_responses = ElasticsearchClient.fuse_responses
+
+    def __init__(self):
+        self.es = AsyncElasticsearch(config.ES_HOST, connections_per_node=config.ES_CONNECTIONS_PER_NODE)
+
+    async def bm25_search(self, query_text: str, size: int, category: str = None, doc_ids: List[str] = [], index_name: str = DEFAULT_INDEX_NAME, include_embedding: bool = False) -> Dict[str, Any]:
+        bm25_query = self.gen_bm25_query(self.gen_basic_query(size, include_embedding), self.gen_filter_query(category, doc_ids), query_text, size)
+        return await self.es.search(index=index_name, body=bm25_query)
+
+    async def knn_search(self, query_vector: List[float], size: int, category: str = None, doc_ids: List[str] = [], index_name: str = DEFAULT_INDEX_NAME, include_embedding: bool = False) -> Dict[str, Any]:
+        knn_query = self.gen_knn_query(self.gen_basic_query(size, include_embedding), self.gen_filter_query(category, doc_ids), query_vector, size, exact=self.use_exact_knn(doc_ids))
+        return await self.es.search(index=index_name, body=knn_query)
+
+    async def close(self) -> None:
+        await self.es.close()
@@ -0,0 +1,143 @@
+from typing import Dict, List
+import re
+
+from modules.query_rewrite import ROC_YEAR_PATTERN, AD_YEAR_PATTERN, ROC_OFFSET, BARE_ROC_YEARS
+
+# 寫入索引的 keyword 欄位 (見 scripts/put_es_template.sh)，年份統一為西元年，季度為 2023Q1 格式
+FIELDS = ('companies', 'years', 'quarters')
+
+_COMPANY_SUFFIX = r'(?:股份有限公司|有限公司)'
+# 財報標題行開頭的公司名稱，例如「# 聯華電子股份有限公司及子公司」
+_TITLE_COMPANY_PATTERN = re.compile(rf'^[#\s]*([一-鿿]{{2,10}}?){_COMPANY_SUFFIX}', re.MULTILINE)
+# 查詢中的主詞，例如「聯電在2023年第1季…」、「光寶科技股份有限公司的…」、「2022年第3季聯發科的…」；
+# 比對前先將問句開頭與日期換成分隔符號 (見 _mark_query)，公司名稱須位於句首、標點或日期之後 (可先接「在/於/截至」)：
+# 以「公司」或公司後綴結尾的名稱較可靠 (2-8 字，如「亞德客-KY公司」)，沒有後綴的簡稱限 2-4 字且須緊接日期或「在/於/的」
+_QUERY_SEGMENT_START = r'(?:^|[\n\x00])(?:在|於|截至)*'
+# 名稱不含虛詞與「公司」，也不以「子」結尾，避免「公司及子公司」、「歸屬於」、「部分非重要子公司」等片段被當成公司名稱
+_QUERY_NAME_CHAR = r'(?:(?!公司|[在於的與及之並])[一-鿿])'
+_QUERY_COMPANY_PATTERNS = (
+    re.compile(rf'{_QUERY_SEGMENT_START}({_QUERY_NAME_CHAR}{{2,8}}?)(?<!子)(?:-?KY)?(?:{_COMPANY_SUFFIX}|公司)'),
+    re.compile(rf'{_QUERY_SEGMENT_START}({_QUERY_NAME_CHAR}{{2,4}}?)(?=\x00|在|於|的)'),
+)
+# 位置與公司名稱相同的常見財報用語，例如「總資產的金額」、「截至2023年」、「有關公司在…」
+_QUERY_NON_COMPANY_TERMS = (
+    '截至', '有關', '關於', '關係', '關聯', '歸屬', '集團', '合併', '財務', '報表', '報告', '資產', '負債', '權益', '損益',
+    '收入', '收益', '淨利', '利益', '現金', '存貨', '部門', '活動', '營業', '營運', '金額', '總額', '帳面', '顯示', '記錄',
+    '提到', '提供', '支付', '董事', '股東', '會計', '子公司', '哪',
+)
+_QUERY_PREFIX_PATTERN = re.compile(r'請問|請告訴我|告訴我|我想知道|想知道|請查詢|查詢|根據|關於|[？?！!。，,、；;：:「」『』（）()\s]+')
+_QUERY_DATE_PATTERN = re.compile(
+    r'(?:民國|西元)?\s*\d{2,4}\s*年度?|第\s*[1-4一二三四]\s*季度?|[Qq][1-4]|\d{1,2}\s*月(?:\s*\d{1,2}\s*日)?|\d{1,2}\s*日'
+)
+_QUARTER_PATTERN = re.compile(
+    r'(?<!\d)(民國\s*|西元\s*)?(\d{2,4})\s*(?:年度?\s*第\s*([1-4一二三四])\s*季|年度?\s*[Qq]([1-4])|[Qq]([1-4]))'
+)
+_CHINESE_QUARTERS = {'一': 1, '二': 2, '三': 3, '四': 4}
+# 中文數字的年份，例如「民國一一二年」、「一百一十二年」、「二〇二三年」
+_NUMERAL_YEAR_PATTERN = re.compile(r'(民國\s*|西元\s*)?([〇零一二三四五六七八九十百千]{2,5})(\s*年)')
+_NUMERAL_DIGITS = {char: digit for digit, chars in enumerate(['〇零', '一', '二', '三', '四', '五', '六', '七', '八', '九']) for char in chars}
+_NUMERAL_UNITS = {'十': 10, '百': 100, '千': 1000}
+
+
+def _numeral_to_int(numeral: str) -> int:
+    """中文數字轉為整數，支援逐位 (一一二) 與位值 (一百一十二) 兩種寫法"""
+    if not any(char in _NUMERAL_UNITS for char in numeral):
+        return int(''.join(str(_NUMERAL_DIGITS[char]) for char in numeral))
+    total = current = 0
+    for char in numeral:
+        if char in _NUMERAL_UNITS:
+            total += (current or 1) * _NUMERAL_UNITS[char]
+            current = 0
+        else:
+            current = _NUMERAL_DIGITS[char]
+    return total + current
+
+
+def normalize_numeral_years(text: str) -> str:
+    """將中文數字的年份改寫為阿拉伯數字，例如 民國一一二年 -> 民國112年，其餘的年份規則即可套用"""
+    return _NUMERAL_YEAR_PATTERN.sub(lambda match: f'{match.group(1) or ""}{_numeral_to_int(match.group(2))}{match.group(3)}', text)
+
+
+def _mark_query(query: str) -> str:
+    """將查詢中的日期換成 \\x00、問句開頭與標點換成換行，只留下可能是公司名稱的片段"""
+    return _QUERY_PREFIX_PATTERN.sub('\n', _QUERY_DATE_PATTERN.sub('\x00', query))
+
+
+def extract_query_companies(query: str) -> List[str]:
+    """擷取查詢主詞中的公司名稱 (通常為簡稱)，依出現順序排列；寧可漏抓也不把財報用語當成公司名稱"""
+    marked = _mark_query(query)
+    companies = []
+    for pattern in _QUERY_COMPANY_PATTERNS:
+        for match in pattern.finditer(marked):
+            name = match.group(1)
+            if not any(term in name for term in _QUERY_NON_COMPANY_TERMS):
+                companies.append((match.start(1), name))
+    return list(dict.fromkeys(name for _, name in sorted(companies)))
+
+
+def _ad_year(prefix: str, digits: str) -> int:
+    """將年份數字統一為西元年，無法判斷時回傳 None"""
+    year = int(digits)
+    if len(digits) == 4:
+        return year if 1900 <= year < 2100 else None
+    if (prefix or '').strip() == '民國' or year in BARE_ROC_YEARS:
+        return year + ROC_OFFSET
+    return None
+
+
+def extract_years(text: str) -> List[str]:
+    years = []
+    for match in ROC_YEAR_PATTERN.finditer(text):
+        year = _ad_year(match.group(1), match.group(2))
+        if year is not None:
+            years.append(str(year))
+    years.extend(match.group(1) for match in AD_YEAR_PATTERN.finditer(text))
+    return sorted(set(years))
+
+
+def extract_quarters(text: str) -> List[str]:
+    quarters = []
+    for match in _QUARTER_PATTERN.finditer(text):
+        year = _ad_year(match.group(1), match.group(2))
+        quarter = match.group(3) or match.group(4) or match.group(5)
+        if year is not None:
+            quarters.append(f'{year}Q{_CHINESE_QUARTERS.get(quarter, quarter)}')
+    return sorted(set(quarters))
+
+
+def extract_finance_fields(text: str, query: bool = False) -> Dict[str, List[str]]:
+    """
+    以規則從財報全文或查詢擷取公司名稱、年份與季度，不需呼叫 LLM
+
+    Args:
+        text: 財報全文或查詢
+        query: True 時以查詢中的主詞作為公司名稱 (查詢通常使用簡稱，如「聯電」)，否則取標題行的公司全名
+
+    Returns:
+        Dict: {'companies', 'years', 'quarters'}，沒有擷取到的欄位為空列表
+    """
+    text = normalize_numeral_years(text or '')
+    if query:
+        companies = extract_query_companies(text)
+    else:
+        companies = _TITLE_COMPANY_PATTERN.findall(text)
+    return {
+        'companies': sorted(set(companies)),
+        'years': extract_years(text),
+        'quarters': extract_quarters(text),
+    }
+
+
+def describe_finance_fields(fields: Dict[str, List[str]]) -> str:
+    """將擷取結果寫成文字 (西元年附註民國年)，取代 LLM 全文摘要中的公司與年份換算"""
+    parts = []
+    if fields.get('companies'):
+        parts.append(f"公司: {'、'.join(fields['companies'])}")
+    if fields.get('years'):
+        parts.append('年份: ' + '、'.join(f'{year}年 (民國{int(year) - ROC_OFFSET}年)' for year in fields['years']))
+    if fields.get('quarters'):
+        parts.append('季度: ' + '、'.join(
+            f'{quarter[:4]}年第{quarter[-1]}季 (民國{int(quarter[:4]) - ROC_OFFSET}年第{quarter[-1]}季)'
+            for quarter in fields['quarters']
+        ))
+    return '；'.join(parts)
@@ -0,0 +1,125 @@
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+
+class FusionEngine:
+    METHODS = ('rrf', 'combsum', 'combmnz', 'convex')
+
+    def __init__(self, method: str = 'rrf', k: float = 60.0, score_key: str = 'fused_score'):
+        """
+        以 NumPy 融合多個排序結果
+
+        各列表的文檔 _id 先依第一次出現的順序編成整數，分數以 bincount 累加，只對前 top_k 個結果排序與建立輸出；
+        同分時依第一次出現的順序排列 (與逐筆累加後穩定排序的結果相同)。
+
+        method:
+            rrf: 加權 RRF，weight / (k + rank)
+            combsum: 各列表分數 min-max 正規化後的加權和
+            combmnz: combsum 乘上出現的列表數
+            convex: 權重正規化為總和 1 的 combsum (凸組合)，分數落在 0-1 之間
+
+        Args:
+            k: RRF 公式中的常數
+            score_key: 輸出項目中融合分數的欄位名稱
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"不支援的融合方式: {method}")
+        self.method = method
+        self.k = k
+        self.score_key = score_key
+
+    @staticmethod
+    def _normalize(scores: np.ndarray) -> np.ndarray:
+        span = scores.max() - scores.min()
+        if span <= 0:
+            return np.ones_like(scores)
+        return (scores - scores.min()) / span
+
+    def _encode(self, ranked_lists: List[Tuple[List[Dict[str, Any]], float]]):
+        """回傳 (每個編號最後一次出現的項目, 各列表的編號陣列, 各列表的分數陣列, 各列表的權重)"""
+        codes = {}
+        items = []
+        encoded = []
+        for ranked_list, weight in ranked_lists:
+            # 權重為 0 的列表不影響分數，也不引入只出現在其中的文檔
+            if weight == 0 or not ranked_list:
+                continue
+            list_codes = np.empty(len(ranked_list), dtype=np.int64)
+            list_scores = np.empty(len(ranked_list), dtype=np.float64)
+            for position, item in enumerate(ranked_list):
+                item_id = str(item.get('_id'))
+                code = codes.get(item_id)
+                if code is None:
+                    code = codes[item_id] = len(items)
+                    items.append(item)
+                else:
+                    items[code] = item
+                list_codes[position] = code
+                list_scores[position] = item.get('_score') or 0.0
+            encoded.append((list_codes, list_scores, weight))
+        return items, encoded
+
+    def scores(self, ranked_lists: List[Tuple[List[Dict[str, Any]], float]]) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """回傳 (依編號排列的項目, 每個項目的融合分數)"""
+        items, encoded = self._encode(ranked_lists)
+        fused = np.zeros(len(items), dtype=np.float64)
+        if not items:
+            return items, fused
+
+        total_weight = sum(weight for _, _, weight in encoded)
+        hits = np.zeros(len(items), dtype=np.float64)
+        for list_codes, list_scores, weight in encoded:
+            if self.method == 'rrf':
+                contribution = weight / (self.k + np.arange(1, len(list_codes) + 1))
+            else:
+                if self.method == 'convex' and total_weight:
+                    weight = weight / total_weight
+                contribution = weight * self._normalize(list_scores)
+            fused += np.bincount(list_codes, weights=contribution, minlength=len(items))
+            hits += np.bincount(list_codes, minlength=len(items))
+
+        if self.method == 'combmnz':
+            fused *= hits
+        return items, fused
+
+    @staticmethod
+    def top_k(scores: np.ndarray, top_k: int = None) -> np.ndarray:
+        """分數由高到低的前 top_k 個編號，同分時編號小者在前，不排序其餘項目"""
+        candidates = np.arange(len(scores))
+        if top_k is not None and top_k < len(scores):
+            if top_k <= 0:
+                return candidates[:0]
+            threshold = -np.partition(-scores, top_k - 1)[top_k - 1]
+            # 保留所有與門檻同分的項目，再以穩定排序決定取捨
+            candidates = np.flatnonzero(scores >= threshold)
+        order = np.argsort(-scores[candidates], kind='stable')
+        return candidates[order][:top_k]
+
+    def fuse(self, ranked_lists: List[Tuple[List[Dict[str, Any]], float]], top_k: int = None) -> List[Dict[str, Any]]:
+        """
+        Args:
+            ranked_lists: (排序結果, 權重) 的列表，排序結果的項目需包含 _id，combsum/combmnz/convex 另使用 _score
+            top_k: 只回傳前幾個結果，None 表示全部
+
+        Returns:
+            List[Dict]: 項目 (文檔重複出現時取最後一個列表中的項目) 加上融合分數欄位
+        """
+        items, fused = self.scores(ranked_lists)
+        return [{**items[code], self.score_key: float(fused[code])} for code in self.top_k(fused, top_k)]
+
+    def fuse_elasticsearch(self, es_responses_with_weights: List[Tuple[Dict, float]], top_k: int = None) -> List[Dict[str, Any]]:
+        """融合 ES 回應，輸出項目只保留 _id、_score、_source"""
+        ranked_lists = [
+            (response.get('hits', {}).get('hits', []), weight)
+            for response, weight in es_responses_with_weights
+        ]
+        items, fused = self.scores(ranked_lists)
+        return [
+            {
+                '_id': items[code]['_id'],
+                '_score': items[code]['_score'],
+                '_source': items[code]['_source'],
+                self.score_key: float(fused[code]),
+            }
+            for code in self.top_k(fused, top_k)
+        ]
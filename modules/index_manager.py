@@ -0,0 +1,197 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import re
+
+from elasticsearch import NotFoundError
+
+import config
+from modules.es_client import ElasticsearchClient, DEFAULT_INDEX_NAME
+
+# 強制合併與等待叢集狀態可能需要數分鐘，不套用預設的請求逾時
+ADMIN_REQUEST_TIMEOUT = 3600
+
+
+class IndexManager:
+    def __init__(
+        self,
+        es_client: ElasticsearchClient,
+        alias: str = DEFAULT_INDEX_NAME,
+        keep: int = config.INDEX_KEEP_VERSIONS,
+        warmup_queries: int = config.INDEX_WARMUP_QUERIES,
+        min_count_ratio: float = config.INDEX_MIN_COUNT_RATIO,
+    ):
+        """
+        以版本化索引重建資料：寫入新的 {alias}_v{N}，完成後以 _aliases 原子地將讀取別名切換過去，查詢不會讀到建立到一半的索引
+
+        索引的 mapping 與 analysis 由 scripts/put_es_template.sh 的模板提供 (index_patterns 需涵蓋 {alias}_v*)。
+
+        Args:
+            es_client: 用於寫入與預熱查詢的 ElasticsearchClient
+            alias: 查詢使用的別名 (ES_INDEX_NAME)
+            keep: 切換後保留幾個舊版本以便回滾，其餘刪除
+            warmup_queries: 切換前以新索引中的分塊執行幾次混合搜索預熱
+            min_count_ratio: 新索引的分塊數至少須為目前服務中索引的此比例才切換，避免只載入部分資料的索引取代完整索引
+        """
+        self.es_client = es_client
+        self.es = es_client.es
+        self.alias = alias
+        self.keep = keep
+        self.warmup_queries = warmup_queries
+        self.min_count_ratio = min_count_ratio
+        self.version_pattern = re.compile(rf'^{re.escape(alias)}_v(\d+)$')
+
+    def versions(self) -> List[Tuple[int, str]]:
+        """回傳 (版本號, 索引名稱)，依版本號由小到大排列"""
+        versions = []
+        for name in self.es.indices.get(index=f'{self.alias}_v*'):
+            match = self.version_pattern.match(name)
+            if match:
+                versions.append((int(match.group(1)), name))
+        return sorted(versions)
+
+    def _alias_indices(self) -> List[str]:
+        try:
+            return list(self.es.indices.get_alias(name=self.alias))
+        except NotFoundError:
+            return []
+
+    def current(self) -> Optional[str]:
+        """目前別名指向的索引，別名不存在時回傳 None"""
+        names = self._alias_indices()
+        return names[0] if names else None
+
+    def create(self) -> Tuple[str, Dict[str, Any]]:
+        """
+        建立下一個版本的索引，並關閉 refresh 與副本以加速批量寫入
+
+        Returns:
+            (索引名稱, 模板原本的 refresh_interval / number_of_replicas，寫入完成後還原)
+        """
+        versions = self.versions()
+        name = f'{self.alias}_v{versions[-1][0] + 1 if versions else 1}'
+        self.es.indices.create(index=name)
+        settings = self.es.indices.get_settings(index=name)[name]['settings']['index']
+        original = {
+            'refresh_interval': settings.get('refresh_interval'),
+            'number_of_replicas': settings.get('number_of_replicas', '1'),
+        }
+        self.es.indices.put_settings(index=name, settings={'refresh_interval': '-1', 'number_of_replicas': 0})
+        print(f"✓ 已建立索引 {name} (寫入期間關閉 refresh 與副本)")
+        return name, original
+
+    def finalize(self, name: str, original: Dict[str, Any]) -> int:
+        """寫入完成後 refresh、強制合併為單一 segment，再還原 refresh 與副本設定並等待副本就緒，回傳索引中的分塊數"""
+        admin = self.es.options(request_timeout=ADMIN_REQUEST_TIMEOUT)
+        admin.indices.refresh(index=name)
+        # 副本還原前合併，副本直接複製合併後的 segment
+        admin.indices.forcemerge(index=name, max_num_segments=1)
+        admin.indices.put_settings(index=name, settings=original)
+        health = admin.cluster.health(index=name, wait_for_status='green', timeout='10m')
+        if health.get('timed_out'):
+            print(f"❌ 索引 {name} 未在時限內達到 green (目前為 {health.get('status')})，副本可能尚未配置完成")
+        return admin.count(index=name)['count']
+
+    def categories(self, name: str) -> Dict[str, int]:
+        """回傳索引 (或別名) 中各 category 的分塊數，不存在時回傳空字典"""
+        try:
+            response = self.es.search(index=name, size=0, aggs={'categories': {'terms': {'field': 'category', 'size': 1000}}})
+        except NotFoundError:
+            return {}
+        return {bucket['key']: bucket['doc_count'] for bucket in response['aggregations']['categories']['buckets']}
+
+    def check(self, name: str, expected_categories: List[str] = None) -> bool:
+        """
+        切換前確認新索引涵蓋所有應有的類別，且分塊數不明顯少於目前服務中的索引
+
+        Args:
+            expected_categories: 必須存在的類別，未提供時以目前服務中索引 (別名或同名的實體索引) 的類別為準
+        """
+        new = self.categories(name)
+        serving = self.categories(self.alias)
+        expected = set(expected_categories or []) | set(serving)
+        missing = sorted(expected - set(new))
+        if missing:
+            print(f"❌ 新索引 {name} 缺少類別 {missing} (已載入: {sorted(new)})，不切換別名")
+            return False
+        new_count, serving_count = sum(new.values()), sum(serving.values())
+        if new_count < serving_count * self.min_count_ratio:
+            print(f"❌ 新索引 {name} 只有 {new_count} 個分塊，少於目前服務中的 {serving_count} 個的 {self.min_count_ratio:.0%}，不切換別名")
+            return False
+        return True
+
+    def warm(self, name: str) -> int:
+        """以新索引中的分塊內容與向量執行混合搜索，預先載入倒排索引、向量與 HNSW 圖，回傳執行的查詢數"""
+        if self.warmup_queries <= 0:
+            return 0
+        response = self.es.search(
+            index=name,
+            size=self.warmup_queries,
+            query={'function_score': {'random_score': {}}},
+            source_includes=['category', 'content', 'embedding'],
+        )
+        hits = [hit['_source'] for hit in response['hits']['hits'] if hit['_source'].get('embedding')]
+        for source in hits:
+            self.es_client.hybrid_search(source['content'][:100], source['embedding'], 10, source['category'], index_name=name)
+        return len(hits)
+
+    def swap(self, name: str) -> Optional[str]:
+        """以單一 _aliases 請求將別名從舊索引移到新索引，回傳原本的索引"""
+        holders = self._alias_indices()
+        actions = [{'remove': {'index': index, 'alias': self.alias}} for index in holders]
+        if not holders and self.es.indices.exists(index=self.alias):
+            # 舊的寫法直接以別名名稱建立索引，需在同一個請求中刪除才能建立同名別名
+            print(f"❌ {self.alias} 為實體索引而非別名，切換時將一併刪除")
+            actions.append({'remove_index': {'index': self.alias}})
+        actions.append({'add': {'index': name, 'alias': self.alias, 'is_write_index': True}})
+        self.es.indices.update_aliases(actions=actions)
+        previous = holders[0] if holders else None
+        print(f"✓ 別名 {self.alias} 已切換: {previous or '(無)'} -> {name}")
+        return previous
+
+    def gc(self) -> List[str]:
+        """刪除舊版本，只保留別名指向的索引與之前最新的 keep 個版本；較新但未切換的版本 (建立失敗) 也一併刪除"""
+        current = self.current()
+        if current is None:
+            return []
+        names = [name for _, name in self.versions()]
+        if current not in names:
+            return []
+        position = names.index(current)
+        kept = set(names[max(0, position - self.keep):position + 1])
+        deleted = [name for name in names if name not in kept]
+        for name in deleted:
+            self.es.indices.delete(index=name)
+            print(f"✓ 已刪除舊索引 {name}")
+        return deleted
+
+    def rebuild(self, load: Callable[[str], Dict[str, Any]], expected_categories: List[str] = None, force: bool = False) -> Optional[str]:
+        """
+        完整重建: 建立新版本 -> load 批量寫入 -> 強制合併與還原設定 -> 檢查類別與分塊數 -> 預熱 -> 切換別名 -> 刪除舊版本
+
+        Args:
+            load: 以索引名稱寫入所有分塊的函式，回傳格式同 SearchEngine.index_chunks
+            expected_categories: 新索引必須包含的類別 (另外一律包含目前服務中索引的類別)
+            force: True 時略過類別與分塊數檢查 (例如刻意移除某個類別)
+
+        Returns:
+            切換後的索引名稱；寫入失敗或檢查未通過時刪除新索引、別名維持不變並回傳 None
+        """
+        name, original = self.create()
+        try:
+            result = load(name)
+            if result['failed'] or not result['indexed']:
+                print(f"❌ {len(result['failed'])} 個分塊寫入失敗 (成功 {result['indexed']} 個)，不切換別名")
+                self.es.indices.delete(index=name)
+                return None
+            count = self.finalize(name, original)
+            print(f"✓ 索引 {name} 已合併，共 {count} 個分塊")
+            if not force and not self.check(name, expected_categories):
+                self.es.indices.delete(index=name)
+                return None
+            print(f"✓ 預熱查詢 {self.warm(name)} 次")
+        except BaseException:
+            # 包含 KeyboardInterrupt，未完成的索引不保留
+            self.es.indices.delete(index=name, ignore_unavailable=True)
+            raise
+        self.swap(name)
+        self.gc()
+        return name
@@ -1,13 +1,16 @@
-from openai import AzureOpenAI
-from anthropic import AnthropicVertex
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from anthropic import AnthropicVertex, AsyncAnthropicVertex
 import config
 
+from modules.rate_limiter import get_rate_limiter
+
 class LLMClient:
     def __init__(self, provider="openai", temperature=0.3, max_tokens=4096):
         self.provider = provider
         self.temperature = temperature
         self.max_tokens = max_tokens
         print(f"目前使用的provider: {self.provider}")
+        self.rate_limiter = get_rate_limiter(provider)
         if provider == "openai":
             self.client = AzureOpenAI(
                 api_key=config.AZURE_OPENAI_API_KEY,
@@ -40,6 +43,7 @@ class LLMClient:
         </prompt>
         '''
 
+        self.rate_limiter.acquire()
         message = self.client.messages.create(
             model=config.GCP_HAIKU_MODEL,
             max_tokens=self.max_tokens, 
@@ -70,6 +74,7 @@ class LLMClient:
         </prompt>
         '''
 
+        self.rate_limiter.acquire()
         message = self.client.messages.create(
             model=config.GCP_HAIKU_MODEL,
             max_tokens=self.max_tokens, 
@@ -101,6 +106,7 @@ class LLMClient:
             {"role": "user", "content": f"上下文：{context}\n\n問題：{query}"}
         ]
         
+        self.rate_limiter.acquire()
         response = self.client.chat.completions.create(
             model=config.AZURE_OPENAI_GPT4_DEPLOYMENT,
             messages=messages,
@@ -110,6 +116,7 @@ class LLMClient:
         return response.choices[0].message.content
         
     def _generate_claude_response(self, query: str, context: str) -> str:
+        self.rate_limiter.acquire()
         message = self.client.messages.create(
             model=config.GCP_SONNET_MODEL,
             max_tokens=self.max_tokens, 
@@ -135,6 +142,7 @@ class LLMClient:
             return "抱歉，生成回應時發生錯誤。"
 
     def _generate_azure_rerank_response(self, prompt: str) -> str:
+        self.rate_limiter.acquire()
         response = self.client.chat.completions.create(
             model=config.AZURE_OPENAI_GPT4_DEPLOYMENT,
             messages=[
@@ -149,6 +157,7 @@ class LLMClient:
         return response.choices[0].message.content
 
     def _generate_claude_rerank_response(self, prompt: str) -> str:
+        self.rate_limiter.acquire()
         message = self.client.messages.create(
             model=config.GCP_HAIKU_MODEL,
             max_tokens=self.max_tokens, 
@@ -160,4 +169,78 @@ class LLMClient:
                 }
             ]
         )
-        return message.content[0].text
\ No newline at end of file
+        return message.content[0].text
+
+
+class AsyncLLMClient:
+    """LLMClient 的 asyncio 版本，提供檢索流程需要的回應生成與重排序呼叫"""
+
+    def __init__(self, provider="openai", temperature=0.3, max_tokens=4096):
+        self.provider = provider
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        if provider == "openai":
+            self.client = AsyncAzureOpenAI(
+                api_key=config.AZURE_OPENAI_API_KEY,
+                api_version=config.AZURE_OPENAI_API_VERSION,
+                azure_endpoint=config.AZURE_OPENAI_ENDPOINT
+            )
+        elif provider == "claude":
+            self.client = AsyncAnthropicVertex(
+                region=config.GCP_REGION,
+                project_id=config.GCP_PROJECT_ID,
+            )
+        else:
+            raise ValueError("不支援的 LLM 提供者。目前支援: openai, claude")
+        self.rate_limiter = get_rate_limiter(provider)
+
+    async def _complete(self, content: str, claude_model: str) -> str:
+        await self.rate_limiter.acquire_async()
+        if self.provider == "openai":
+            response = await self.client.chat.completions.create(
+                model=config.AZURE_OPENAI_GPT4_DEPLOYMENT,
+                messages=[{"role": "user", "content": content}],
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+            return response.choices[0].message.content
+        message = await self.client.messages.create(
+            model=claude_model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": content}]
+        )
+        return message.content[0].text
+
+    async def generate_response(self, query: str, context: str) -> str:
+        """根據選擇的 LLM 提供者生成回應"""
+        try:
+            if self.provider == "openai":
+                await self.rate_limiter.acquire_async()
+                response = await self.client.chat.completions.create(
+                    model=config.AZURE_OPENAI_GPT4_DEPLOYMENT,
+                    messages=[
+                        {"role": "system", "content": "你是一個專業的助手，請根據提供的上下文來回答問題。如果上下文中沒有相關信息，請誠實說明。"},
+                        {"role": "user", "content": f"上下文：{context}\n\n問題：{query}"}
+                    ],
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
+                return response.choices[0].message.content
+            return await self._complete(
+                f"你是一個專業的助手，請根據提供的上下文來回答問題。如果上下文中沒有相關信息，請誠實說明。上下文：{context}\n\n問題：{query}",
+                config.GCP_SONNET_MODEL,
+            )
+        except Exception as e:
+            print(f"生成回應時出錯: {e}")
+            return "抱歉，生成回應時發生錯誤。"
+
+    async def generate_rerank_response(self, prompt: str) -> str:
+        try:
+            return await self._complete(prompt, config.GCP_HAIKU_MODEL)
+        except Exception as e:
+            print(f"生成回應時出錯: {e}")
+            return "抱歉，生成回應時發生錯誤。"
+
+    async def close(self) -> None:
+        await self.client.close()
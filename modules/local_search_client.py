@@ -0,0 +1,457 @@
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Tuple
+import os
+import threading
+
+import numpy as np
+
+import config
+from modules.chunk_store import ChunkFileWriter, compact_chunk_file, count_records, embedding_signature_of, latest_records, load_embeddings
+from modules.es_client import ElasticsearchClient, DEFAULT_INDEX_NAME, FINANCE_FIELD_BOOST
+from modules.finance_fields import FIELDS as FINANCE_FIELDS
+from modules.metrics import NULL_METRICS
+from modules.text_analysis import analyze
+
+
+# 索引檔中失效的行超過有效分塊數 (且至少此數量) 時，寫入後自動壓縮
+COMPACT_MIN_GARBAGE = 1000
+
+
+class _LocalIndex:
+    """
+    單一索引的記憶體內容：分塊欄位、嵌入向量 (memmap) 與 BM25 倒排索引
+
+    寫入時以 apply() 增量更新，只分析新寫入的分塊，不重新讀取整個索引檔；重新寫入或刪除的分塊標記為失效，
+    位置與倒排索引中的紀錄保留到壓縮 (compact) 後重新載入為止。搜尋使用 snapshot() 的唯讀快照，寫入後第一次搜尋時才重新建立。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids = []
+        self.positions = {}  # 有效分塊的 _id -> 位置
+        self.sources = []
+        self.field_values = {field: [] for field in FINANCE_FIELDS}
+        self.categories = []
+        self.doc_ids = []
+        self.rows = array('q')
+        self.alive = array('b')
+        self.doc_len = array('f')
+        self.postings = {}  # term -> (位置, 詞頻)
+        self.embeddings = None
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.lines = 0
+        self._snapshot = None
+        if os.path.exists(path):
+            self.apply(latest_records(path))
+            self.lines = count_records(path)
+
+    @property
+    def garbage(self) -> int:
+        """索引檔中已被覆蓋或刪除的行數"""
+        return self.lines - len(self.positions)
+
+    def apply(self, records: Iterable[Dict[str, Any]]) -> None:
+        """套用寫入索引檔的紀錄 (ChunkFileWriter.write / delete 的回傳值)"""
+        last_row = -1
+        for record in records:
+            self.lines += 1
+            uuid = ElasticsearchClient.gen_document_id(record['category'], record['id'], record['sn'])
+            previous = self.positions.pop(uuid, None)
+            if previous is not None:
+                self.alive[previous] = 0
+            if not record.get('deleted'):
+                self._add(uuid, record)
+                last_row = max(last_row, self.rows[-1])
+        if last_row >= len(self.norms):
+            self._load_embeddings()
+        self._snapshot = None
+
+    def _add(self, uuid: str, record: Dict[str, Any]) -> None:
+        position = len(self.ids)
+        self.positions[uuid] = position
+        self.ids.append(uuid)
+        self.sources.append({
+            'doc_id': record['id'],
+            'sn': record['sn'],
+            'category': record['category'],
+            'content': record['text'],
+            'content_hash': record.get('content_hash'),
+            **{field: record[field] for field in FINANCE_FIELDS if field in record},
+        })
+        for field in FINANCE_FIELDS:
+            values = record.get(field) or []
+            if field == 'companies':
+                # 公司名稱與 ES 的 companies.text 相同以 CJK bigram 分析比對，查詢中的簡稱也能部分相符
+                values = analyze(' '.join(values), output_unigrams=True)
+            self.field_values[field].append(set(values))
+        self.categories.append(record['category'])
+        self.doc_ids.append(record['id'])
+        row = record.get('embedding_row')
+        self.rows.append(-1 if row is None else row)
+        self.alive.append(1)
+
+        # 與索引用的 cjk_bigram_analyzer 相同，同時輸出單字
+        tokens = analyze(record['text'] or '', output_unigrams=True)
+        self.doc_len.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array('q'), array('f'))
+            posting[0].append(position)
+            posting[1].append(tf)
+
+    def _load_embeddings(self) -> None:
+        """.f32 有新的列時重新 memmap，只計算新列的長度"""
+        self.embeddings = load_embeddings(self.path)
+        if self.embeddings is not None and len(self.embeddings) > len(self.norms):
+            self.norms = np.concatenate([self.norms, np.linalg.norm(self.embeddings[len(self.norms):], axis=1)])
+
+    def snapshot(self) -> '_LocalSnapshot':
+        if self._snapshot is None:
+            self._snapshot = _LocalSnapshot(self)
+        return self._snapshot
+
+
+class _LocalSnapshot:
+    """_LocalIndex 在某一時間點的唯讀 NumPy 結構，搜尋期間不受之後的寫入影響"""
+
+    def __init__(self, index: _LocalIndex):
+        count = len(index.ids)
+        self.ids = index.ids[:count]
+        self.sources = index.sources[:count]
+        self.field_values = {field: values[:count] for field, values in index.field_values.items()}
+        self.categories = np.array(index.categories, dtype=object)
+        self.doc_ids = np.array(index.doc_ids, dtype=object)
+        self.alive = np.array(index.alive, dtype=bool)
+
+        # 重新寫入的分塊會在 .f32 附加新的一列，舊列保留但不再被引用
+        self.embeddings = index.embeddings
+        self.norms = index.norms
+        self.rows = np.array(index.rows, dtype=np.int64)
+        self.rows[self.rows >= len(self.norms)] = -1
+
+        # 失效分塊的詞頻仍留在倒排索引中 (與 ES 刪除的文檔在合併前仍計入統計相同)，由 alive 過濾
+        self.postings = {
+            term: (np.array(positions, dtype=np.int64), np.array(tfs, dtype=np.float32))
+            for term, (positions, tfs) in index.postings.items()
+        }
+        self.doc_len = np.array(index.doc_len, dtype=np.float32)
+        self.n_docs = int(self.alive.sum())
+        self.avg_len = float(self.doc_len[self.alive].mean()) if self.n_docs else 1.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def field_match(self, field: str, values: List[str]) -> np.ndarray:
+        """欄位符合任一值的文檔；公司名稱與 ES 相同，查詢端以不輸出單字的 cjk_bigram_search_analyzer 分析"""
+        if field == 'companies':
+            wanted = set(analyze(' '.join(values)))
+        else:
+            wanted = set(values)
+        return np.array([bool(doc_values & wanted) for doc_values in self.field_values[field]], dtype=bool)
+
+    def mask(self, category: str = None, doc_ids: List[str] = [], field_filters: Dict[str, List[str]] = None) -> np.ndarray:
+        mask = self.alive.copy()
+        if category:
+            mask &= self.categories == category
+        if doc_ids:
+            mask &= np.isin(self.doc_ids, [str(doc_id) for doc_id in doc_ids])
+        for field, values in (field_filters or {}).items():
+            # 與 ES 相同，沒有該欄位的文檔不過濾
+            missing = np.array([not doc_values for doc_values in self.field_values[field]], dtype=bool)
+            mask &= self.field_match(field, values) | missing
+        return mask
+
+
+class LocalSearchClient:
+    # 與 Elasticsearch 共用相同的 _id 與融合方式，兩種後端的結果可以直接比較
+    gen_document_id = staticmethod(ElasticsearchClient.gen_document_id)
+    fuse_responses = ElasticsearchClient.fuse_responses
+    # 由 SearchEngine 設定為嵌入客戶端的 signature，記錄於索引檔並拒絕寫入其他設定產生的向量
+    embedding_signature = None
+
+    def __init__(self, path: str = config.LOCAL_INDEX_PATH, k1: float = 1.2, b: float = 0.75):
+        """
+        不需外部服務的行程內搜尋後端，介面與 ElasticsearchClient 相同
+
+        每個索引存為 {path}/{index_name}.jsonl 分塊檔 (格式與前處理 --output --with-embeddings 相同，可直接複製使用)，
+        寫入時附加到檔案，讀取時以 memmap 載入嵌入向量並建立 BM25 倒排索引。
+        kNN 為過濾後的精確 cosine top-k；BM25 使用與 scripts/put_es_template.sh 相同的 CJK bigram 分析。
+
+        Args:
+            path: 索引檔案所在目錄
+            k1, b: BM25 參數，與 ES 預設值相同
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.metrics = NULL_METRICS
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def ping(self) -> bool:
+        """健康檢查：索引目錄可讀寫 (尚未建立時檢查其上層目錄)"""
+        path = os.path.abspath(self.path)
+        while not os.path.exists(path):
+            path = os.path.dirname(path)
+        return os.path.isdir(path) and os.access(path, os.R_OK | os.W_OK)
+
+    def index_path(self, index_name: str) -> str:
+        return os.path.join(self.path, f"{index_name or 'documents'}.jsonl")
+
+    def _index(self, index_name: str) -> _LocalIndex:
+        """第一次使用時從索引檔載入，之後由寫入增量更新；呼叫端須持有 self._lock"""
+        index = self._indexes.get(index_name)
+        if index is None:
+            path = self.index_path(index_name)
+            stored = embedding_signature_of(path)
+            if self.embedding_signature and stored and stored != self.embedding_signature:
+                print(f"❌ 本地索引 {index_name} 的嵌入向量來自 {stored}，與目前的嵌入設定 {self.embedding_signature} 不同，kNN 結果無效，請重新建立索引")
+            index = self._indexes[index_name] = _LocalIndex(path)
+        return index
+
+    def _snapshot(self, index_name: str) -> _LocalSnapshot:
+        """搜尋用的唯讀快照，寫入後第一次搜尋時重新建立"""
+        with self._lock:
+            return self._index(index_name).snapshot()
+
+    def _write(self, index_name: str, write) -> None:
+        """write(writer) 回傳寫入的紀錄，套用到已載入的記憶體索引；已失效的行過多時壓縮索引檔"""
+        with self._lock:
+            with ChunkFileWriter(self.index_path(index_name), with_embeddings=True, embedding_signature=self.embedding_signature) as writer:
+                try:
+                    records = write(writer)
+                finally:
+                    writer.flush()
+            index = self._indexes.get(index_name)
+            if index is None:
+                return
+            index.apply(records)
+            if index.garbage > max(len(index.positions), COMPACT_MIN_GARBAGE):
+                self._compact(index_name)
+
+    def _compact(self, index_name: str) -> None:
+        before, after = compact_chunk_file(self.index_path(index_name))
+        # 壓縮後 embedding_row 重新編號，下一次使用時重新載入
+        self._indexes.pop(index_name, None)
+        print(f"✓ 已壓縮本地索引 {index_name}: {before} -> {after} 行")
+
+    def compact(self, index_name: str = DEFAULT_INDEX_NAME) -> None:
+        """移除索引檔中已被覆蓋或刪除的分塊與不再被引用的嵌入向量"""
+        with self._lock:
+            if os.path.exists(self.index_path(index_name)):
+                self._compact(index_name)
+
+    def index_document(self, index_name: str, doc_id: str, sn: int, category: str, content: str, embedding: List[float]):
+        """索引單個文檔"""
+        result = self.bulk_index_documents(index_name, [{
+            'doc_id': doc_id,
+            'sn': sn,
+            'category': category,
+            'content': content,
+            'embedding': embedding,
+        }])
+        for item in result['failed']:
+            print(f"索引文檔 {category}_{doc_id}_{sn} 時出錯: {item['error']}")
+
+    def bulk_index_documents(
+        self,
+        index_name: str,
+        documents: Iterable[Dict[str, Any]],
+        chunk_size: int = 500,
+        max_chunk_bytes: int = 10 * 1024 * 1024,
+    ) -> Dict[str, Any]:
+        """
+        批量寫入文檔，回傳格式與 ElasticsearchClient.bulk_index_documents 相同
+        chunk_size、max_chunk_bytes 只為相容介面，本地寫入不需分批
+        """
+        indexed = 0
+        failed = []
+
+        def write(writer: ChunkFileWriter) -> List[Dict[str, Any]]:
+            nonlocal indexed
+            records = []
+            for doc in documents:
+                try:
+                    records.append(writer.write(doc))
+                    indexed += 1
+                except Exception as e:
+                    failed.append(ElasticsearchClient._failed_item(doc, None, str(e)))
+            return records
+
+        try:
+            self._write(index_name, write)
+        except Exception as e:
+            print(f"批量索引時出錯: {e}")
+        return {'indexed': indexed, 'failed': failed}
+
+    def get_content_hashes(self, index_name: str, ids: List[str], batch_size: int = 1000) -> Dict[str, str]:
+        """讀取已索引分塊的 content_hash，用於增量索引"""
+        hashes = {}
+        # 直接讀取記憶體索引而不建立搜尋快照，增量寫入的每一批不會觸發重建
+        with self._lock:
+            index = self._index(index_name)
+            for uuid in ids:
+                position = index.positions.get(uuid)
+                if position is not None and index.sources[position]['content_hash']:
+                    hashes[uuid] = index.sources[position]['content_hash']
+        return hashes
+
+    def delete_stale_chunks(self, index_name: str, chunk_counts: Dict[Tuple[str, str], int], batch_size: int = 200) -> int:
+        """刪除文檔重新分塊後多出來的舊分塊 (sn >= 新的分塊數)，以刪除標記附加到索引檔"""
+        with self._lock:
+            index = self._index(index_name)
+            stale = [
+                source for source in (index.sources[position] for position in index.positions.values())
+                if (source['category'], source['doc_id']) in chunk_counts
+                and source['sn'] >= chunk_counts[(source['category'], source['doc_id'])]
+            ]
+
+        def write(writer: ChunkFileWriter) -> List[Dict[str, Any]]:
+            return [writer.delete(source['category'], source['doc_id'], source['sn']) for source in stale]
+
+        if stale:
+            self._write(index_name, write)
+        return len(stale)
+
+    def _hits(self, index: _LocalSnapshot, positions: np.ndarray, scores: np.ndarray, include_embedding: bool) -> Dict[str, Any]:
+        hits = []
+        for position, score in zip(positions, scores):
+            source = dict(index.sources[position])
+            if include_embedding and index.rows[position] >= 0:
+                source['embedding'] = index.embeddings[index.rows[position]].tolist()
+            hits.append({'_id': index.ids[position], '_score': float(score), '_source': source})
+        return {'hits': {'hits': hits}}
+
+    @staticmethod
+    def _top_k(positions: np.ndarray, scores: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """分數由高到低取前 size 個，同分時依寫入順序"""
+        if len(scores) > size:
+            keep = np.sort(np.argpartition(-scores, size - 1)[:size])
+            positions, scores = positions[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')
+        return positions[order], scores[order]
+
+    def bm25_search(self, query_text: str, size: int, category: str = None, doc_ids: List[str] = [], index_name: str = DEFAULT_INDEX_NAME, include_embedding: bool = False, field_filters: Dict[str, List[str]] = None, field_boosts: Dict[str, List[str]] = None) -> Dict[str, Any]:
+        """
+        BM25 搜尋，回傳 ES 格式的回應；與 combined_fields operator=or 相同，只回傳至少命中一個詞的文檔
+        field_boosts 的每個欄位相符時加上 FINANCE_FIELD_BOOST，與 ES 的 should 子句相同
+        """
+        index = self._snapshot(index_name)
+        scores = np.zeros(len(index), dtype=np.float32)
+        matched = np.zeros(len(index), dtype=bool)
+        for term in dict.fromkeys(analyze(query_text)):
+            posting = index.postings.get(term)
+            if posting is None:
+                continue
+            positions, tf = posting
+            idf = np.log(1 + (index.n_docs - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * index.doc_len[positions] / index.avg_len)
+            scores[positions] += tf * (self.k1 + 1) / (tf + norm) * idf
+            matched[positions] = True
+        for field, values in (field_boosts or {}).items():
+            scores += FINANCE_FIELD_BOOST * index.field_match(field, values)
+
+        positions = np.flatnonzero(matched & index.mask(category, doc_ids, field_filters))
+        positions, top_scores = self._top_k(positions, scores[positions], size)
+        return self._hits(index, positions, top_scores, include_embedding)
+
+    def knn_search(self, query_vector: List[float], size: int, category: str = None, doc_ids: List[str] = [], index_name: str = DEFAULT_INDEX_NAME, include_embedding: bool = False, field_filters: Dict[str, List[str]] = None) -> Dict[str, Any]:
+        """過濾後的精確 cosine top-k，分數與 ES cosine 相同換算為 (1 + cosine) / 2"""
+        index = self._snapshot(index_name)
+        if index.embeddings is None:
+            return {'hits': {'hits': []}}
+        positions = np.flatnonzero((index.rows >= 0) & index.mask(category, doc_ids, field_filters))
+        rows = index.rows[positions]
+        vector = np.asarray(query_vector, dtype=np.float32)
+        cosine = index.embeddings[rows] @ vector / np.maximum(index.norms[rows] * np.linalg.norm(vector), 1e-12)
+        positions, top_scores = self._top_k(positions, (1 + cosine) / 2, size)
+        return self._hits(index, positions, top_scores, include_embedding)
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_vector: List[float],
+        size: int,
+        category: str = None,
+        doc_ids: List[str] = [],
+        knn_weight: float = 0.7,
+        index_name: str = DEFAULT_INDEX_NAME,
+        search_mode: str = None,
+        include_embedding: bool = False,
+        field_filters: Dict[str, List[str]] = None,
+        field_boosts: Dict[str, List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """執行混合搜索，以加權 RRF 融合 BM25 與 kNN；search_mode 只為相容介面"""
+        try:
+            filters = dict(size=size, category=category, doc_ids=doc_ids, index_name=index_name, include_embedding=include_embedding, field_filters=field_filters)
+            legs = []
+            with self.metrics.stage('es_search'):
+                # 權重為 0 的查詢不影響融合結果，直接略過
+                if knn_weight != 1:
+                    with self.metrics.stage('bm25'):
+                        legs.append((self.bm25_search(query_text, field_boosts=field_boosts, **filters), 1 - knn_weight))
+                if knn_weight != 0:
+                    with self.metrics.stage('knn'):
+                        legs.append((self.knn_search(query_vector, **filters), knn_weight))
+
+            with self.metrics.stage('rrf'):
+                return self.fuse_responses(legs, top_k=size)
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            print(f"混合搜索出錯: {e}")
+            return []
+
+
+    def multi_search(
+        self,
+        queries: List[str],
+        query_vectors: List[List[float]],
+        size: int,
+        category: str = None,
+        doc_ids: List[str] = [],
+        knn_weight: float = 0.7,
+        index_name: str = DEFAULT_INDEX_NAME,
+        include_embedding: bool = False,
+        variant_weight: float = config.MULTI_QUERY_VARIANT_WEIGHT,
+        field_filters: Dict[str, List[str]] = None,
+        field_boosts: Dict[str, List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """多查詢混合搜索，參數與 ElasticsearchClient.multi_search 相同"""
+        try:
+            filters = dict(size=size, category=category, doc_ids=doc_ids, index_name=index_name, include_embedding=include_embedding, field_filters=field_filters)
+            legs = []
+            with self.metrics.stage('es_search'):
+                for position, (query_text, query_vector) in enumerate(zip(queries, query_vectors)):
+                    scale = 1 if position == 0 else variant_weight
+                    if (1 - knn_weight) * scale != 0:
+                        with self.metrics.stage('bm25'):
+                            legs.append((self.bm25_search(query_text, field_boosts=field_boosts, **filters), (1 - knn_weight) * scale))
+                    if query_vector is not None and knn_weight * scale != 0:
+                        with self.metrics.stage('knn'):
+                            legs.append((self.knn_search(query_vector, **filters), knn_weight * scale))
+
+            with self.metrics.stage('rrf'):
+                return self.fuse_responses(legs, top_k=size)
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            print(f"多查詢混合搜索出錯: {e}")
+            return []
+
+
+class AsyncLocalSearchClient(LocalSearchClient):
+    """LocalSearchClient 的 asyncio 介面，計算在本機完成，直接同步執行"""
+
+    async def bm25_search(self, query_text: str, size: int, **kwargs) -> Dict[str, Any]:
+        return LocalSearchClient.bm25_search(self, query_text, size, **kwargs)
+
+    async def knn_search(self, query_vector: List[float], size: int, **kwargs) -> Dict[str, Any]:
+        return LocalSearchClient.knn_search(self, query_vector, size, **kwargs)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,178 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Any, IO
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class MetricsExporter:
+    """量測事件的輸出端，子類別覆寫需要的方法"""
+
+    def export_span(self, name: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        pass
+
+
+class InMemoryCollector(MetricsExporter):
+    def __init__(self):
+        """將所有事件保存在記憶體中，供基準測試與測試程式讀取"""
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def export_span(self, name: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        with self.lock:
+            self.durations[name].append(seconds)
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        with self.lock:
+            self.counters[name] += value
+
+    def reset(self) -> None:
+        with self.lock:
+            self.durations.clear()
+            self.counters.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各階段的次數、平均與 p50/p95/p99 (毫秒)"""
+        with self.lock:
+            durations = {name: list(values) for name, values in self.durations.items()}
+        return {name: latency_summary(values) for name, values in durations.items()}
+
+
+class JsonLogExporter(MetricsExporter):
+    def __init__(self, stream: IO[str]):
+        """每個事件輸出一行 JSON，例如寫入檔案後交給日誌系統收集"""
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def export_span(self, name: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        self._write({'ts': time.time(), 'type': 'span', 'name': name, 'duration_ms': seconds * 1000, **attributes})
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        self._write({'ts': time.time(), 'type': 'counter', 'name': name, 'value': value, **labels})
+
+
+class PrometheusExporter(MetricsExporter):
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, namespace: str = 'rag'):
+        """彙總成 Prometheus 文字格式，由 HTTP 服務的 /metrics 提供"""
+        self.namespace = namespace
+        self.histograms: Dict[str, List[float]] = {}  # stage -> 各 bucket 累計次數 + [sum, count]
+        self.counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def export_span(self, name: str, seconds: float, attributes: Dict[str, Any]) -> None:
+        with self.lock:
+            histogram = self.histograms.setdefault(name, [0] * len(self.BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> str:
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+    def render(self) -> str:
+        metric = f'{self.namespace}_stage_duration_seconds'
+        lines = [f'# TYPE {metric} histogram']
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for bound, count in zip(self.BUCKETS, histogram):
+                    lines.append(f'{metric}_bucket{self._labels({"stage": stage, "le": bound})} {count}')
+                lines.append(f'{metric}_bucket{self._labels({"stage": stage, "le": "+Inf"})} {histogram[-1]}')
+                lines.append(f'{metric}_sum{self._labels({"stage": stage})} {histogram[-2]}')
+                lines.append(f'{metric}_count{self._labels({"stage": stage})} {histogram[-1]}')
+
+            declared = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                counter = f'{self.namespace}_{name}_total'
+                if counter not in declared:
+                    lines.append(f'# TYPE {counter} counter')
+                    declared.add(counter)
+                lines.append(f'{counter}{self._labels(dict(labels))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    def __init__(self, exporters: List[MetricsExporter] = None):
+        """
+        檢索流程的量測入口：以 stage() 記錄各階段耗時，以 increment() 累計計數器，事件轉送給所有 exporters
+
+        Args:
+            exporters: 例如 [InMemoryCollector()]、[PrometheusExporter(), JsonLogExporter(f)]
+        """
+        self.exporters = list(exporters or [])
+
+    @contextmanager
+    def stage(self, name: str, **attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **attributes)
+
+    def record(self, name: str, seconds: float, **attributes) -> None:
+        for exporter in self.exporters:
+            exporter.export_span(name, seconds, attributes)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        for exporter in self.exporters:
+            exporter.export_counter(name, value, labels)
+
+    def find_exporter(self, exporter_type: type):
+        for exporter in self.exporters:
+            if isinstance(exporter, exporter_type):
+                return exporter
+        return None
+
+
+class NullMetrics(Metrics):
+    """不記錄任何資料，作為預設值避免熱路徑上的額外開銷"""
+
+    @contextmanager
+    def stage(self, name: str, **attributes):
+        yield
+
+    def record(self, name: str, seconds: float, **attributes) -> None:
+        pass
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {'count': 0}
+    values = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+    }
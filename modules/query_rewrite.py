@@ -0,0 +1,56 @@
+from typing import List
+import re
+
+# 民國年與西元年互換，前面不可緊接其他數字
+ROC_YEAR_PATTERN = re.compile(r'(?<!\d)(民國\s*)?(\d{2,3})\s*年')
+AD_YEAR_PATTERN = re.compile(r'(?<!\d)(?:西元\s*)?((?:19|20)\d{2})\s*年')
+ROC_OFFSET = 1911
+# 沒有「民國」前綴時只轉換此範圍內的數字，避免把「10年期」之類的期間當成年份
+BARE_ROC_YEARS = range(70, 151)
+
+# 問句中不帶資訊的詞，移除後只保留關鍵詞；較長的詞在前，避免先移除其中的一部分
+_QUESTION_WORDS = (
+    '請問', '是否', '是多少', '為多少', '是什麼', '為什麼', '為何', '有哪些', '有什麼', '是哪',
+    '什麼', '哪些', '多少', '如何', '怎麼', '可以', '嗎', '呢',
+)
+_QUESTION_PATTERN = re.compile('|'.join(re.escape(word) for word in _QUESTION_WORDS))
+_PUNCTUATION_PATTERN = re.compile(r'[？?！!。，,、；;：:「」『』（）()\s]+')
+
+
+def to_ad_years(query: str) -> str:
+    """將民國年改寫為西元年，例如 民國111年 -> 2022年"""
+    def replace(match):
+        year = int(match.group(2))
+        if not match.group(1) and year not in BARE_ROC_YEARS:
+            return match.group(0)
+        return f'{year + ROC_OFFSET}年'
+    return ROC_YEAR_PATTERN.sub(replace, query)
+
+
+def to_roc_years(query: str) -> str:
+    """將西元年改寫為民國年，例如 2022年 -> 民國111年"""
+    def replace(match):
+        year = int(match.group(1))
+        if year <= ROC_OFFSET:
+            return match.group(0)
+        return f'民國{year - ROC_OFFSET}年'
+    return AD_YEAR_PATTERN.sub(replace, query)
+
+
+def extract_keywords(query: str) -> str:
+    """移除疑問詞與標點，留下以空白分隔的關鍵詞"""
+    return ' '.join(_PUNCTUATION_PATTERN.sub(' ', _QUESTION_PATTERN.sub(' ', query)).split())
+
+
+def rewrite_query(query: str, max_variants: int = 3) -> List[str]:
+    """
+    以規則產生查詢的改寫 (不含原始查詢)，用於多查詢檢索
+
+    依序為年份換算 (民國年與西元年互換，文件兩種寫法都有) 與關鍵詞擷取；
+    與原始查詢相同或重複的改寫會略過，最多回傳 max_variants 個
+    """
+    variants = []
+    for variant in (to_ad_years(query), to_roc_years(query), extract_keywords(query)):
+        if variant and variant != query and variant not in variants:
+            variants.append(variant)
+    return variants[:max_variants]
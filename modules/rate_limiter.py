@@ -0,0 +1,64 @@
+from typing import Dict
+import asyncio
+import threading
+import time
+
+import config
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float = 0):
+        """
+        令牌桶限流器，可在多個執行緒間共用
+
+        Args:
+            requests_per_minute: 每分鐘允許的請求數，0 表示不限流
+        """
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.rate)  # 最多允許一秒的突發量
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """嘗試取得一個額度，成功回傳 0，否則回傳需要等待的秒數"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """取得一個請求額度，額度不足時阻塞等待"""
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """acquire 的 asyncio 版本，等待時不阻塞事件迴圈"""
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """取得指定提供者共用的限流器，同一個 provider 的所有客戶端共享額度"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(config.RATE_LIMITS.get(provider, 0))
+        return _limiters[provider]
@@ -1,9 +1,20 @@
 from abc import ABC, abstractmethod
 import requests
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
+import httpx
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
 import time
 
-from modules.llm_client import LLMClient
+import config
+from modules.llm_client import LLMClient, AsyncLLMClient
+from modules.metrics import NULL_METRICS
+from modules.cache import RerankCache
+from modules.resilience import CircuitBreaker, backoff_delay
+from modules.text_analysis import analyze
 
 from llama_index.core.prompts.default_prompts import (
     DEFAULT_CHOICE_SELECT_PROMPT,
@@ -22,11 +33,40 @@ def RerankClient(mode = 'fast_rerank', llm_provider: str = 'openai'):
         return FastRerankClient()
     elif mode == 'llm_rerank':
         return LLMRerankClient(llm_provider=llm_provider)
+    elif mode == 'local_rerank':
+        return LocalRerankClient()
     else:
         raise ValueError(f"不支持的重排序模式: {mode}")
 
+class RerankResults(list):
+    """重排序結果；degraded 為 True 表示重排序失敗，內容為原始檢索順序或備案重排序的結果，不應被快取"""
+
+    def __init__(self, results: List[Dict] = (), degraded: bool = False):
+        super().__init__(results)
+        self.degraded = degraded
+
+
 class BaseRerankClient(ABC):
     """重排序客戶端的基礎類"""
+
+    # 為 True 時，檢索流程會在候選文檔中附上 embedding，並以 query_vector 參數傳入查詢向量
+    needs_embeddings = False
+    # 由 SearchEngine 設定；verbose 為 False 時只輸出錯誤訊息
+    metrics = NULL_METRICS
+    verbose = True
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    @property
+    def cache_id(self) -> str:
+        """辨識重排序設定的字串，作為檢索結果快取鍵的一部分；更換模型或服務後不沿用舊的結果"""
+        return type(self).__name__
+
+    def _degraded(self, results: List[Dict]) -> RerankResults:
+        self.metrics.increment('rerank_degraded')
+        return RerankResults(results, degraded=True)
     
     @abstractmethod
     def rerank(
@@ -41,56 +81,258 @@ class BaseRerankClient(ABC):
 
 
 class LLMRerankClient(BaseRerankClient):
-    def __init__(self, llm_provider: str = "openai"):
+    def __init__(
+        self,
+        llm_provider: str = "openai",
+        use_cache: bool = config.RERANK_CACHE_ENABLED,
+        group_size: int = config.LLM_RERANK_GROUP_SIZE,
+        workers: int = config.LLM_RERANK_WORKERS,
+        tournament: bool = config.LLM_RERANK_TOURNAMENT,
+    ):
+        """
+        Args:
+            group_size: 每個 prompt 最多包含的候選文檔數，超過時分組並行重排序；0 表示全部放在同一個 prompt
+            workers: 同時進行的分組重排序請求數
+            tournament: 分組合併後，是否再以各組勝出的文檔進行一輪決賽重排序
+        """
         self.llm_client = LLMClient(provider=llm_provider)
+        self._configure(llm_provider, use_cache, group_size, workers, tournament)
+
+    def _configure(self, llm_provider: str, use_cache: bool, group_size: int, workers: int, tournament: bool) -> None:
+        # 與 LLMClient 的重排序呼叫使用相同的模型，換模型後不沿用舊的排序結果
+        model = config.AZURE_OPENAI_GPT4_DEPLOYMENT if llm_provider == 'openai' else config.GCP_HAIKU_MODEL
+        self.model = f'{llm_provider}:{model}'
+        self.cache = RerankCache() if use_cache else None
+        self.group_size = group_size
+        self.workers = max(1, workers)
+        self.tournament = tournament
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """分組並行重排序的執行緒池，第一次分組時建立並在所有查詢間重複使用"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='llm-rerank')
+        return self._executor
+
+    @property
+    def cache_id(self) -> str:
+        return f'{type(self).__name__}:{self.model}:{self.group_size}:{self.tournament}'
+
+    def _build_prompt(self, query: str, candidates: List[Dict]) -> str:
+        nodes = []
+        for candidate in candidates:
+            nodes.append(TextNode(text=candidate["content"]))
+        self._log("  - 已將候選文檔轉換為 TextNode")
+
+        context_str = default_format_node_batch_fn(nodes)
+        variable_dict = {
+            'context_str': context_str,
+            'query_str': query,
+        }
+        prompt = DEFAULT_CHOICE_SELECT_PROMPT_TMPL.format(**variable_dict)
+        prompt_prefix = 'Please only respond with the requested format, without additional explanations or clarifications.\n\n'
+        self._log("  - 已生成重排序 prompt")
+        return f'{prompt_prefix}{prompt}'
+
+    @staticmethod
+    def _parse(raw_response: str, num_candidates: int) -> Tuple[List[int], List[float]]:
+        """解析 LLM 回應，回傳 (候選文檔索引, 相關度分數)"""
+        # print(f"  - 原始響應: {raw_response}")
+        raw_choices, relevances = default_parse_choice_select_answer_fn(raw_response, num_candidates)
+        decision = [
+            (int(choice) - 1, float(relevance))
+            for choice, relevance in zip(raw_choices, relevances)
+            if 0 < int(choice) <= num_candidates
+        ]
+        return [idx for idx, _ in decision], [relevance for _, relevance in decision]
+
+    def _groups(self, num_candidates: int) -> List[range]:
+        if self.group_size <= 0 or num_candidates <= self.group_size:
+            return [range(num_candidates)]
+        return [range(start, min(start + self.group_size, num_candidates)) for start in range(0, num_candidates, self.group_size)]
+
+    @staticmethod
+    def _merge(groups: List[range], decisions: List[Tuple[List[int], List[float]]]) -> Tuple[List[int], List[float]]:
+        """依相關度分數合併各組的選擇；分數相同時依組內名次，再依原始順序"""
+        scored = []
+        for group, (choices, relevances) in zip(groups, decisions):
+            for rank, (choice, relevance) in enumerate(zip(choices, relevances)):
+                scored.append((-relevance, rank, group[choice]))
+        scored.sort()
+        return [idx for _, _, idx in scored], [-score for score, _, _ in scored]
+
+    @staticmethod
+    def _apply_tournament(
+        decision: Tuple[List[int], List[float]],
+        finalists: List[int],
+        final: Tuple[List[int], List[float]],
+    ) -> Tuple[List[int], List[float]]:
+        """以決賽的排序取代決賽文檔的名次，決賽解析失敗時保留分組合併的結果"""
+        choices, relevances = final
+        if not choices:
+            return decision
+        ordered = [finalists[idx] for idx in choices]
+        selected = set(ordered)
+        score = dict(zip(*decision))
+        rest = [idx for idx in decision[0] if idx not in selected]
+        return ordered + rest, list(relevances) + [score[idx] for idx in rest]
+
+    def _rank(self, query: str, candidates: List[Dict]) -> Tuple[List[int], List[float]]:
+        groups = self._groups(len(candidates))
+        if len(groups) == 1:
+            return self._decide(query, candidates)
+
+        self._log(f"  - 分成 {len(groups)} 組並行重排序...")
+        decisions = list(self.executor.map(lambda group: self._decide(query, [candidates[idx] for idx in group]), groups))
+        decision = self._merge(groups, decisions)
+
+        if self.tournament and len(decision[0]) > 1:
+            finalists = decision[0][:self.group_size]
+            self._log(f"  - 以 {len(finalists)} 個文檔進行決賽重排序...")
+            decision = self._apply_tournament(decision, finalists, self._decide(query, [candidates[idx] for idx in finalists]))
+        return decision
+
+    def _cached_decision(self, query: str, candidates: List[Dict]) -> Optional[Tuple[List[int], List[float]]]:
+        if not self.cache:
+            return None
+        decision = self.cache.get(self.model, query, [candidate['content'] for candidate in candidates])
+        self.metrics.increment('rerank_cache_hits' if decision is not None else 'rerank_cache_misses')
+        if decision is not None:
+            self._log("  - 命中重排序快取")
+        return decision
+
+    def _store_decision(self, query: str, candidates: List[Dict], decision: Tuple[List[int], List[float]]) -> None:
+        # 解析失敗 (沒有選擇任何文檔) 的結果不快取，下次重新呼叫 LLM
+        if self.cache and decision[0]:
+            self.cache.set(self.model, query, [candidate['content'] for candidate in candidates], decision)
+
+    def _decide(self, query: str, candidates: List[Dict]) -> Tuple[List[int], List[float]]:
+        """取得候選文檔的排序決策，優先讀取快取"""
+        decision = self._cached_decision(query, candidates)
+        if decision is not None:
+            return decision
+
+        prompt = self._build_prompt(query, candidates)
+
+        self._log("  - 正在調用 LLM 進行重排序...")
+        raw_response = self.llm_client.generate_rerank_response(prompt)
+        self._log("  - 已獲得 LLM 響應")
+
+        decision = self._parse(raw_response, len(candidates))
+        self._store_decision(query, candidates, decision)
+        return decision
+
+    def _select(self, decision: Tuple[List[int], List[float]], candidates: List[Dict], top_k: int) -> List[Dict]:
+        choice_idxs, _ = decision
+        self._log(f"  - 解析結果: 選擇了 {len(choice_idxs)} 個文檔")
+
+        if not len(choice_idxs):
+            self.metrics.increment('rerank_parse_failures')
+            print(f"  ❌ 沒有選擇任何文檔, 返回原結果")
+            return self._degraded(candidates[:top_k])
+
+        result = [candidates[int(idx)] for idx in choice_idxs[:top_k]]
+        self._log(f"  ✓ 重排序完成，返回前 {top_k} 個結果")
+        return RerankResults(result)
         
     def rerank(self, query: str, candidates: List[Dict], top_k: int = 3, **kwargs) -> List[Dict]:
         try:
-            print(f"  - 準備使用 LLM 重排序 {len(candidates)} 個文檔...")
-            
-            nodes = []
-            for candidate in candidates:
-                nodes.append(TextNode(text=candidate["content"]))
-            print("  - 已將候選文檔轉換為 TextNode")
-
-            context_str = default_format_node_batch_fn(nodes)
-            variable_dict = {
-                'context_str': context_str,
-                'query_str': query,
-            }
-            prompt = DEFAULT_CHOICE_SELECT_PROMPT_TMPL.format(**variable_dict)
-            prompt_prefix = 'Please only respond with the requested format, without additional explanations or clarifications.\n\n'
-            print("  - 已生成重排序 prompt")
-
-            print("  - 正在調用 LLM 進行重排序...")
-            raw_response = self.llm_client.generate_rerank_response(f'{prompt_prefix}{prompt}')
-            print("  - 已獲得 LLM 響應")
-
-            # print(f"  - 原始響應: {raw_response}")
-            raw_choices, relevances = default_parse_choice_select_answer_fn(raw_response, len(nodes))
-            choice_idxs = [int(choice) - 1 for choice in raw_choices]
-            # choice_nodes = [nodes[idx] for idx in choice_idxs]
-            # relevances = relevances or [1.0 for _ in choice_nodes]
-            print(f"  - 解析結果: 選擇了 {len(choice_idxs)} 個文檔")
-
-            if not len(choice_idxs):
-                print(f"  ❌ 沒有選擇任何文檔, 返回原結果")
-                return candidates[:top_k]
-
-            result = [candidates[int(idx)] for idx in choice_idxs[:top_k]]
-            print(f"  ✓ 重排序完成，返回前 {top_k} 個結果")
-            return result
+            self._log(f"  - 準備使用 LLM 重排序 {len(candidates)} 個文檔...")
+            return self._select(self._rank(query, candidates), candidates, top_k)
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             print(f"  ❌ 重排序時出錯: {e}")
-            return candidates[:top_k]
+            return self._degraded(candidates[:top_k])
 
 
 class FastRerankClient(BaseRerankClient):
-    def __init__(self):
-        self.api_url = "https://reranker.dhr.wtf/rerank"
+    def __init__(self, fallback_provider: str = 'claude'):
+        """
+        呼叫外部 rerank API，失敗時以指數退避重試，連續失敗時由斷路器暫停呼叫並改用備案 LLM 重排序
+
+        Args:
+            fallback_provider: 備案 LLM 重排序使用的提供者
+        """
+        self.api_url = config.FAST_RERANK_API_URL
+        self.timeout = (config.FAST_RERANK_CONNECT_TIMEOUT, config.FAST_RERANK_READ_TIMEOUT)
+        self.max_retries = config.FAST_RERANK_MAX_RETRIES
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=config.FAST_RERANK_BREAKER_THRESHOLD,
+            recovery_timeout=config.FAST_RERANK_BREAKER_RECOVERY,
+        )
+        self.fallback_provider = fallback_provider
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+        self._init_http()
+
+    @property
+    def cache_id(self) -> str:
+        # 備案重排序的結果標記為 degraded 不會被快取，鍵只需區分 API
+        return f'{type(self).__name__}:{self.api_url}'
+
+    def _init_http(self) -> None:
+        # 共用連線池，避免每次請求重新建立 TLS 連線
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.FAST_RERANK_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def _new_fallback(self) -> BaseRerankClient:
+        return LLMRerankClient(llm_provider=self.fallback_provider)
+
+    @property
+    def fallback(self) -> BaseRerankClient:
+        """備案重排序客戶端，只在第一次需要時建立並重複使用"""
+        if self._fallback is None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    fallback = self._new_fallback()
+                    fallback.metrics = self.metrics
+                    fallback.verbose = self.verbose
+                    self._fallback = fallback
+        return self._fallback
+
+    @staticmethod
+    def _is_retryable(status_code: int) -> bool:
+        return status_code == 429 or status_code >= 500
+
+    def _should_retry(self, retryable: bool, attempt: int) -> bool:
+        """記錄一次失敗並判斷是否繼續重試；斷路器斷開後不再重試"""
+        self.circuit_breaker.record_failure()
+        if retryable and attempt < self.max_retries - 1 and self.circuit_breaker.allow_request():
+            self.metrics.increment('rerank_retries')
+            return True
+        return False
+
+    def _build_payload(self, query: str, candidates: List[Dict], mode: str) -> Dict:
+        items = [
+            {"id": str(i), "content": doc.get('content')}
+            for i, doc in enumerate(candidates)
+        ]
+        
+        return {
+            "query": query,
+            "items": items,
+            "mode": mode
+        }
+
+    def _select(self, result: Dict, candidates: List[Dict], top_k: int) -> List[Dict]:
+        reranked_items = result["items"]
+        sorted_items = sorted(
+            reranked_items,
+            key=lambda x: x["finalScore"],
+            reverse=True
+        )
+        
+        self._log(f"  ✓ 重排序完成")
+        return RerankResults([candidates[int(item["id"])] for item in sorted_items[:top_k]])
         
     def rerank(
         self,
@@ -101,56 +343,247 @@ class FastRerankClient(BaseRerankClient):
     ) -> List[Dict]:
         """重新排序搜索結果"""
         try:
-            print(f"  - 準備重排序 {len(candidates)} 個文檔...")
-            
-            items = [
-                {"id": str(i), "content": doc.get('content')}
-                for i, doc in enumerate(candidates)
-            ]
+            self._log(f"  - 準備重排序 {len(candidates)} 個文檔...")
+
+            if not self.circuit_breaker.allow_request():
+                print(f"  ❌ Rerank API 斷路中, 使用備案LLM重排序")
+                self.metrics.increment('rerank_fallbacks', reason='circuit_open')
+                return self._degraded(self.fallback.rerank(query, candidates, top_k))
             
-            payload = {
-                "query": query,
-                "items": items,
-                "mode": mode
-            }
+            payload = self._build_payload(query, candidates, mode)
             
-            max_retries = 3
-            for attempt in range(max_retries):
+            for attempt in range(self.max_retries):
                 try:
-                    print(f"  - 調用rerank API ({mode} 模式)... 嘗試 {attempt + 1}/{max_retries}")
-                    response = requests.post(
-                        self.api_url,
-                        json=payload,
-                        headers={"Content-Type": "application/json"}
-                    )
+                    self._log(f"  - 調用rerank API ({mode} 模式)... 嘗試 {attempt + 1}/{self.max_retries}")
+                    response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
                     
                     if response.status_code == 200:
-                        result = response.json()
-                        reranked_items = result["items"]
-                        sorted_items = sorted(
-                            reranked_items,
-                            key=lambda x: x["finalScore"],
-                            reverse=True
-                        )
-                        
-                        print(f"  ✓ 重排序完成")
-                        return [candidates[int(item["id"])] for item in sorted_items[:top_k]]
+                        result = self._select(response.json(), candidates, top_k)
+                        self.circuit_breaker.record_success()
+                        return result
                         
                     print(f"  ❌ Rerank API 調用失敗: {response.status_code}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2)  # 重試前等待2秒
-                        continue
+                    retryable = self._is_retryable(response.status_code)
                         
                 except Exception as e:
                     print(f"  ❌ 重排序時出錯: {e}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                        continue
+                    retryable = True
+
+                if not self._should_retry(retryable, attempt):
+                    break
+                time.sleep(backoff_delay(attempt))
                         
-            print(f"  ❌ 重試{max_retries}次後仍然失敗, 使用備案LLM重排序")
-            return LLMRerankClient(llm_provider='claude').rerank(query, candidates, top_k)
+            print(f"  ❌ Rerank API 調用失敗, 使用備案LLM重排序")
+            self.metrics.increment('rerank_fallbacks', reason='api_error')
+            return self._degraded(self.fallback.rerank(query, candidates, top_k))
             # return candidates[:top_k]
 
         except Exception as e:
             print(f"  ❌ 重排序時出錯: {e}")
-            return candidates[:top_k] 
\ No newline at end of file
+            return self._degraded(candidates[:top_k])
+
+
+class LocalRerankClient(BaseRerankClient):
+    needs_embeddings = True
+
+    def __init__(self, bm25_weight: float = config.LOCAL_RERANK_BM25_WEIGHT, k1: float = 1.2, b: float = 0.75):
+        """
+        在本機以 CPU 向量化計算 (查詢, 候選文檔) 分數的重排序器，不需要網路
+
+        分數為候選集合內 BM25 (與 ES 相同的 CJK bigram 分析) 與查詢向量/候選向量 cosine 的加權和，
+        兩者各自做 min-max 正規化；候選文檔沒有 embedding 時只使用 BM25
+
+        Args:
+            bm25_weight: BM25 分數的權重 (0-1)，其餘為 cosine 權重
+            k1, b: BM25 參數，與 ES 預設值相同
+        """
+        self.bm25_weight = bm25_weight
+        self.k1 = k1
+        self.b = b
+
+    @property
+    def cache_id(self) -> str:
+        return f'{type(self).__name__}:{self.bm25_weight}:{self.k1}:{self.b}'
+
+    def bm25_scores(self, query: str, contents: List[str]) -> np.ndarray:
+        """以候選集合本身作為語料計算 BM25，回傳每個候選文檔的分數"""
+        query_terms = list(dict.fromkeys(analyze(query)))
+        if not query_terms or not contents:
+            return np.zeros(len(contents), dtype=np.float32)
+
+        term_index = {term: i for i, term in enumerate(query_terms)}
+        tf = np.zeros((len(contents), len(query_terms)), dtype=np.float32)
+        doc_len = np.zeros(len(contents), dtype=np.float32)
+        for row, content in enumerate(contents):
+            tokens = analyze(content or '', output_unigrams=True)
+            doc_len[row] = len(tokens)
+            for token in tokens:
+                col = term_index.get(token)
+                if col is not None:
+                    tf[row, col] += 1
+
+        n_docs = len(contents)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        avg_len = doc_len.mean() or 1.0
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+        return ((tf * (self.k1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+    @staticmethod
+    def cosine_scores(query_vector: List[float], embeddings: List[List[float]]) -> np.ndarray:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        vector = np.asarray(query_vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+        return matrix @ vector / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def _min_max(scores: np.ndarray) -> np.ndarray:
+        span = scores.max() - scores.min()
+        if span <= 0:
+            return np.zeros_like(scores)
+        return (scores - scores.min()) / span
+
+    def score(self, query: str, candidates: List[Dict], query_vector: List[float] = None) -> np.ndarray:
+        scores = self._min_max(self.bm25_scores(query, [candidate.get('content') for candidate in candidates]))
+        embeddings = [candidate.get('embedding') for candidate in candidates]
+        if query_vector is not None and all(embedding is not None for embedding in embeddings):
+            cosine = self._min_max(self.cosine_scores(query_vector, embeddings))
+            scores = self.bm25_weight * scores + (1 - self.bm25_weight) * cosine
+        return scores
+
+    def rerank(self, query: str, candidates: List[Dict], top_k: int = 3, query_vector: List[float] = None, **kwargs) -> List[Dict]:
+        try:
+            if not candidates:
+                return RerankResults()
+            self._log(f"  - 準備本地重排序 {len(candidates)} 個文檔...")
+            scores = self.score(query, candidates, query_vector)
+            # 穩定排序，同分時保留原本的檢索順序
+            order = np.argsort(-scores, kind='stable')[:top_k]
+            self._log(f"  ✓ 重排序完成，返回前 {top_k} 個結果")
+            return RerankResults([candidates[idx] for idx in order])
+        except Exception as e:
+            print(f"  ❌ 重排序時出錯: {e}")
+            return self._degraded(candidates[:top_k])
+
+
+def AsyncRerankClient(mode = 'fast_rerank', llm_provider: str = 'openai'):
+    print(f"目前使用的重排序模式: {mode}")
+    if mode == 'fast_rerank':
+        return AsyncFastRerankClient()
+    elif mode == 'llm_rerank':
+        return AsyncLLMRerankClient(llm_provider=llm_provider)
+    elif mode == 'local_rerank':
+        return AsyncLocalRerankClient()
+    else:
+        raise ValueError(f"不支持的重排序模式: {mode}")
+
+
+class AsyncLLMRerankClient(LLMRerankClient):
+    """LLMRerankClient 的 asyncio 版本"""
+
+    def __init__(
+        self,
+        llm_provider: str = "openai",
+        use_cache: bool = config.RERANK_CACHE_ENABLED,
+        group_size: int = config.LLM_RERANK_GROUP_SIZE,
+        workers: int = config.LLM_RERANK_WORKERS,
+        tournament: bool = config.LLM_RERANK_TOURNAMENT,
+    ):
+        self.llm_client = AsyncLLMClient(provider=llm_provider)
+        self._configure(llm_provider, use_cache, group_size, workers, tournament)
+
+    async def _decide(self, query: str, candidates: List[Dict], semaphore: asyncio.Semaphore = None) -> Tuple[List[int], List[float]]:
+        """semaphore 限制同一次 rerank() 中分組請求的並行數；不分組時不需要"""
+        decision = self._cached_decision(query, candidates)
+        if decision is not None:
+            return decision
+        prompt = self._build_prompt(query, candidates)
+        if semaphore is None:
+            raw_response = await self.llm_client.generate_rerank_response(prompt)
+        else:
+            async with semaphore:
+                raw_response = await self.llm_client.generate_rerank_response(prompt)
+        decision = self._parse(raw_response, len(candidates))
+        self._store_decision(query, candidates, decision)
+        return decision
+
+    async def _rank(self, query: str, candidates: List[Dict]) -> Tuple[List[int], List[float]]:
+        groups = self._groups(len(candidates))
+        if len(groups) == 1:
+            return await self._decide(query, candidates)
+
+        # 每次呼叫各自限制並行數，不同查詢的重排序不互相排隊
+        semaphore = asyncio.Semaphore(self.workers)
+        decisions = await asyncio.gather(*(self._decide(query, [candidates[idx] for idx in group], semaphore) for group in groups))
+        decision = self._merge(groups, decisions)
+
+        if self.tournament and len(decision[0]) > 1:
+            finalists = decision[0][:self.group_size]
+            decision = self._apply_tournament(decision, finalists, await self._decide(query, [candidates[idx] for idx in finalists]))
+        return decision
+
+    async def rerank(self, query: str, candidates: List[Dict], top_k: int = 3, **kwargs) -> List[Dict]:
+        try:
+            return self._select(await self._rank(query, candidates), candidates, top_k)
+        except Exception as e:
+            print(f"  ❌ 重排序時出錯: {e}")
+            return self._degraded(candidates[:top_k])
+
+    async def close(self) -> None:
+        await self.llm_client.close()
+
+
+class AsyncFastRerankClient(FastRerankClient):
+    """FastRerankClient 的 asyncio 版本，重試、斷路器與備案策略相同"""
+
+    def _init_http(self) -> None:
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+            limits=httpx.Limits(max_connections=config.FAST_RERANK_POOL_SIZE),
+        )
+
+    def _new_fallback(self) -> BaseRerankClient:
+        return AsyncLLMRerankClient(llm_provider=self.fallback_provider)
+
+    async def rerank(self, query: str, candidates: List[Dict], top_k: int = 3, mode: str = "ai") -> List[Dict]:
+        """重新排序搜索結果"""
+        if not self.circuit_breaker.allow_request():
+            self.metrics.increment('rerank_fallbacks', reason='circuit_open')
+            return self._degraded(await self.fallback.rerank(query, candidates, top_k))
+
+        payload = self._build_payload(query, candidates, mode)
+        for attempt in range(self.max_retries):
+            try:
+                response = await self.http.post(self.api_url, json=payload)
+                if response.status_code == 200:
+                    result = self._select(response.json(), candidates, top_k)
+                    self.circuit_breaker.record_success()
+                    return result
+                print(f"  ❌ Rerank API 調用失敗: {response.status_code}")
+                retryable = self._is_retryable(response.status_code)
+            except Exception as e:
+                print(f"  ❌ 重排序時出錯: {e}")
+                retryable = True
+
+            if not self._should_retry(retryable, attempt):
+                break
+            await asyncio.sleep(backoff_delay(attempt))
+
+        print(f"  ❌ Rerank API 調用失敗, 使用備案LLM重排序")
+        self.metrics.increment('rerank_fallbacks', reason='api_error')
+        return self._degraded(await self.fallback.rerank(query, candidates, top_k))
+
+    async def close(self) -> None:
+        await self.http.aclose()
+        if self._fallback is not None:
+            await self._fallback.close()
+
+
+class AsyncLocalRerankClient(LocalRerankClient):
+    """LocalRerankClient 的 asyncio 介面；計算量在毫秒等級，直接在事件迴圈中執行"""
+
+    async def rerank(self, query: str, candidates: List[Dict], top_k: int = 3, query_vector: List[float] = None, **kwargs) -> List[Dict]:
+        return LocalRerankClient.rerank(self, query, candidates, top_k, query_vector=query_vector)
+
+    async def close(self) -> None:
+        pass
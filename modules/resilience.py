@@ -0,0 +1,60 @@
+import random
+import threading
+import time
+
+
+def backoff_delay(attempt: int, base: float = 0.5, max_delay: float = 8.0) -> float:
+    """
+    指數退避加上 full jitter 的等待秒數
+
+    Args:
+        attempt: 第幾次重試 (從 0 開始)
+        base: 第一次重試的等待上限
+        max_delay: 等待時間上限
+    """
+    return random.uniform(0, min(max_delay, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """
+        斷路器：連續失敗達門檻後暫停呼叫遠端服務，冷卻後放行一次試探請求
+
+        Args:
+            failure_threshold: 連續失敗幾次後斷開
+            recovery_timeout: 斷開後經過幾秒允許試探
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """是否允許呼叫遠端服務；半開狀態下只放行一個試探請求"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"  ❌ 斷路器開啟，{self.recovery_timeout:.0f} 秒內略過遠端服務")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
@@ -0,0 +1,28 @@
+import config
+
+
+def SearchClient(backend: str = config.SEARCH_BACKEND, search_mode: str = config.ES_SEARCH_MODE):
+    """
+    依設定建立搜尋後端
+
+    Args:
+        backend: elasticsearch 或 local (行程內的 LocalSearchClient，不需外部服務)
+        search_mode: Elasticsearch 的混合搜索模式，local 後端忽略
+    """
+    if backend == 'local':
+        from modules.local_search_client import LocalSearchClient
+        return LocalSearchClient()
+    if backend == 'elasticsearch':
+        from modules.es_client import ElasticsearchClient
+        return ElasticsearchClient(search_mode=search_mode)
+    raise ValueError(f"不支援的搜尋後端: {backend}")
+
+
+def AsyncSearchClient(backend: str = config.SEARCH_BACKEND):
+    if backend == 'local':
+        from modules.local_search_client import AsyncLocalSearchClient
+        return AsyncLocalSearchClient()
+    if backend == 'elasticsearch':
+        from modules.es_client import AsyncElasticsearchClient
+        return AsyncElasticsearchClient()
+    raise ValueError(f"不支援的搜尋後端: {backend}")
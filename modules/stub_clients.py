@@ -0,0 +1,58 @@
+from typing import List, Dict, Any
+import zlib
+
+import numpy as np
+
+from modules.metrics import NULL_METRICS
+from modules.text_analysis import analyze
+
+
+class StubEmbeddingClient:
+    def __init__(self, dims: int = 1536):
+        """離線嵌入客戶端：將 CJK bigram 詞元雜湊到固定維度後正規化，相同文本永遠得到相同向量"""
+        self.dims = dims
+        self.signature = f'stub@{dims}'
+
+    def get_embedding(self, text: str) -> List[float]:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in analyze(text, output_unigrams=True):
+            vector[zlib.crc32(token.encode('utf-8')) % self.dims] += 1
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def get_embeddings(self, texts: List[str], **kwargs) -> List[List[float]]:
+        return [self.get_embedding(text) for text in texts]
+
+
+class StubElasticsearchClient:
+    """不連線的搜尋客戶端：將 doc_ids 過濾條件依序當成候選文檔回傳，用於量測流程本身的開銷"""
+
+    def __init__(self):
+        self.metrics = NULL_METRICS
+
+    def hybrid_search(self, query_text: str, query_vector: List[float], size: int, category: str = None, doc_ids: List[str] = [], knn_weight: float = 0.7, index_name: str = None, **kwargs) -> List[Dict[str, Any]]:
+        with self.metrics.stage('es_search'):
+            return [
+                {
+                    '_id': f'{category}_{doc_id}',
+                    '_score': 0.0,
+                    '_source': {'doc_id': doc_id, 'category': category, 'content': ''},
+                    'weighted_rrf_score': 0.0,
+                }
+                for doc_id in (doc_ids or [])[:size * 2]
+            ]
+
+    def multi_search(self, queries: List[str], query_vectors: List[List[float]], size: int, **kwargs) -> List[Dict[str, Any]]:
+        return self.hybrid_search(queries[0], query_vectors[0], size, **kwargs)
+
+
+class StubLLMClient:
+    """離線 LLM 客戶端，回傳空字串"""
+
+    def generate_response(self, query: str, context: str) -> str:
+        return ''
+
+    def generate_rerank_response(self, prompt: str) -> str:
+        return ''
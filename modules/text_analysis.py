@@ -0,0 +1,39 @@
+from typing import List
+import re
+import unicodedata
+
+# 與 scripts/put_es_template.sh 中 cjk_bigram 過濾器處理的文字範圍一致 (漢字、假名、韓文)
+_CJK_RANGES = '㐀-䶿一-鿿豈-﫿぀-ゟ゠-ヿ가-힯'
+_TOKEN_PATTERN = re.compile(f'(?P<cjk>[{_CJK_RANGES}]+)|(?P<word>[^\\W_{_CJK_RANGES}]+)')
+
+
+def analyze(text: str, output_unigrams: bool = False) -> List[str]:
+    """
+    模擬 ES 的 cjk_bigram 分析器: standard tokenizer + cjk_width + lowercase + cjk_bigram
+
+    Args:
+        text: 原始文本
+        output_unigrams: True 對應索引用的 cjk_bigram_analyzer (同時輸出單字)，
+                         False 對應查詢用的 cjk_bigram_search_analyzer
+
+    Returns:
+        List[str]: 詞元列表；連續的 CJK 字元組成雙字詞，孤立的 CJK 字元輸出單字，其餘文字以詞為單位
+    """
+    if not text:
+        return []
+    # NFKC 涵蓋 cjk_width 的全形/半形轉換
+    text = unicodedata.normalize('NFKC', text).lower()
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        word = match.group('word')
+        if word:
+            tokens.append(word)
+            continue
+        run = match.group('cjk')
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        if output_unigrams:
+            tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
@@ -1,34 +1,52 @@
 from main import SearchEngine
+from .pipeline import IngestionPipeline, add_output_arguments, chunk_writer_from_args
+import argparse
+import hashlib
 import json
 import os
 
 FAQ_JSON_FILE = './reference/faq/pid_map_content.json'
 
+def load_faq(key, questions):
+    category = 'faq'
+    documents = []
+    sn = 0
+    for idx, i in enumerate(questions, start = 0):
+        answers = i.get('answers', [])
+        for answer in answers:
+            text = f'{i.get("question")}\n{answer}'
+            documents.append({
+                'id': key,
+                'sn': sn,
+                'category': category,
+                'text': text,
+            })
+            sn +=1
+    return documents
+
 def main():
+    parser = argparse.ArgumentParser(description='faq 文件前處理與寫入')
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
     with open(FAQ_JSON_FILE, 'r') as f:
         json_data = json.load(f)
 
-    engine = SearchEngine()
-    documents = []
-    category = 'faq'
-
-    keys = list(json_data.keys())
-    for key in keys:
-        questions = json_data[key]
-        sn = 0
-        for idx, i in enumerate(questions, start = 0):
-            answers = i.get('answers', [])
-            for answer in answers:
-                text = f'{i.get("question")}\n{answer}'
-                documents.append({
-                    'id': key,
-                    'sn': sn,
-                    'category': category,
-                    'text': text,
-                })
-                sn +=1
+    engine = SearchEngine(verbose=False)
+    chunk_writer = chunk_writer_from_args(args)
+    pipeline = IngestionPipeline(engine, 'faq', use_chunk=False, chunk_writer=chunk_writer)
 
-    engine.index_documents(documents, use_chunk=False)
+    # 每個 pid 為一個來源，續傳時略過已寫入且內容未變動的 pid
+    pipeline.run(
+        (
+            key,
+            lambda key=key: load_faq(key, json_data[key]),
+            hashlib.sha256(json.dumps(json_data[key], ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest(),
+        )
+        for key in json_data.keys()
+    )
+    if chunk_writer is not None:
+        chunk_writer.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
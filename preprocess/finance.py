@@ -1,3 +1,6 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import multiprocessing
 import re
 import os
 
@@ -8,41 +11,96 @@ from llama_index.core import Document
 
 from main import SearchEngine
 from modules.llm_client import LLMClient
+from modules.finance_fields import extract_finance_fields, describe_finance_fields
+from .pipeline import IngestionPipeline, add_output_arguments, chunk_writer_from_args, file_fingerprint
 from .utils import read_md, clean_text
 
 finance_folder = './reference/finance/output'
 
-def main():
+def parse_finance(subfolder):
+    """
+    讀取並解析單一子資料夾的 markdown (CPU 密集，於子行程中執行)，表格保留原文供之後產生摘要
+    同時以規則擷取全文的公司名稱、年份與季度
+    """
+    content = read_md(finance_folder, subfolder)
+    document = Document(text = content)
+    parser = MarkdownElementNodeParser()
+    elements = parser.extract_elements(document)
+
+    parsed = []
+    for element in elements:
+        if element.type in ("table", "table_text"):
+            parsed.append({'table': True, 'text': element.element})
+        else:
+            parsed.append({'table': False, 'text': clean_text(element.element)})
+    return {'content': content, 'elements': parsed, 'fields': extract_finance_fields(content)}
+
+def load_finance(llm, llm_pool, parse_pool, subfolder, summary: bool = True):
     category = 'finance'
-    engine = SearchEngine()
+    parsed = parse_pool.submit(parse_finance, subfolder).result()
+    fields = parsed['fields']
+
+    # 全文摘要與各表格摘要同時送出，LLMClient 內的限流器控制整體請求速率
+    simple_summary = llm_pool.submit(llm.generate_simple_summary, parsed['content']) if summary else None
+    table_summaries = {
+        sn: llm_pool.submit(llm.generate_table_summary, element['text'])
+        for sn, element in enumerate(parsed['elements'])
+        if element['table']
+    }
+
+    if simple_summary is not None:
+        header = f'全文摘要:{simple_summary.result()}'
+    else:
+        # 不產生全文摘要時，以規則擷取的公司與年份 (附民國年/西元年換算) 作為文件資訊
+        header = f'文件資訊:{describe_finance_fields(fields)}'
+
+    docs = []
+    for sn, element in enumerate(parsed['elements']):
+        if element['table']:
+            table_text = element['text']
+            table_summary = table_summaries[sn].result()
+            text = f'{table_summary}\n Table: {table_text}'
+        else:
+            text = element['text']
+
+        docs.append({
+            'id': subfolder,
+            'sn': sn,
+            'category': category,
+            'text': f'{header}\n\n段落內容:{text}',
+            **fields,
+        })
+    return docs
+
+def main():
+    parser = argparse.ArgumentParser(description='finance 文件前處理與寫入')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='解析 markdown 的行程數 (預設: CPU 核心數)')
+    parser.add_argument('--llm-workers', type=int, default=8,
+                        help='同時進行的摘要請求數 (預設: 8)，每分鐘上限由 CLAUDE_REQUESTS_PER_MINUTE 設定')
+    parser.add_argument('--no-summary', action='store_true',
+                        help='不呼叫 LLM 產生全文摘要，改以規則擷取的公司、年份與季度作為文件資訊 (表格摘要不受影響)')
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    engine = SearchEngine(verbose=False)
+    chunk_writer = chunk_writer_from_args(args)
     llm = LLMClient(provider = 'claude')
     finance_subfolders = os.listdir(finance_folder)
-    for subfolder in finance_subfolders:
-        content = read_md(finance_folder, subfolder)
-        document = Document(text = content)
-        parser = MarkdownElementNodeParser()
-        elements = parser.extract_elements(document)
-    
-        simple_summary = llm.generate_simple_summary(content)
-        
-        docs = []
-        for sn, element in enumerate(elements):
-            if element.type in ("table", "table_text"):
-                table_text = element.element  
-                table_summary = llm.generate_table_summary(table_text)
-                text = f'{table_summary}\n Table: {table_text}'
-            else:
-                text = clean_text(element.element)
-        
-            docs.append({
-                'id': subfolder,
-                'sn': sn,
-                'category': category,
-                'text': f'全文摘要:{simple_summary}\n\n段落內容:{text}',
-            })
-
-        engine.index_documents(docs)
-        print(f'{subfolder} done.')
+    # spawn 避免在已有連線池執行緒的行程中 fork
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context('spawn')) as parse_pool, \
+            ThreadPoolExecutor(max_workers=args.llm_workers) as llm_pool:
+        pipeline = IngestionPipeline(engine, 'finance', load_workers=args.processes, chunk_writer=chunk_writer)
+        # 摘要在載入來源時才產生，已完成且原始檔案未變動的子資料夾不會重複呼叫 LLM
+        pipeline.run(
+            (
+                subfolder,
+                lambda subfolder=subfolder: load_finance(llm, llm_pool, parse_pool, subfolder, summary=not args.no_summary),
+                file_fingerprint(f'{finance_folder}/{subfolder}/{subfolder}.md'),
+            )
+            for subfolder in finance_subfolders
+        )
+    if chunk_writer is not None:
+        chunk_writer.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
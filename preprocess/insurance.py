@@ -1,3 +1,8 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import multiprocessing
+import os
+
 from llama_index.core.node_parser import (
     MarkdownElementNodeParser,
     MarkdownNodeParser,
@@ -5,29 +10,50 @@ from llama_index.core.node_parser import (
 from llama_index.core import Document
 
 from main import SearchEngine
+from .pipeline import IngestionPipeline, add_output_arguments, chunk_writer_from_args, file_fingerprint
 from .utils import read_md, clean_text
 
 insurance_folder = './reference/insurance/output'
 
-def main():
+def load_insurance(subfolder):
+    """讀取並解析單一子資料夾的 markdown (CPU 密集，於子行程中執行)，回傳可 pickle 的文檔列表"""
     category = 'insurance'
-    engine = SearchEngine()
+    content = read_md(insurance_folder, subfolder)
+    document = Document(text = content)
+    parser = MarkdownNodeParser(include_metadata = False, include_prev_next_rel = False)
+    nodes = parser.get_nodes_from_documents([document])
+    docs = []
+    for sn, node in enumerate(nodes):
+        docs.append({
+            'id': subfolder,
+            'sn': sn,
+            'category': category,
+            'text': clean_text(node.text),
+        })
+    return docs
+
+def main():
+    parser = argparse.ArgumentParser(description='insurance 文件前處理與寫入')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='解析 markdown 的行程數 (預設: CPU 核心數)')
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    engine = SearchEngine(verbose=False)
+    chunk_writer = chunk_writer_from_args(args)
     insurance_subfolders = os.listdir(insurance_folder)
-    for subfolder in insurance_subfolders:
-        content = read_md(insurance_folder, subfolder)
-        document = Document(text = content)
-        parser = MarkdownNodeParser(include_metadata = False, include_prev_next_rel = False)
-        nodes = parser.get_nodes_from_documents([document])
-        docs = []
-        for sn, node in enumerate(nodes):
-            docs.append({
-                'id': subfolder,
-                'sn': sn,
-                'category': category,
-                'text': clean_text(node.text),
-            })
-        engine.index_documents(docs)
-        print(f'{subfolder} done.')
+    # spawn 避免在已有連線池執行緒的行程中 fork
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pipeline = IngestionPipeline(engine, 'insurance', load_workers=args.processes, chunk_writer=chunk_writer)
+        pipeline.run(
+            (
+                subfolder,
+                lambda subfolder=subfolder: pool.submit(load_insurance, subfolder).result(),
+                file_fingerprint(f'{insurance_folder}/{subfolder}/{subfolder}.md'),
+            )
+            for subfolder in insurance_subfolders
+        )
+    if chunk_writer is not None:
+        chunk_writer.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,337 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union, Any
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+from llama_index.core.node_parser import SentenceSplitter
+
+from main import SearchEngine
+from modules.chunk_store import ChunkFileWriter
+
+CHECKPOINT_DIR = './cache/ingest'
+
+# (來源名稱, 延遲載入該來源文檔的函式[, 來源指紋])
+# 已完成且指紋相同的來源不會呼叫載入函式，避免重做解析與 LLM 摘要；指紋通常為原始檔案的雜湊，檔案變動後重新處理
+Source = Union[Tuple[str, Callable[[], List[Dict]]], Tuple[str, Callable[[], List[Dict]], str]]
+
+_END = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class _SourceEnd:
+    """標記某個來源的分塊已全部送出，隨分塊一起經過各階段"""
+
+    def __init__(self, source: str, chunks: int = 0, chunk_counts: Dict = None, fingerprint: str = None, error: str = None, skipped: bool = False):
+        self.source = source
+        self.skipped = skipped
+        self.chunks = chunks
+        self.chunk_counts = chunk_counts or {}
+        self.fingerprint = fingerprint
+        self.error = error
+
+
+def file_fingerprint(path: str) -> str:
+    """檔案內容的 sha256，作為來源指紋；檔案不存在時回傳 None (每次都重新處理，由載入函式回報錯誤)"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    """前處理腳本共用的中介檔參數"""
+    parser.add_argument('--output', help='將分塊寫入此 JSONL 中介檔而不寫入 Elasticsearch，之後以 main.py --mode index --chunks 載入')
+    parser.add_argument('--with-embeddings', action='store_true', help='中介檔一併保存嵌入向量 (需搭配 --output)')
+
+
+def chunk_writer_from_args(args: argparse.Namespace) -> Optional[ChunkFileWriter]:
+    if not args.output:
+        return None
+    return ChunkFileWriter(args.output, with_embeddings=args.with_embeddings)
+
+
+def prefetch(iterable: Iterable, maxsize: int) -> Iterator:
+    """
+    在背景執行緒中執行上游 generator，透過有界佇列交給下游
+    佇列滿時上游暫停，下游提前結束 (例如發生例外) 時通知上游停止
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            put(_END)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _END:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        engine: SearchEngine,
+        name: str,
+        checkpoint_dir: str = CHECKPOINT_DIR,
+        batch_size: int = 256,
+        queue_size: int = 4,
+        chunk_size: int = 512,
+        chunk_overlap: int = 50,
+        use_chunk: bool = True,
+        max_bulk_bytes: int = 10 * 1024 * 1024,
+        incremental: bool = True,
+        load_workers: int = 1,
+        chunk_writer: ChunkFileWriter = None,
+    ):
+        """
+        串流式、可續傳的語料寫入流程: 分塊 -> 批量嵌入 -> _bulk 寫入，三個階段以有界佇列串接並同時進行
+
+        每個來源 (例如一個子資料夾) 的分塊全部寫入成功後記錄於 {checkpoint_dir}/{name}.json，
+        重新執行時略過已完成且指紋未變動的來源；有失敗的來源不記為完成，下次重新處理 (文檔 _id 固定，重寫不會產生重複)。
+        失敗項目彙整寫入 {checkpoint_dir}/{name}.failed.json。
+
+        Args:
+            engine: 提供嵌入與 Elasticsearch 客戶端的 SearchEngine
+            name: 流程名稱，決定檢查點檔名
+            batch_size: 每次批量嵌入與 _bulk 寫入的分塊數
+            queue_size: 各階段之間最多暫存的項目數
+            incremental: 只嵌入並寫入 content_hash 變動的分塊，來源完成後刪除分塊數減少而多出的舊分塊
+            load_workers: 同時載入的來源數；大於 1 時提前載入後續來源，輸出順序仍與輸入一致
+            chunk_writer: 提供時分塊寫入中介檔而不寫入 Elasticsearch；writer 未要求嵌入向量時也不呼叫嵌入 API
+        """
+        self.engine = engine
+        self.name = name
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.use_chunk = use_chunk
+        self.max_bulk_bytes = max_bulk_bytes
+        self.chunk_writer = chunk_writer
+        # 增量比對的對象是索引內容，寫入中介檔時不適用
+        self.incremental = incremental and chunk_writer is None
+        self.load_workers = max(1, load_workers)
+        self.splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+        if chunk_writer is not None:
+            if chunk_writer.with_embeddings:
+                # 記錄向量的嵌入設定，寫入索引時據此判斷能否直接使用；與檔案中既有的設定不同時拒絕接續寫入
+                chunk_writer.use_embedding_signature(engine.embedding_client.signature)
+            # 匯出與寫入索引的進度分開記錄，不同的輸出檔各自續傳
+            name = f'{name}.{os.path.basename(chunk_writer.path)}'
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.checkpoint_path = os.path.join(checkpoint_dir, f'{name}.json')
+        self.failed_path = os.path.join(checkpoint_dir, f'{name}.failed.json')
+        self.completed = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('completed', {})
+
+    @staticmethod
+    def _write_json(path: str, data: Any) -> None:
+        # 先寫入暫存檔再取代，中途中斷也不會留下損壞的檔案
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _save_checkpoint(self) -> None:
+        self._write_json(self.checkpoint_path, {'completed': self.completed})
+
+    @staticmethod
+    def _chunk_key(chunk: Dict) -> Tuple[str, str, int]:
+        return chunk['category'], chunk['doc_id'], chunk['sn']
+
+    @staticmethod
+    def _try_load(load: Callable[[], List[Dict]]) -> Tuple[List[Dict], Exception]:
+        try:
+            return load(), None
+        except Exception as e:
+            return None, e
+
+    def _load_stage(self, sources: Iterable[Source]) -> Iterator:
+        """依序輸出 (來源, 指紋, 文檔, 載入錯誤)；已完成的來源文檔為 None，不呼叫載入函式"""
+        def pending_sources():
+            for source, load, *fingerprint in sources:
+                fingerprint = fingerprint[0] if fingerprint else None
+                done = self.completed.get(source)
+                skipped = done is not None and (fingerprint is None or done.get('fingerprint') == fingerprint)
+                yield source, fingerprint, None if skipped else load
+
+        if self.load_workers == 1:
+            for source, fingerprint, load in pending_sources():
+                yield (source, fingerprint, *self._try_load(load)) if load else (source, fingerprint, None, None)
+            return
+
+        def result(entry):
+            source, fingerprint, future = entry
+            return (source, fingerprint, *future.result()) if future else (source, fingerprint, None, None)
+
+        # 最多同時載入 load_workers 個來源，依輸入順序取出結果
+        with ThreadPoolExecutor(max_workers=self.load_workers) as executor:
+            window = deque()
+            for source, fingerprint, load in pending_sources():
+                window.append((source, fingerprint, executor.submit(self._try_load, load) if load else None))
+                while len(window) > self.load_workers or (window and window[0][2] is None):
+                    yield result(window.popleft())
+            while window:
+                yield result(window.popleft())
+
+    def _chunk_stage(self, sources: Iterable[Source]) -> Iterator:
+        """載入並分塊每個尚未完成的來源，輸出 (來源, 分塊)，每個來源結尾附上 _SourceEnd"""
+        for source, fingerprint, documents, error in self._load_stage(sources):
+            if documents is None and error is None:
+                yield _SourceEnd(source, skipped=True)
+                continue
+            if error is not None:
+                print(f"❌ {source} 載入失敗: {error}")
+                yield _SourceEnd(source, error=str(error))
+                continue
+            chunks = 0
+            chunk_counts = {}
+            # 同一來源中 id 相同的元素文檔跨文檔連續編號 sn
+            next_sn = {}
+            for doc in documents:
+                doc_chunks = self.engine._split_document(doc, self.splitter, self.use_chunk, next_sn)
+                self.engine._count_chunks(chunk_counts, doc_chunks)
+                for chunk in doc_chunks:
+                    chunks += 1
+                    yield source, chunk
+            yield _SourceEnd(source, chunks, chunk_counts, fingerprint)
+
+    def _embed_stage(self, items: Iterator) -> Iterator:
+        """累積 batch_size 個分塊後批量嵌入，輸出 (已嵌入分塊, 分塊所屬來源, 嵌入失敗項目, 未變動分塊數, 已送完分塊的來源)"""
+        buffer = []
+        markers = []
+
+        def flush():
+            chunks = [chunk for _, chunk in buffer]
+            sources = {self._chunk_key(chunk): source for source, chunk in buffer}
+            unchanged = 0
+            if self.incremental and chunks:
+                changed = self.engine._changed_chunks(chunks)
+                unchanged = len(chunks) - len(changed)
+                chunks = changed
+            if self.chunk_writer is not None and not self.chunk_writer.with_embeddings:
+                ready, failed = chunks, []
+            else:
+                ready, failed = self.engine._embed_chunks(chunks) if chunks else ([], [])
+            batch = (ready, sources, failed, unchanged, list(markers))
+            buffer.clear()
+            markers.clear()
+            return batch
+
+        for item in items:
+            # 來源結束標記隨包含該來源最後一個分塊的批次 (或之後的批次) 送出
+            if isinstance(item, _SourceEnd):
+                markers.append(item)
+                continue
+            buffer.append(item)
+            if len(buffer) >= self.batch_size:
+                yield flush()
+        if buffer or markers:
+            yield flush()
+
+    def run(self, sources: Iterable[Source]) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict: {'indexed', 'unchanged', 'deleted', 'completed_sources', 'skipped_sources',
+                   'failed': [{'source', 'doc_id', 'sn', 'category', 'status', 'error'}]}
+        """
+        start = time.time()
+        indexed = unchanged = deleted = completed = skipped = 0
+        failed = []
+        failed_counts = {}  # 來源 -> 失敗的分塊數
+
+        batches = prefetch(self._embed_stage(prefetch(self._chunk_stage(sources), self.queue_size * self.batch_size)), self.queue_size)
+        for ready, sources_by_key, embed_failed, batch_unchanged, markers in batches:
+            unchanged += batch_unchanged
+            batch_failed = list(embed_failed)
+            if ready and self.chunk_writer is not None:
+                for chunk in ready:
+                    self.chunk_writer.write(chunk)
+                self.chunk_writer.flush()
+                indexed += len(ready)
+            elif ready:
+                result = self.engine._write_chunks(ready, batch_size=self.batch_size, max_bulk_bytes=self.max_bulk_bytes)
+                batch_failed.extend(result['failed'])
+                indexed += result['indexed']
+            for item in batch_failed:
+                source = sources_by_key[(item['category'], item['doc_id'], item['sn'])]
+                failed_counts[source] = failed_counts.get(source, 0) + 1
+                failed.append({'source': source, **item})
+
+            for marker in markers:
+                if marker.skipped:
+                    skipped += 1
+                    continue
+                if marker.error is not None:
+                    failed.append({'source': marker.source, 'doc_id': None, 'sn': None, 'category': None, 'status': None, 'error': marker.error})
+                    continue
+                if marker.source in failed_counts:
+                    print(f"❌ {marker.source}: {failed_counts.pop(marker.source)}/{marker.chunks} 個分塊失敗，下次執行時重新處理")
+                    continue
+                if self.incremental:
+                    deleted += self.engine._delete_stale_chunks(marker.chunk_counts)
+                self.completed[marker.source] = {
+                    'chunks': marker.chunks,
+                    'fingerprint': marker.fingerprint,
+                    'completed_at': time.time(),
+                }
+                self._save_checkpoint()
+                completed += 1
+                print(f"✓ {marker.source} 完成 ({marker.chunks} 個分塊)")
+
+        self._write_json(self.failed_path, failed)
+        print(f"\n✓ {self.name} 寫入完成: 新完成 {completed} 個來源 (略過 {skipped} 個已完成的來源)，寫入 {indexed} 個分塊，耗時 {time.time() - start:.1f} 秒")
+        if self.incremental:
+            print(f"✓ 增量索引: 略過 {unchanged} 個未變動的分塊，刪除 {deleted} 個舊分塊")
+        if failed:
+            print(f"❌ {len(failed)} 個項目失敗，清單已寫入 {self.failed_path}，重新執行即可重試")
+
+        return {
+            'indexed': indexed,
+            'unchanged': unchanged,
+            'deleted': deleted,
+            'completed_sources': completed,
+            'skipped_sources': skipped,
+            'failed': failed,
+        }
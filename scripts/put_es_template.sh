@@ -1,18 +1,33 @@
 #!/bin/sh
+# 向量維度須與 EmbeddingClient 輸出的維度相同 (EMBEDDING_DIMENSIONS 或 PCA 投影後的維度)
+# index_patterns 涵蓋 main.py --mode rebuild 建立的版本化索引 (<ES_INDEX_NAME>_v<N>)
+# ES_VECTOR_INDEX_TYPE: hnsw (float32)、int8_hnsw (預設)、int4_hnsw、bbq_hnsw (需 ES 8.16 以上)
 curl -XPUT 'http://localhost:9200/_template/documents' -H "Content-Type: application/json" -d '{
-  "index_patterns": ["documents*"],
+  "index_patterns": ["documents*", "'"${ES_INDEX_NAME:-documents}"'_v*"],
   "order": 1,
   "mappings": {
     "properties": {
       "doc_id": {"type": "keyword"},
       "sn": {"type": "integer"},
       "category": {"type": "keyword"},
+      "content_hash": {"type": "keyword", "index": false},
+      "companies": {
+        "type": "keyword",
+        "fields": {"text": {"type": "text", "analyzer": "cjk_bigram_analyzer", "search_analyzer": "cjk_bigram_search_analyzer"}}
+      },
+      "years": {"type": "keyword"},
+      "quarters": {"type": "keyword"},
       "content": {
         "type": "text",
 	"search_analyzer": "cjk_bigram_search_analyzer",
 	"analyzer": "cjk_bigram_analyzer"
       },
-      "embedding": {"type": "dense_vector", "dims": 1536}
+      "embedding": {
+        "type": "dense_vector",
+        "dims": '"${ES_EMBEDDING_DIMS:-1536}"',
+        "similarity": "cosine",
+        "index_options": {"type": "'"${ES_VECTOR_INDEX_TYPE:-int8_hnsw}"'"}
+      }
     } 
   },
   "settings": {
@@ -0,0 +1,121 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Tuple
+import json
+import traceback
+
+from modules.metrics import PrometheusExporter
+
+RETRIEVE_PARAMS = ('category', 'doc_ids', 'top_k', 'knn_weight', 'rerank_k', 'use_rerank')
+
+
+def _is_int(value: Any) -> bool:
+    # JSON 的 true/false 在 Python 中也是 int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_retrieve_params(body: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """從請求內容取出並檢查 SearchEngine.retrieve 的參數，型別或範圍錯誤時拋出 ValueError (回傳 400)"""
+    if not isinstance(body, dict):
+        raise ValueError("請求內容須為 JSON 物件")
+    query = body.get('query')
+    if not query or not isinstance(query, str):
+        raise ValueError("缺少 query 參數")
+    params = {key: body[key] for key in RETRIEVE_PARAMS if body.get(key) is not None}
+
+    if 'category' in params and not isinstance(params['category'], str):
+        raise ValueError("category 須為字串")
+    if 'doc_ids' in params:
+        doc_ids = params['doc_ids']
+        if not isinstance(doc_ids, list) or not all(isinstance(doc_id, str) or _is_int(doc_id) for doc_id in doc_ids):
+            raise ValueError("doc_ids 須為字串或整數的列表")
+        params['doc_ids'] = [str(doc_id) for doc_id in doc_ids]
+    for key in ('top_k', 'rerank_k'):
+        if key in params and not (_is_int(params[key]) and params[key] > 0):
+            raise ValueError(f"{key} 須為正整數")
+    if 'knn_weight' in params:
+        knn_weight = params['knn_weight']
+        if not (isinstance(knn_weight, (int, float)) and not isinstance(knn_weight, bool) and 0 <= knn_weight <= 1):
+            raise ValueError("knn_weight 須為 0 到 1 之間的數字")
+    if 'use_rerank' in params and not isinstance(params['use_rerank'], bool):
+        raise ValueError("use_rerank 須為布林值")
+    return query, params
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP 介面:
+        GET  /health    健康檢查
+        GET  /metrics   Prometheus 文字格式的各階段耗時與計數器
+        POST /retrieve  僅檢索，參數同 SearchEngine.retrieve
+        POST /search    檢索並生成 LLM 回應
+    """
+    engine = None  # 由 serve() 設定，所有請求共用同一組已初始化的客戶端
+    protocol_version = 'HTTP/1.1'  # 支援 keep-alive
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        self._send(status, json.dumps(payload, ensure_ascii=False), 'application/json; charset=utf-8')
+
+    def _send(self, status: int, text: str, content_type: str) -> None:
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            exporter = self.engine.metrics.find_exporter(PrometheusExporter)
+            if exporter is None:
+                self._send_json(404, {'error': 'metrics exporter not configured'})
+                return
+            self._send(200, exporter.render(), 'text/plain; version=0.0.4; charset=utf-8')
+            return
+        if self.path != '/health':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            search_ok = bool(self.engine.es_client.ping())
+        except Exception:
+            search_ok = False
+        self._send_json(200 if search_ok else 503, {'status': 'ok' if search_ok else 'degraded', 'search': search_ok})
+
+    def do_POST(self):
+        if self.path not in ('/retrieve', '/search'):
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            query, params = parse_retrieve_params(self._read_json())
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            results = self.engine.retrieve(query, **params)
+            payload = {'query': query, 'results': results}
+            if self.path == '/search' and results:
+                context = " ".join([doc.get('content') for doc in results])
+                doc_ids = [doc.get('id') for doc in results]
+                payload['response'] = self.engine.generate_response(query, context, doc_ids)
+            self._send_json(200, payload)
+        except Exception as e:
+            traceback.print_exc()
+            self._send_json(500, {'error': str(e)})
+
+
+def serve(engine, host: str = '0.0.0.0', port: int = 8000) -> None:
+    """以多執行緒 HTTP 伺服器提供搜索服務，engine 只初始化一次並在請求間共用"""
+    SearchRequestHandler.engine = engine
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    server.daemon_threads = True
+    print(f"✓ 搜索服務已啟動: http://{host}:{port} (/retrieve, /search, /health, /metrics)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
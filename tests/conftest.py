@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模組以專案根目錄為基準匯入 (例如 import config、from modules.xxx import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,143 @@
+import itertools
+
+import pytest
+
+from modules import cache as cache_module
+from modules.cache import EmbeddingCache, MemoryLRUCache, RerankCache, ResultCache, SqliteLRUCache
+
+
+class _Clock:
+    """可手動前進的時鐘，取代 time.time / time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module.time, 'time', clock)
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = MemoryLRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # a 變為最近使用
+
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_lru_expires_after_ttl(clock):
+    cache = MemoryLRUCache(max_entries=10, ttl=60)
+    cache.set('a', 1)
+
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 2
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_sqlite_lru_evicts_by_last_access(tmp_path, monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(cache_module.time, 'time', lambda: float(next(ticks)))
+    cache = SqliteLRUCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    cache.get('a')
+
+    cache.set('c', b'3')
+
+    assert cache.get_many(['a', 'b', 'c']) == {'a': b'1', 'c': b'3'}
+    assert cache.evictions == 1
+
+
+def test_sqlite_lru_get_without_touch_keeps_eviction_order(tmp_path, monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(cache_module.time, 'time', lambda: float(next(ticks)))
+    cache = SqliteLRUCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    cache.get('a', touch=False)
+
+    cache.set('c', b'3')
+
+    assert cache.get('a') is None
+
+
+def test_sqlite_lru_get_many_beyond_parameter_limit(tmp_path):
+    cache = SqliteLRUCache(str(tmp_path / 'cache.db'), max_entries=5000)
+    cache.set_many((str(i), str(i).encode()) for i in range(2000))
+
+    found = cache.get_many([str(i) for i in range(2500)])
+
+    assert len(found) == 2000
+    assert cache.misses == 500
+
+
+def test_embedding_cache_normalizes_text(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'), max_entries=10)
+    cache.set_many('model', ['ＡＢＣ  問題'], [[0.5, 0.25]])
+
+    assert cache.get_many('model', ['ABC 問題', 'other']) == [[0.5, 0.25], None]
+    assert cache.get_many('other-model', ['ABC 問題']) == [None]
+
+
+def test_rerank_cache_key_depends_on_candidate_order(tmp_path):
+    cache = RerankCache(str(tmp_path / 'rerank.db'), max_entries=10)
+    cache.set('model', '問題', ['甲', '乙'], ([1], [9.0]))
+
+    assert cache.get('model', '問題', ['甲', '乙']) == ([1], [9.0])
+    assert cache.get('model', '問題', ['乙', '甲']) is None
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_result_cache_ttl_and_copies(tmp_path, clock, backend):
+    cache = ResultCache(backend, ttl=60, max_entries=10, path=str(tmp_path / 'results.db'))
+    key = cache.key('documents', '問題', {'top_k': 1})
+    cache.set(key, [{'doc_id': '1'}])
+
+    results = cache.get(key)
+    results[0]['doc_id'] = 'changed'
+    assert cache.get(key) == [{'doc_id': '1'}]
+
+    clock.now += 61
+    assert cache.get(key) is None
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_result_cache_invalidation_is_shared_between_instances(tmp_path, backend):
+    path = str(tmp_path / 'results.db')
+    server = ResultCache(backend, ttl=0, max_entries=10, path=path)
+    indexer = ResultCache(backend, ttl=0, max_entries=10, path=path)
+    key = server.key('documents', '問題', {'top_k': 1})
+    server.set(key, [{'doc_id': '1'}])
+
+    indexer.invalidate('documents')
+
+    assert server.key('documents', '問題', {'top_k': 1}) != key
+    assert server.key('other', '問題', {'top_k': 1}) == ResultCache(backend, path=path).key('other', '問題', {'top_k': 1})
+
+
+def test_result_cache_disabled(tmp_path):
+    cache = ResultCache('none', path=str(tmp_path / 'results.db'))
+    cache.set('key', [{'doc_id': '1'}])
+
+    assert not cache.enabled
+    assert cache.get('key') is None
+    assert not (tmp_path / 'results.db').exists()
+
+
+def test_result_cache_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        ResultCache('redis')
@@ -0,0 +1,163 @@
+import os
+
+import numpy as np
+import pytest
+
+from modules import chunk_store
+from modules.chunk_store import ChunkFileWriter, compact_chunk_file, count_records, latest_records, read_chunk_files, read_chunks
+
+
+def _chunk(doc_id, sn, content, embedding=None, category='faq'):
+    chunk = {'doc_id': doc_id, 'sn': sn, 'category': category, 'content': content, 'content_hash': f'hash-{content}'}
+    if embedding is not None:
+        chunk['embedding'] = embedding
+    return chunk
+
+
+def _contents(path, **kwargs):
+    return [(chunk['doc_id'], chunk['sn'], chunk['content'], chunk.get('embedding')) for chunk in read_chunks(path, **kwargs)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'chunks' / 'faq.jsonl')
+
+
+def test_latest_record_wins_and_deletions_hide_chunks(path):
+    with ChunkFileWriter(path, with_embeddings=True) as writer:
+        writer.write(_chunk('1', 0, 'old', [1.0, 0.0]))
+        writer.write(_chunk('2', 0, 'keep', [0.0, 1.0]))
+        writer.write(_chunk('1', 0, 'new', [0.5, 0.5]))
+        writer.write(_chunk('3', 0, 'gone'))
+        writer.delete('faq', '3', 0)
+
+    assert _contents(path) == [('2', 0, 'keep', [0.0, 1.0]), ('1', 0, 'new', [0.5, 0.5])]
+    assert _contents(path, include_embeddings=False) == [('2', 0, 'keep', None), ('1', 0, 'new', None)]
+    assert count_records(path) == 5
+
+
+def test_reopened_writer_appends_after_partial_line(path):
+    with ChunkFileWriter(path) as writer:
+        writer.write(_chunk('1', 0, 'first'))
+    # 模擬寫入到一半中斷
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"id": "2", "sn": 0, "categ')
+    assert _contents(path) == [('1', 0, 'first', None)]
+
+    with ChunkFileWriter(path) as writer:
+        writer.write(_chunk('3', 0, 'third'))
+
+    assert _contents(path) == [('1', 0, 'first', None), ('3', 0, 'third', None)]
+    assert open(path, encoding='utf-8').read().count('\n') == 2
+
+
+def test_partial_line_without_any_newline_is_truncated(path):
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"id": "1"')
+
+    ChunkFileWriter(path).close()
+
+    assert os.path.getsize(path) == 0
+
+
+def test_partial_embedding_row_is_truncated(path):
+    with ChunkFileWriter(path, with_embeddings=True) as writer:
+        writer.write(_chunk('1', 0, 'a', [1.0, 2.0, 3.0]))
+    with open(f'{path}.f32', 'ab') as f:
+        f.write(b'\x00' * 5)
+
+    with ChunkFileWriter(path, with_embeddings=True) as writer:
+        writer.write(_chunk('2', 0, 'b', [4.0, 5.0, 6.0]))
+
+    assert os.path.getsize(f'{path}.f32') == 2 * 3 * 4
+    assert [chunk['embedding'] for chunk in read_chunks(path)] == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+
+
+def test_dimension_mismatch_is_rejected(path):
+    with ChunkFileWriter(path, with_embeddings=True) as writer:
+        writer.write(_chunk('1', 0, 'a', [1.0, 2.0]))
+        with pytest.raises(ValueError):
+            writer.write(_chunk('2', 0, 'b', [1.0, 2.0, 3.0]))
+
+
+def test_embedding_signature_mismatch(path):
+    with ChunkFileWriter(path, with_embeddings=True, embedding_signature='model@2') as writer:
+        writer.write(_chunk('1', 0, 'a', [1.0, 2.0]))
+
+    assert _contents(path, embedding_signature='model@2') == [('1', 0, 'a', [1.0, 2.0])]
+    # 其他設定產生的向量不輸出，由寫入流程重新嵌入
+    assert _contents(path, embedding_signature='model@3') == [('1', 0, 'a', None)]
+    with pytest.raises(ValueError):
+        ChunkFileWriter(path, with_embeddings=True, embedding_signature='model@3')
+
+
+def test_read_chunk_files_expands_directories(tmp_path):
+    directory = tmp_path / 'chunks'
+    for name in ('b', 'a'):
+        with ChunkFileWriter(str(directory / f'{name}.jsonl')) as writer:
+            writer.write(_chunk(name, 0, name))
+
+    assert [chunk['doc_id'] for chunk in read_chunk_files([str(directory)])] == ['a', 'b']
+
+
+def _write_history(path):
+    with ChunkFileWriter(path, with_embeddings=True) as writer:
+        for version in range(3):
+            for doc_id in range(4):
+                writer.write(_chunk(str(doc_id), 0, f'v{version}', [float(doc_id), float(version)]))
+        writer.delete('faq', '3', 0)
+
+
+def test_compaction_keeps_latest_records_and_vectors(path):
+    _write_history(path)
+    before = _contents(path)
+
+    assert compact_chunk_file(path) == (13, 3)
+
+    assert _contents(path) == before
+    assert os.path.getsize(f'{path}.f32') == 3 * 2 * 4
+    assert [record['embedding_row'] for record in latest_records(path)] == [0, 1, 2]
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith(('.tmp', '.compact'))]
+
+
+@pytest.mark.parametrize('completed_replaces', [0, 1])
+def test_interrupted_compaction_rolls_forward(path, monkeypatch, completed_replaces):
+    _write_history(path)
+    before = _contents(path)
+    replace = os.replace
+    calls = []
+
+    def crash(src, dst):
+        if len(calls) == completed_replaces:
+            raise OSError('simulated crash')
+        calls.append(dst)
+        replace(src, dst)
+
+    monkeypatch.setattr(chunk_store.os, 'replace', crash)
+    with pytest.raises(OSError):
+        compact_chunk_file(path)
+    monkeypatch.setattr(chunk_store.os, 'replace', replace)
+    assert os.path.exists(f'{path}.compact')
+
+    # 下一次讀取或開啟寫入時完成替換
+    assert _contents(path) == before
+    assert not os.path.exists(f'{path}.compact')
+    with ChunkFileWriter(path, with_embeddings=True) as writer:
+        writer.write(_chunk('9', 0, 'after', [9.0, 9.0]))
+    assert _contents(path) == before + [('9', 0, 'after', [9.0, 9.0])]
+
+
+def test_compaction_interrupted_before_marker_keeps_original(path):
+    _write_history(path)
+    before = _contents(path)
+    # 標記檔建立前中斷：暫存檔不完整，原本的檔案保持不變
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        f.write('{"id": "bogus"')
+    with open(f'{path}.f32.tmp', 'wb') as f:
+        f.write(b'\x01\x02')
+
+    assert _contents(path) == before
+    assert compact_chunk_file(path) == (13, 3)
+    assert _contents(path) == before
+    np.testing.assert_array_equal(np.fromfile(f'{path}.f32', dtype=np.float32), [0, 2, 1, 2, 2, 2])
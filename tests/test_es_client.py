@@ -0,0 +1,56 @@
+import pytest
+
+import config
+from modules import es_client as es_module
+from modules.es_client import ElasticsearchClient
+
+
+class _FakeES:
+    """只記錄請求的 Elasticsearch：info 拋出例外，msearch 回傳固定的 BM25 / kNN 結果"""
+
+    def __init__(self):
+        self.searches = []
+
+    def info(self):
+        raise PermissionError('security_exception: action [cluster:monitor/main] is unauthorized')
+
+    def search(self, **kwargs):
+        self.searches.append(kwargs)
+        raise AssertionError('retriever 查詢不應送出')
+
+    def msearch(self, searches):
+        hit = {'_id': 'a', '_score': 1.0, '_source': {'doc_id': '1', 'category': 'faq', 'content': 'x'}}
+        return {'responses': [{'took': 1, 'hits': {'hits': [hit]}}, {'took': 1, 'hits': {'hits': [hit]}}]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(config, 'ES_HOST', 'http://localhost:9200')
+    monkeypatch.setattr(es_module, 'FUSION_METHOD', 'rrf')
+    client = ElasticsearchClient(search_mode='retriever')
+    client.es = _FakeES()
+    return client
+
+
+def test_rrf_retriever_window_matches_python_fusion(client):
+    bm25 = {'query': {'match_all': {}}, '_source': {'excludes': ['embedding']}}
+    knn = {'knn': {'field': 'embedding', 'query_vector': [0.1], 'k': 5, 'num_candidates': 10}}
+
+    query = client.gen_rrf_retriever_query(bm25, knn, size=5, knn_weight=0.5)
+
+    assert query['size'] == 5
+    assert query['retriever']['rrf']['rank_window_size'] == 5
+
+
+def test_version_lookup_failure_falls_back_to_msearch(client):
+    results = client.hybrid_search('問題', [0.1, 0.2], size=5, category='faq', knn_weight=0.5)
+
+    assert [result['_id'] for result in results] == ['a']
+    assert client._rrf_retriever_available is False
+    assert client.es.searches == []
+
+
+def test_ping(client):
+    client.es.ping = lambda: True
+
+    assert client.ping() is True
@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+from modules.finance_fields import extract_finance_fields, extract_query_companies, normalize_numeral_years
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset', 'preliminary', 'questions_example.json')
+
+# questions_example.json 中每個財報問題的公司 (查詢中的寫法)
+EXPECTED_COMPANIES = {
+    51: '聯電',
+    52: '光寶科技',
+    53: '長榮',
+    54: '亞德客',
+    55: '聯電',
+    56: '國巨',
+    57: '智邦',
+    58: '聯電',
+    59: '台化',
+    60: '研華',
+    61: '鴻海',
+    62: '聯發科',
+    63: '聯發科',
+    64: '聯發科',
+    65: '鴻海',
+    66: '瑞昱',
+    67: '瑞昱',
+    68: '光寶科',
+    69: '瑞昱',
+    70: '智邦科技',
+    71: '中鋼',
+    72: '光寶科',
+    73: '華碩',
+    74: '和泰車',
+    75: '長榮',
+    76: '研華',
+    77: '台泥',
+    78: '智邦科技',
+    79: '和泰車',
+    80: '瑞昱半導體',
+    81: '台達電',
+    82: '研華',
+    83: '台達電',
+    84: '和泰車',
+    85: '國巨',
+    86: '瑞昱',
+    87: '台泥',
+    88: '聯電',
+    89: '中華電信',
+    90: '和泰車',
+    91: '聯發科',
+    92: '國巨',
+    93: '中鋼',
+    94: '智邦',
+    95: '光寶科',
+    96: '台達電',
+    97: '國巨',
+    98: '台達電',
+    99: '中鋼',
+    100: '鴻海',
+}
+
+
+def _finance_questions():
+    with open(QUESTIONS_PATH, 'r', encoding='utf-8') as f:
+        return [question for question in json.load(f)['questions'] if question['category'] == 'finance']
+
+
+def test_example_queries_extract_exactly_the_company():
+    extracted = {question['qid']: extract_query_companies(question['query']) for question in _finance_questions()}
+
+    assert extracted == {qid: [company] for qid, company in EXPECTED_COMPANIES.items()}
+
+
+def test_example_queries_extract_the_report_quarter():
+    for question in _finance_questions():
+        fields = extract_finance_fields(question['query'], query=True)
+        # 「2023年台泥第1季」的年份與季度之間夾著公司名稱，只擷取年份
+        if question['qid'] != 87:
+            assert len(fields['quarters']) == 1, question['query']
+        assert fields['years'], question['query']
+
+
+@pytest.mark.parametrize('query, companies', [
+    ('截至2023年第3季，智邦公司因進出口貨物需要由銀行出具保證函予海關之金額為多少？', ['智邦']),
+    ('長榮於2022年第3季的合併權益變動表中，歸屬於母公司業主之本期綜合損益總額為多少？', ['長榮']),
+    ('在聯發科2022年第1季的合併財務報表中，有哪幾項專利侵權訴訟被提及？', ['聯發科']),
+    ('2022年第3季，聯電公司及子公司因進口機器設備開立但未使用的信用狀約為多少億元？', ['聯電']),
+    ('亞德客-KY公司在2022年第3季的投資活動的淨現金流出是多少？', ['亞德客']),
+    ('請問光寶科在2023年第3季的合併資產負債表中，總資產的金額是多少？', ['光寶科']),
+    ('2023年第1季的合併資產負債表中，總資產的金額是多少？', []),
+])
+def test_query_companies(query, companies):
+    assert extract_query_companies(query) == companies
+
+
+def test_numeral_years():
+    assert normalize_numeral_years('民國一一二年與一百一十二年、二〇二三年') == '民國112年與112年、2023年'
+    assert extract_finance_fields('民國一一一年第三季', query=True)['quarters'] == ['2022Q3']
+
+
+def test_report_title_company():
+    text = '# 聯華電子股份有限公司及子公司\n# 合併資產負債表\n民國112年及111年9月30日'
+
+    assert extract_finance_fields(text) == {'companies': ['聯華電子'], 'years': ['2022', '2023'], 'quarters': []}
@@ -0,0 +1,123 @@
+import random
+
+import numpy as np
+import pytest
+
+from modules.fusion import FusionEngine
+from modules.rrf import WeightedRRFImplementation
+
+
+def _reference(method, ranked_lists, k=60.0):
+    """逐筆累加後穩定排序的參考實作 (原本 WeightedRRFImplementation 的 dict 迴圈)"""
+    scores, hits, items = {}, {}, {}
+    active = [(ranked_list, weight) for ranked_list, weight in ranked_lists if weight != 0 and ranked_list]
+    total_weight = sum(weight for _, weight in active)
+    for ranked_list, weight in active:
+        raw = [item['_score'] for item in ranked_list]
+        low, span = min(raw), max(raw) - min(raw)
+        for rank, item in enumerate(ranked_list, 1):
+            if method == 'rrf':
+                contribution = weight / (k + rank)
+            else:
+                normalized = (item['_score'] - low) / span if span > 0 else 1.0
+                contribution = (weight / total_weight if method == 'convex' else weight) * normalized
+            scores[item['_id']] = scores.get(item['_id'], 0.0) + contribution
+            hits[item['_id']] = hits.get(item['_id'], 0) + 1
+            items[item['_id']] = item
+    if method == 'combmnz':
+        scores = {item_id: score * hits[item_id] for item_id, score in scores.items()}
+    return sorted(scores.items(), key=lambda pair: -pair[1])
+
+
+def _ranked_list(rng, size, pool):
+    ids = rng.sample(pool, size)
+    scores = sorted((round(rng.uniform(0, 10), 1) for _ in ids), reverse=True)
+    return [{'_id': item_id, '_score': score, '_source': {'doc_id': item_id}} for item_id, score in zip(ids, scores)]
+
+
+@pytest.mark.parametrize('method', FusionEngine.METHODS)
+def test_matches_reference_implementation(method):
+    rng = random.Random(0)
+    pool = [str(i) for i in range(30)]
+    engine = FusionEngine(method)
+    for _ in range(50):
+        ranked_lists = [(_ranked_list(rng, rng.randint(0, 15), pool), rng.choice([0, 0.3, 0.5, 0.7, 1])) for _ in range(3)]
+
+        fused = engine.fuse(ranked_lists)
+
+        expected = _reference(method, ranked_lists)
+        assert [item['_id'] for item in fused] == [item_id for item_id, _ in expected]
+        np.testing.assert_allclose([item['fused_score'] for item in fused], [score for _, score in expected])
+
+
+def test_ties_keep_first_appearance_order():
+    engine = FusionEngine('rrf')
+    # 兩個列表互為倒序且權重相同：a 與 d 同分 (1/61 + 1/64)，b 與 c 同分 (1/62 + 1/63)
+    first = [{'_id': item_id, '_score': 1.0} for item_id in 'abcd']
+    second = list(reversed(first))
+
+    assert [item['_id'] for item in engine.fuse([(first, 0.5), (second, 0.5)])] == ['a', 'd', 'b', 'c']
+    assert [item['_id'] for item in engine.fuse([(second, 0.5), (first, 0.5)], top_k=3)] == ['d', 'a', 'c']
+
+
+def test_top_k_matches_full_sort_prefix():
+    rng = random.Random(1)
+    pool = [str(i) for i in range(200)]
+    engine = FusionEngine('rrf')
+    ranked_lists = [(_ranked_list(rng, 100, pool), 0.3), (_ranked_list(rng, 100, pool), 0.7)]
+
+    full = engine.fuse(ranked_lists)
+    for top_k in (0, 1, 5, 50, 500):
+        assert engine.fuse(ranked_lists, top_k=top_k) == full[:top_k]
+
+
+def test_duplicate_takes_item_from_last_list():
+    engine = FusionEngine('rrf')
+    bm25 = [{'_id': 'a', '_score': 3.0, '_source': {'from': 'bm25'}}]
+    knn = [{'_id': 'a', '_score': 0.9, '_source': {'from': 'knn'}}]
+
+    fused = engine.fuse([(bm25, 0.3), (knn, 0.7)])
+
+    assert fused[0]['_source'] == {'from': 'knn'}
+    assert fused[0]['fused_score'] == pytest.approx(1 / 61)
+
+
+def test_zero_weight_list_adds_no_documents():
+    engine = FusionEngine('combsum')
+    only_in_zero = [{'_id': 'z', '_score': 5.0}]
+    weighted = [{'_id': 'a', '_score': 2.0}, {'_id': 'b', '_score': 1.0}]
+
+    fused = engine.fuse([(only_in_zero, 0), (weighted, 1)])
+
+    assert [item['_id'] for item in fused] == ['a', 'b']
+
+
+def test_convex_scores_stay_within_unit_interval():
+    rng = random.Random(2)
+    pool = [str(i) for i in range(20)]
+    fused = FusionEngine('convex').fuse([(_ranked_list(rng, 10, pool), 0.3), (_ranked_list(rng, 10, pool), 0.7)])
+
+    assert all(0 <= item['fused_score'] <= 1 for item in fused)
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        FusionEngine('borda')
+
+
+def test_weighted_rrf_elasticsearch_output_format():
+    rrf = WeightedRRFImplementation(k=60.0)
+    bm25 = {'hits': {'hits': [
+        {'_id': '1', '_score': 1.5, '_source': {'title': 'doc1'}},
+        {'_id': '2', '_score': 1.3, '_source': {'title': 'doc2'}},
+    ]}}
+    knn = {'hits': {'hits': [
+        {'_id': '2', '_score': 0.9, '_source': {'title': 'doc2'}},
+        {'_id': '3', '_score': 0.8, '_source': {'title': 'doc3'}},
+    ]}}
+
+    merged = rrf.merge_weighted_elasticsearch_results([(bm25, 0.3), (knn, 0.7)], top_k=2)
+
+    assert [item['_id'] for item in merged] == ['2', '3']
+    assert set(merged[0]) == {'_id', '_score', '_source', 'weighted_rrf_score'}
+    assert merged[0]['weighted_rrf_score'] == pytest.approx(0.3 / 62 + 0.7 / 61)
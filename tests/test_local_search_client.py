@@ -0,0 +1,117 @@
+import pytest
+
+from modules import local_search_client as local_module
+from modules.chunk_store import count_records
+from modules.local_search_client import LocalSearchClient
+from modules.stub_clients import StubEmbeddingClient
+
+EMBEDDER = StubEmbeddingClient(dims=32)
+INDEX = 'documents'
+
+DOCUMENTS = [
+    ('faq', '1', '信用卡年費如何減免'),
+    ('faq', '2', '帳戶密碼忘記如何重設'),
+    ('insurance', '3', '保單借款的利率如何計算'),
+    ('insurance', '4', '旅遊平安險的理賠申請文件'),
+    ('finance', '5', '聯電2023年第1季營業收入'),
+]
+
+
+def _document(category, doc_id, content, sn=0):
+    return {
+        'doc_id': doc_id, 'sn': sn, 'category': category, 'content': content,
+        'content_hash': f'hash-{content}', 'embedding': EMBEDDER.get_embedding(content),
+    }
+
+
+def _search(client, query, **kwargs):
+    results = client.hybrid_search(query, EMBEDDER.get_embedding(query), size=3, index_name=INDEX, **kwargs)
+    return [(result['_source']['doc_id'], round(result['weighted_rrf_score'], 9)) for result in results]
+
+
+QUERIES = ['信用卡年費', '保單借款利率', '理賠文件', '密碼重設']
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = LocalSearchClient(path=str(tmp_path))
+    client.bulk_index_documents(INDEX, [_document(*document) for document in DOCUMENTS])
+    return client
+
+
+def test_search_filters_by_category_and_doc_ids(client):
+    assert _search(client, '信用卡年費', category='faq')[0][0] == '1'
+    assert {doc_id for doc_id, _ in _search(client, '如何', category='insurance')} <= {'3', '4'}
+    assert [doc_id for doc_id, _ in _search(client, '如何', doc_ids=['2'])] == ['2']
+
+
+def test_bm25_returns_only_matching_documents(client):
+    hits = client.bm25_search('理賠', size=10, index_name=INDEX)['hits']['hits']
+
+    assert [hit['_source']['doc_id'] for hit in hits] == ['4']
+    assert 'embedding' not in hits[0]['_source']
+
+
+def test_knn_is_exact_cosine(client):
+    query = DOCUMENTS[2][2]
+    hits = client.knn_search(EMBEDDER.get_embedding(query), size=1, index_name=INDEX)['hits']['hits']
+
+    assert hits[0]['_source']['doc_id'] == '3'
+    assert hits[0]['_score'] == pytest.approx(1.0)
+
+
+def test_incremental_updates_match_fresh_load(client, tmp_path):
+    # 先載入索引，之後的寫入以 apply() 增量更新
+    _search(client, QUERIES[0])
+    client.bulk_index_documents(INDEX, [_document('faq', '1', '信用卡年費減免條件與申請方式')])
+    client.bulk_index_documents(INDEX, [_document('faq', '6', '信用卡掛失')])
+    assert client.delete_stale_chunks(INDEX, {('insurance', '4'): 0}) == 1
+
+    fresh = LocalSearchClient(path=str(tmp_path))
+    for query in QUERIES:
+        assert _search(client, query) == _search(fresh, query)
+    assert '4' not in {doc_id for query in QUERIES for doc_id, _ in _search(client, query)}
+    assert client.get_content_hashes(INDEX, [client.gen_document_id('faq', '1', 0)]) == {
+        client.gen_document_id('faq', '1', 0): 'hash-信用卡年費減免條件與申請方式'
+    }
+
+
+def test_compaction_preserves_results(client):
+    for _ in range(3):
+        client.bulk_index_documents(INDEX, [_document(*document) for document in DOCUMENTS])
+    before = {query: _search(client, query) for query in QUERIES}
+
+    client.compact(INDEX)
+
+    assert count_records(client.index_path(INDEX)) == len(DOCUMENTS)
+    assert {query: _search(client, query) for query in QUERIES} == before
+
+
+def test_writes_compact_automatically(client, monkeypatch):
+    monkeypatch.setattr(local_module, 'COMPACT_MIN_GARBAGE', 3)
+    # 失效行數由已載入的記憶體索引追蹤
+    _search(client, '信用卡年費')
+
+    for _ in range(3):
+        client.bulk_index_documents(INDEX, [_document(*document) for document in DOCUMENTS])
+
+    assert count_records(client.index_path(INDEX)) < 4 * len(DOCUMENTS)
+    assert _search(client, '信用卡年費')[0][0] == '1'
+
+
+def test_finance_field_filter_keeps_documents_without_fields(client):
+    client.bulk_index_documents(INDEX, [
+        {**_document('finance', '7', '長榮2022年第3季現金流量'), 'years': ['2022'], 'quarters': ['2022Q3']},
+    ])
+
+    results = _search(client, '現金流量', category='finance', field_filters={'years': ['2023']})
+
+    # 沒有 years 欄位的文檔 (5) 仍可命中，年份不符的文檔 (7) 被過濾
+    assert [doc_id for doc_id, _ in results] == ['5']
+
+
+def test_ping_checks_index_directory(tmp_path):
+    assert LocalSearchClient(path=str(tmp_path / 'not' / 'created')).ping()
+
+    (tmp_path / 'file').write_text('')
+    assert not LocalSearchClient(path=str(tmp_path / 'file')).ping()
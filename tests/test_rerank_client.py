@@ -0,0 +1,56 @@
+import numpy as np
+
+from modules.rerank_client import LocalRerankClient, RerankResults
+from modules.stub_clients import StubEmbeddingClient
+
+
+CANDIDATES = [
+    {'doc_id': '1', 'content': '旅遊平安險的理賠申請文件'},
+    {'doc_id': '2', 'content': '信用卡年費如何減免'},
+    {'doc_id': '3', 'content': '信用卡掛失與補發'},
+]
+
+
+def test_bm25_ranks_matching_candidates_first():
+    results = LocalRerankClient(bm25_weight=1.0).rerank('信用卡年費', CANDIDATES, top_k=2)
+
+    assert [result['doc_id'] for result in results] == ['2', '3']
+    assert isinstance(results, RerankResults) and not results.degraded
+
+
+def test_cosine_is_used_when_every_candidate_has_an_embedding():
+    embedder = StubEmbeddingClient(dims=64)
+    candidates = [{**candidate, 'embedding': embedder.get_embedding(candidate['content'])} for candidate in CANDIDATES]
+    query_vector = embedder.get_embedding(CANDIDATES[0]['content'])
+
+    results = LocalRerankClient(bm25_weight=0.0).rerank('無關的查詢', candidates, top_k=1, query_vector=query_vector)
+
+    assert results[0]['doc_id'] == '1'
+
+
+def test_ties_keep_retrieval_order():
+    results = LocalRerankClient().rerank('不相符', CANDIDATES, top_k=3)
+
+    assert [result['doc_id'] for result in results] == ['1', '2', '3']
+
+
+def test_bm25_scores_vectorized():
+    scores = LocalRerankClient().bm25_scores('年費', ['年費年費', '年費', '其他'])
+
+    assert scores[0] > scores[1] > 0
+    assert scores[2] == 0
+    np.testing.assert_array_equal(LocalRerankClient().bm25_scores('', ['a']), [0])
+
+
+def test_errors_return_degraded_retrieval_order():
+    # 查詢向量與候選向量維度不同，cosine 計算失敗
+    candidates = [{**candidate, 'embedding': [1.0, 0.0]} for candidate in CANDIDATES]
+
+    results = LocalRerankClient().rerank('問題', candidates, top_k=2, query_vector=[1.0, 0.0, 0.0])
+
+    assert [result['doc_id'] for result in results] == ['1', '2']
+    assert results.degraded
+
+
+def test_empty_candidates():
+    assert LocalRerankClient().rerank('問題', []) == []
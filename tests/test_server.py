@@ -0,0 +1,77 @@
+from http.server import ThreadingHTTPServer
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from modules.local_search_client import LocalSearchClient
+from server import SearchRequestHandler, parse_retrieve_params
+
+
+class _Engine:
+    def __init__(self, es_client):
+        self.es_client = es_client
+
+
+def test_valid_params_are_passed_through():
+    query, params = parse_retrieve_params({
+        'query': '信用卡年費', 'category': 'faq', 'doc_ids': [1, '2'], 'top_k': 3,
+        'rerank_k': 10, 'knn_weight': 1, 'use_rerank': False, 'unknown': 'ignored',
+    })
+
+    assert query == '信用卡年費'
+    assert params == {'category': 'faq', 'doc_ids': ['1', '2'], 'top_k': 3, 'rerank_k': 10, 'knn_weight': 1, 'use_rerank': False}
+
+
+def test_null_params_use_defaults():
+    assert parse_retrieve_params({'query': '問題', 'top_k': None, 'category': None}) == ('問題', {})
+
+
+@pytest.mark.parametrize('body', [
+    ['query'],
+    {},
+    {'query': ''},
+    {'query': 123},
+    {'query': 'q', 'category': 1},
+    {'query': 'q', 'doc_ids': '1,2'},
+    {'query': 'q', 'doc_ids': [1.5]},
+    {'query': 'q', 'top_k': 0},
+    {'query': 'q', 'top_k': '3'},
+    {'query': 'q', 'top_k': True},
+    {'query': 'q', 'rerank_k': -1},
+    {'query': 'q', 'knn_weight': 1.5},
+    {'query': 'q', 'knn_weight': '0.5'},
+    {'query': 'q', 'knn_weight': False},
+    {'query': 'q', 'use_rerank': 'false'},
+])
+def test_invalid_params_are_rejected(body):
+    with pytest.raises(ValueError):
+        parse_retrieve_params(body)
+
+
+class _DownClient:
+    def ping(self):
+        raise ConnectionError('connection refused')
+
+
+@pytest.mark.parametrize('make_client, status', [
+    (lambda tmp_path: LocalSearchClient(path=str(tmp_path)), 200),
+    (lambda tmp_path: _DownClient(), 503),
+])
+def test_health_uses_search_client_ping(tmp_path, monkeypatch, make_client, status):
+    monkeypatch.setattr(SearchRequestHandler, 'engine', _Engine(make_client(tmp_path)))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SearchRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        try:
+            response = urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/health', timeout=5)
+        except urllib.error.HTTPError as e:
+            response = e
+        assert response.status == status
+        assert json.loads(response.read())['search'] is (status == 200)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,38 @@
+import json
+
+from validate import calculate_accuracy, calculate_accuracy_by_category
+
+
+def _write(tmp_path, ground_truths, answers):
+    gt_path, pred_path = tmp_path / 'gt.json', tmp_path / 'pred.json'
+    gt_path.write_text(json.dumps({'ground_truths': ground_truths}))
+    pred_path.write_text(json.dumps({'answers': answers}))
+    return str(gt_path), str(pred_path)
+
+
+GROUND_TRUTHS = [
+    {'qid': 1, 'retrieve': 10, 'category': 'faq'},
+    {'qid': 2, 'retrieve': 20, 'category': 'faq'},
+    {'qid': 3, 'retrieve': 30, 'category': 'finance'},
+]
+
+
+def test_missing_prediction_counts_as_wrong(tmp_path):
+    # qid 2 檢索失敗，answer.py 不寫入其答案
+    gt_path, pred_path = _write(tmp_path, GROUND_TRUTHS, [{'qid': 1, 'retrieve': '10'}, {'qid': 3, 'retrieve': 31}])
+
+    result = calculate_accuracy(gt_path, pred_path)
+
+    assert result['correct'] == 1
+    assert result['total'] == 3
+    assert result['missing_qids'] == [2]
+
+
+def test_missing_prediction_stays_in_category_total(tmp_path):
+    gt_path, pred_path = _write(tmp_path, GROUND_TRUTHS, [{'qid': 1, 'retrieve': 10}])
+
+    categories = calculate_accuracy_by_category(gt_path, pred_path)
+
+    assert categories['faq'] == {'correct': 1, 'total': 2, 'wrong_qids': [2], 'accuracy': 0.5}
+    assert categories['finance']['total'] == 1
+    assert categories['finance']['wrong_qids'] == [3]
@@ -12,12 +12,15 @@ def calculate_accuracy(ground_truth_file, prediction_file):
     gt_dict = {item['qid']: int(item['retrieve']) for item in ground_truths}
     pred_dict = {item['qid']: int(item['retrieve']) for item in predictions}  # 轉換字串為整數
     
-    # 計算正確數量
+    # 計算正確數量，預測結果中沒有的 qid (檢索失敗，見 answer.py 的 _failures.json) 視為答錯
     correct = 0
     total = len(ground_truths)
+    missing_qids = []
     
     for qid in gt_dict:
-        if gt_dict[qid] == pred_dict[qid]:
+        if qid not in pred_dict:
+            missing_qids.append(qid)
+        elif gt_dict[qid] == pred_dict[qid]:
             correct += 1
     
     # 計算正確率
@@ -26,20 +29,10 @@ def calculate_accuracy(ground_truth_file, prediction_file):
     return {
         'correct': correct,
         'total': total,
-        'accuracy': accuracy
+        'accuracy': accuracy,
+        'missing_qids': missing_qids
     }
 
-# 計算正確率
-try:
-    result = calculate_accuracy('dataset/preliminary/ground_truths_example.json', 
-                              'output/pred_retrieve.json')
-    print(f"正確數量: {result['correct']}")
-    print(f"總數量: {result['total']}")
-    print(f"正確率: {result['accuracy']:.2%}")
-
-except Exception as e:
-    pass
-
 # 也可以依照類別計算正確率
 def calculate_accuracy_by_category(ground_truth_file, prediction_file):
     # 讀取檔案
@@ -56,10 +49,7 @@ def calculate_accuracy_by_category(ground_truth_file, prediction_file):
     categories = {}
     
     for gt in ground_truths:
-        # 如果在預測結果中找不到對應的qid，則跳過
-        if gt['qid'] not in pred_dict:
-            continue
-            
+        # 預測結果中找不到對應的qid 時視為答錯，仍計入總數
         category = gt['category']
         if category not in categories:
             categories[category] = {
@@ -69,7 +59,7 @@ def calculate_accuracy_by_category(ground_truth_file, prediction_file):
             }
         
         categories[category]['total'] += 1
-        if gt['retrieve'] == pred_dict[gt['qid']]:
+        if int(gt['retrieve']) == pred_dict.get(gt['qid']):
             categories[category]['correct'] += 1
         else:
             categories[category]['wrong_qids'].append(gt['qid'])
@@ -80,14 +70,24 @@ def calculate_accuracy_by_category(ground_truth_file, prediction_file):
     
     return categories
 
-# 計算各類別正確率
-category_results = calculate_accuracy_by_category('dataset/preliminary/ground_truths_example.json',
-                                                'output/pred_retrieve.json')
+if __name__ == '__main__':
+    # 計算正確率
+    result = calculate_accuracy('dataset/preliminary/ground_truths_example.json', 
+                              'output/pred_retrieve.json')
+    print(f"正確數量: {result['correct']}")
+    print(f"總數量: {result['total']}")
+    print(f"正確率: {result['accuracy']:.2%}")
+    if result['missing_qids']:
+        print(f"❌ {len(result['missing_qids'])} 個問題沒有預測結果 (以答錯計): {result['missing_qids']}")
+
+    # 計算各類別正確率
+    category_results = calculate_accuracy_by_category('dataset/preliminary/ground_truths_example.json',
+                                                    'output/pred_retrieve.json')
 
-print("\n各類別正確率:")
-for category, result in category_results.items():
-    print(f"{category}:")
-    print(f"  正確數量: {result['correct']}")
-    print(f"  總數量: {result['total']}")
-    print(f"  正確率: {result['accuracy']:.2%}")
-    print(f"  錯誤的QID: {result['wrong_qids']}")  # 新增輸出錯誤的QID列表
+    print("\n各類別正確率:")
+    for category, result in category_results.items():
+        print(f"{category}:")
+        print(f"  正確數量: {result['correct']}")
+        print(f"  總數量: {result['total']}")
+        print(f"  正確率: {result['accuracy']:.2%}")
+        print(f"  錯誤的QID: {result['wrong_qids']}")  # 新增輸出錯誤的QID列表